@@ -133,6 +133,8 @@ export default function DashboardPage() {
           'Celular': BoxIcon,
           'Servidor': Server,
           'Switch': Server,
+          'Máquina Virtual': Server,
+          'Contêiner': BoxIcon,
         }
         const typeColors: Record<string, string> = {
           'Notebook': 'bg-indigo-500',
@@ -141,6 +143,8 @@ export default function DashboardPage() {
           'Celular': 'bg-violet-500',
           'Servidor': 'bg-amber-500',
           'Switch': 'bg-amber-500',
+          'Máquina Virtual': 'bg-amber-500',
+          'Contêiner': 'bg-violet-500',
         }
 
         setCategoryStats(
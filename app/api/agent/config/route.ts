@@ -0,0 +1,97 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { createClient } from '@supabase/supabase-js'
+import type { SupabaseClient } from '@supabase/supabase-js'
+import { createHash } from 'crypto'
+import { tokenRevogado, verificarAssinatura, verificarToken } from '@/lib/agent-token'
+
+// Configuração central dos coletores (configuracoes.coletor_config).
+// Os agentes consultam com If-None-Match; quase sempre a resposta é um 304 sem corpo.
+
+// Tempo (ms) que cada instância reaproveita o documento antes de reler o banco
+const CACHE_CONFIG = 30 * 1000
+
+let cache: { documento: string, etag: string, lidoEm: number } | null = null
+
+async function carregarConfig(supabaseAdmin: SupabaseClient) {
+    if (cache && Date.now() - cache.lidoEm < CACHE_CONFIG) return cache
+
+    const { data, error } = await supabaseAdmin
+        .from('configuracoes')
+        .select('valor')
+        .eq('chave', 'coletor_config')
+        .maybeSingle()
+
+    if (error) {
+        console.error("Erro ao ler a configuração do coletor:", error.message)
+        return cache
+    }
+
+    // Um documento inválido não pode derrubar a frota: publica um objeto vazio
+    let documento = '{}'
+    try {
+        const valor = JSON.parse(data?.valor || '{}')
+        if (valor && typeof valor === 'object' && !Array.isArray(valor)) documento = JSON.stringify(valor)
+        else console.error("coletor_config não é um objeto JSON; publicando {}")
+    } catch {
+        console.error("coletor_config com JSON inválido; publicando {}")
+    }
+
+    const etag = `"${createHash('sha256').update(documento).digest('hex').slice(0, 32)}"`
+    cache = { documento, etag, lidoEm: Date.now() }
+    return cache
+}
+
+export async function GET(req: NextRequest) {
+    const apiKey = req.headers.get('x-api-key')
+    const bearer = req.headers.get('authorization')?.match(/^Bearer (.+)$/)?.[1]
+
+    if (!apiKey && !bearer) {
+        return NextResponse.json({ error: 'Chave de API não fornecida' }, { status: 401 })
+    }
+
+    const supabaseAdmin = createClient(
+        process.env.NEXT_PUBLIC_SUPABASE_URL!,
+        process.env.SUPABASE_SERVICE_ROLE_KEY!
+    )
+
+    if (bearer) {
+        const token = verificarToken(bearer)
+        if (!token) {
+            return NextResponse.json({ error: 'Token inválido ou expirado' }, { status: 401 })
+        }
+        // GET sem corpo: a assinatura cobre o corpo vazio
+        const falha = verificarAssinatura(bearer, req, '')
+        if (falha) {
+            return NextResponse.json({ error: falha }, { status: 401 })
+        }
+        if (await tokenRevogado(token.kid, supabaseAdmin)) {
+            return NextResponse.json({ error: 'Token revogado' }, { status: 401 })
+        }
+    } else {
+        const { data: keyData, error: keyError } = await supabaseAdmin
+            .from('api_keys')
+            .select('id')
+            .eq('key_hash', apiKey)
+            .single()
+
+        if (keyError || !keyData) {
+            return NextResponse.json({ error: 'Chave de API inválida' }, { status: 401 })
+        }
+    }
+
+    const config = await carregarConfig(supabaseAdmin)
+    if (!config) {
+        return NextResponse.json({ error: 'Configuração indisponível' }, { status: 503 })
+    }
+
+    const headers = { 'ETag': config.etag, 'Cache-Control': 'private, no-cache' }
+
+    if (req.headers.get('if-none-match') === config.etag) {
+        return new NextResponse(null, { status: 304, headers })
+    }
+
+    return new NextResponse(config.documento, {
+        status: 200,
+        headers: { ...headers, 'Content-Type': 'application/json' },
+    })
+}
@@ -0,0 +1,39 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { createClient } from '@supabase/supabase-js'
+import { emitirToken, tokensHabilitados } from '@/lib/agent-token'
+
+// Troca a Chave de API do coletor por um token assinado e expirável
+export async function POST(req: NextRequest) {
+    const apiKey = req.headers.get('x-api-key')
+
+    if (!apiKey) {
+        return NextResponse.json({ error: 'Chave de API não fornecida' }, { status: 401 })
+    }
+
+    if (!tokensHabilitados()) {
+        return NextResponse.json({ error: 'Tokens de agente não habilitados neste servidor' }, { status: 501 })
+    }
+
+    const supabaseAdmin = createClient(
+        process.env.NEXT_PUBLIC_SUPABASE_URL!,
+        process.env.SUPABASE_SERVICE_ROLE_KEY!
+    )
+
+    const { data: keyData, error: keyError } = await supabaseAdmin
+        .from('api_keys')
+        .select('id, user_id')
+        .eq('key_hash', apiKey)
+        .single()
+
+    if (keyError || !keyData) {
+        return NextResponse.json({ error: 'Chave de API inválida' }, { status: 401 })
+    }
+
+    const { token, chaveSessao, payload } = emitirToken(keyData.id, keyData.user_id)
+
+    return NextResponse.json({
+        token,
+        chave_sessao: chaveSessao,
+        expira_em: payload.exp,
+    })
+}
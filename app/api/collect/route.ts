@@ -1,10 +1,50 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createClient } from '@supabase/supabase-js'
+import { tokenRevogado, verificarAssinatura, verificarToken } from '@/lib/agent-token'
+
+// Limite de registros por requisição em lote (importação NDJSON do coletor)
+const MAX_LOTE = 1000
+
+// Janela de idempotência: (serial, seq) já gravados nos últimos minutos.
+// Retentativas após timeout, cópias do hedging e spool reenviado são respondidos
+// daqui, sem ir ao banco. Cada instância serverless mantém a sua janela; o banco
+// ignora seq repetido ou antigo (20261030_coletor_idempotencia.sql) no restante.
+const JANELA_IDEMPOTENCIA = 10 * 60 * 1000
+const recebidos = new Map<string, number>()
+
+// Presa à credencial: sem a chave certa, uma repetição não é respondida daqui
+function chaveIdempotencia(credencial: string, registro: any): string | null {
+    const seq = registro?.seq
+    return registro?.serial && Number.isSafeInteger(seq) ? `${credencial}:${registro.serial}:${seq}` : null
+}
+
+function jaRecebido(chave: string | null, agora: number) {
+    const expira = chave ? recebidos.get(chave) : undefined
+    return expira !== undefined && expira >= agora
+}
+
+function registrarRecebidos(chaves: (string | null)[], agora: number) {
+    if (recebidos.size > 100_000) {
+        for (const [chave, expira] of recebidos) {
+            if (expira < agora) recebidos.delete(chave)
+        }
+    }
+    for (const chave of chaves) {
+        if (chave) recebidos.set(chave, agora + JANELA_IDEMPOTENCIA)
+    }
+}
+
+// Erros de negócio devolvidos por fn_ingest_coletor
+const ERROS_INGESTAO: Record<string, { mensagem: string, status: number }> = {
+    chave_invalida: { mensagem: 'Chave de API inválida', status: 401 },
+    serial_obrigatorio: { mensagem: 'Serial number is required', status: 400 },
+}
 
 export async function POST(req: NextRequest) {
     const apiKey = req.headers.get('x-api-key')
+    const bearer = req.headers.get('authorization')?.match(/^Bearer (.+)$/)?.[1]
 
-    if (!apiKey) {
+    if (!apiKey && !bearer) {
         return NextResponse.json({ error: 'Chave de API não fornecida' }, { status: 401 })
     }
 
@@ -15,75 +55,79 @@ export async function POST(req: NextRequest) {
         process.env.SUPABASE_SERVICE_ROLE_KEY!
     )
 
-    // 1. Validar a chave de API
-    const { data: keyData, error: keyError } = await supabaseAdmin
-        .from('api_keys')
-        .select('id, user_id')
-        .eq('key_hash', apiKey) // Assumindo que a chave enviada é o hash ou o valor armazenado
-        .single()
-
-    if (keyError || !keyData) {
-        return NextResponse.json({ error: 'Chave de API inválida' }, { status: 401 })
-    }
-
-    // 2. Processar os dados recebidos
+    // Processar os dados recebidos (um registro ou um lote de registros)
     try {
-        const body = await req.json()
-        console.log("Payload recebido do coletor:", JSON.stringify(body, null, 2))
-
-        if (!body.serial) {
-            return NextResponse.json({ error: 'Serial number is required' }, { status: 400 })
+        const corpo = await req.text()
+
+        // Agentes com token: validação em memória (HMAC + janela anti-replay), sem consultar api_keys
+        let keyId: string | null = null
+        if (bearer) {
+            const token = verificarToken(bearer)
+            if (!token) {
+                return NextResponse.json({ error: 'Token inválido ou expirado' }, { status: 401 })
+            }
+            const falha = verificarAssinatura(bearer, req, corpo)
+            if (falha) {
+                return NextResponse.json({ error: falha }, { status: 401 })
+            }
+            if (await tokenRevogado(token.kid, supabaseAdmin)) {
+                return NextResponse.json({ error: 'Token revogado' }, { status: 401 })
+            }
+            keyId = token.kid
         }
 
-        // 3. Buscar ativo existente para evitar sobrescrever dados válidos com lixo
-        const { data: existingAtivo } = await supabaseAdmin
-            .from('ativos')
-            .select('*')
-            .eq('serial', body.serial)
-            .maybeSingle()
+        const body = JSON.parse(corpo)
+        const lote = Array.isArray(body)
 
-        const isInvalid = (val: any) => !val || val === 'Desconhecido' || val === ''
+        if (lote) {
+            console.log(`Lote recebido do coletor: ${body.length} registros`)
+        } else {
+            console.log("Payload recebido do coletor:", JSON.stringify(body, null, 2))
+        }
 
-        const merge = (newVal: any, oldVal: any) => {
-            if (!isInvalid(newVal)) return newVal
-            if (!isInvalid(oldVal)) return oldVal
-            return newVal || null
+        if (lote && body.length > MAX_LOTE) {
+            return NextResponse.json({ error: `Lote excede o limite de ${MAX_LOTE} registros` }, { status: 413 })
         }
 
-        // Mapeamento para suportar versões antigas do coletor
-        const so = body.sistema_operacional || body.so || body.os_info
-        const usuario = body.ultimo_usuario || body.usuario || body.user
-        const uptime = body.tempo_ligado || body.uptime
-
-        // 4. Inserir ou Atualizar (Upsert) na tabela ativos
-        const assetData = {
-            ...body,
-            sistema_operacional: merge(so, existingAtivo?.sistema_operacional),
-            ultimo_usuario: merge(usuario, existingAtivo?.ultimo_usuario),
-            tempo_ligado: merge(uptime, existingAtivo?.tempo_ligado),
-            processador: merge(body.processador, existingAtivo?.processador),
-            memoria_ram: merge(body.memoria_ram, existingAtivo?.memoria_ram),
-            armazenamento: merge(body.armazenamento, existingAtivo?.armazenamento),
-            updated_at: new Date().toISOString(),
-            ultima_conexao: new Date().toISOString(),
+        // Repetições (na janela ou dentro do próprio lote) não vão ao banco
+        const agora = Date.now()
+        const registros: any[] = lote ? body : [body]
+        const credencial = keyId ?? apiKey!
+        const chaves = registros.map((r) => chaveIdempotencia(credencial, r))
+        const vistas = new Set<string>()
+        const novos = registros.filter((_, i) => {
+            const chave = chaves[i]
+            if (jaRecebido(chave, agora) || (chave && vistas.has(chave))) return false
+            if (chave) vistas.add(chave)
+            return true
+        })
+        const duplicados = registros.length - novos.length
+
+        if (novos.length === 0) {
+            return NextResponse.json({ success: true, message: 'Dados já recebidos', recebidos: registros.length, duplicados })
         }
 
-        const { error: upsertError } = await supabaseAdmin
-            .from('ativos')
-            .upsert(assetData, { onConflict: 'serial', ignoreDuplicates: false })
+        // Validação da chave, merge (sem sobrescrever dados válidos com lixo), upsert e
+        // last_used_at acontecem numa única ida ao banco (ver 20261019_fn_ingest_coletor.sql)
+        const payload = lote ? novos : body
+        const { data: resultado, error: rpcError } = keyId
+            ? await supabaseAdmin.rpc('fn_ingest_coletor_token', { p_key_id: keyId, p_payload: payload })
+            : await supabaseAdmin.rpc('fn_ingest_coletor', { p_key_hash: apiKey, p_payload: payload })
+
+        if (rpcError) {
+            console.error("Erro na ingestão:", JSON.stringify(rpcError, null, 2))
+            return NextResponse.json({ error: `Erro ao salvar dados: ${rpcError.message}` }, { status: 500 })
+        }
 
-        if (upsertError) {
-            console.error("Erro no upsert:", JSON.stringify(upsertError, null, 2))
-            return NextResponse.json({ error: `Erro ao salvar dados: ${upsertError.message}` }, { status: 500 })
+        if (!resultado?.ok) {
+            const erro = ERROS_INGESTAO[resultado?.erro] || { mensagem: 'Erro ao salvar dados', status: 500 }
+            return NextResponse.json({ error: erro.mensagem }, { status: erro.status })
         }
 
-        // Atualizar data de último uso da chave (opcional, mas bom para tracking)
-        await supabaseAdmin
-            .from('api_keys')
-            .update({ last_used_at: new Date().toISOString() })
-            .eq('id', keyData.id)
+        // Só entra na janela o que o banco confirmou: uma falha ainda pode ser reenviada
+        registrarRecebidos(novos.map((r) => chaveIdempotencia(credencial, r)), agora)
 
-        return NextResponse.json({ success: true, message: 'Dados recebidos com sucesso' })
+        return NextResponse.json({ success: true, message: 'Dados recebidos com sucesso', recebidos: registros.length, duplicados })
 
     } catch (error) {
         console.error("Erro no processamento:", error)
@@ -37,8 +37,10 @@ export function CommandMenu() {
         }
 
         const timer = setTimeout(async () => {
+            // MAC no formato do Windows (AA-BB-...) também encontra o ativo
+            const rede = search.toLowerCase().replace(/-/g, ':')
             const [{ data: assets }, { data: users }, { data: softwares }] = await Promise.all([
-                supabase.from('ativos').select('id, nome, patrimonio').or(`nome.ilike.%${search}%,patrimonio.ilike.%${search}%`).limit(5),
+                supabase.from('ativos').select('id, nome, patrimonio').or(`nome.ilike.%${search}%,patrimonio.ilike.%${search}%,rede_busca.ilike.%${rede}%`).limit(5),
                 supabase.from('profiles').select('id, full_name, email').ilike('full_name', `%${search}%`).limit(5),
                 supabase.from('softwares').select('id, nome').ilike('nome', `%${search}%`).limit(5)
             ])
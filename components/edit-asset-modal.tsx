@@ -33,7 +33,7 @@ import {
 } from "lucide-react"
 import { format } from "date-fns"
 import { ptBR } from "date-fns/locale"
-import { cn } from "@/lib/utils"
+import { cn, formatarTempoLigado } from "@/lib/utils"
 import { PasswordConfirmModal } from "./password-confirm-modal"
 
 interface EditAssetModalProps {
@@ -643,7 +643,7 @@ export function EditAssetModal({ ativo, open, onClose, onSuccess, mode = 'edit'
         try {
             const { data, error } = await supabase
                 .from('ativos')
-                .select('sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao, processador, memoria_ram, armazenamento')
+                .select('sistema_operacional, ultimo_usuario, tempo_ligado, boot_em, ultima_conexao, intervalo_batimento, processador, memoria_ram, armazenamento')
                 .eq('id', ativo.id)
                 .single()
 
@@ -792,7 +792,8 @@ export function EditAssetModal({ ativo, open, onClose, onSuccess, mode = 'edit'
                                         {(() => {
                                             const lastConnection = displayAtivo.ultima_conexao ? new Date(displayAtivo.ultima_conexao) : null
                                             const timeDiff = lastConnection ? (new Date().getTime() - lastConnection.getTime()) / 1000 / 60 : 999
-                                            const isOnline = timeDiff < 10 // 10 minutes tolerance
+                                            // 10 minutes tolerance, or two of the intervals the collector declared (adaptive heartbeat)
+                                            const isOnline = timeDiff < Math.max(10, 2 * (displayAtivo.intervalo_batimento || 0) / 60)
 
                                             return isOnline ? (
                                                 <Badge variant="outline" className="ml-auto bg-emerald-50 text-emerald-600 border-emerald-200 gap-1">
@@ -824,7 +825,10 @@ export function EditAssetModal({ ativo, open, onClose, onSuccess, mode = 'edit'
                                             <span className="text-[10px] uppercase tracking-widest text-slate-400 font-bold block">Tempo Ligado</span>
                                             <div className="flex items-center gap-2 text-slate-700 dark:text-slate-300 font-medium text-sm">
                                                 <History className="h-3.5 w-3.5 text-slate-400" />
-                                                {displayAtivo.tempo_ligado || "—"}
+                                                {/* Até a última conexão, como o servidor (fn_coletor_tempo_ligado): desligado, o tempo não cresce */}
+                                                {displayAtivo.boot_em
+                                                    ? formatarTempoLigado(displayAtivo.boot_em, displayAtivo.ultima_conexao ? new Date(displayAtivo.ultima_conexao) : undefined)
+                                                    : (displayAtivo.tempo_ligado || "—")}
                                             </div>
                                         </div>
                                     </div>
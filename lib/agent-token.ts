@@ -0,0 +1,136 @@
+// Tokens assinados do agente coletor
+// O coletor troca a Chave de API por um token uma única vez; depois disso o
+// /api/collect valida o token com HMAC em memória, sem consultar api_keys.
+import { createHash, createHmac, timingSafeEqual } from 'crypto'
+import type { SupabaseClient } from '@supabase/supabase-js'
+
+export interface AgentTokenPayload {
+    kid: string // id da chave de API que originou o token
+    uid: string | null
+    iat: number
+    exp: number
+}
+
+// Validade do token e janela aceita para o timestamp das requisições (segundos)
+export const AGENT_TOKEN_TTL = Number(process.env.AGENT_TOKEN_TTL || 12 * 3600)
+const JANELA_REPLAY = 300
+const INTERVALO_REVOGACOES = 60 * 1000
+const INTERVALO_RETENTATIVA = 5 * 1000
+
+const secret = () => process.env.AGENT_TOKEN_SECRET || ''
+
+export const tokensHabilitados = () => secret().length >= 32
+
+const b64url = (buf: Buffer) => buf.toString('base64url')
+
+const hmac = (chave: string | Buffer, dados: string) => createHmac('sha256', chave).update(dados).digest()
+
+const iguais = (a: Buffer, b: Buffer) => a.length === b.length && timingSafeEqual(a, b)
+
+export function emitirToken(kid: string, uid: string | null) {
+    const iat = Math.floor(Date.now() / 1000)
+    const payload: AgentTokenPayload = { kid, uid, iat, exp: iat + AGENT_TOKEN_TTL }
+    const corpo = b64url(Buffer.from(JSON.stringify(payload)))
+    const token = `${corpo}.${b64url(hmac(secret(), corpo))}`
+    return { token, chaveSessao: chaveDeSessao(token), payload }
+}
+
+// Chave usada pelo agente para assinar cada requisição; derivável só por quem tem o segredo
+export function chaveDeSessao(token: string) {
+    return b64url(hmac(secret(), `sessao:${token}`))
+}
+
+export function verificarToken(token: string): AgentTokenPayload | null {
+    const [corpo, assinatura] = token.split('.')
+    if (!corpo || !assinatura || !tokensHabilitados()) return null
+    if (!iguais(Buffer.from(assinatura), Buffer.from(b64url(hmac(secret(), corpo))))) return null
+    try {
+        const payload = JSON.parse(Buffer.from(corpo, 'base64url').toString()) as AgentTokenPayload
+        if (!payload.kid || payload.exp < Date.now() / 1000) return null
+        return payload
+    } catch {
+        return null
+    }
+}
+
+// Proteção contra replay: nonces vistos dentro da janela de timestamp.
+// Cada instância serverless mantém a sua janela; o limite de tempo cobre o restante.
+const noncesVistos = new Map<string, number>()
+
+function registrarNonce(nonce: string, agora: number) {
+    if (noncesVistos.size > 50_000) {
+        for (const [n, expira] of noncesVistos) {
+            if (expira < agora) noncesVistos.delete(n)
+        }
+    }
+    const expira = noncesVistos.get(nonce)
+    if (expira && expira >= agora) return false
+    noncesVistos.set(nonce, agora + 2 * JANELA_REPLAY)
+    return true
+}
+
+// Confere x-agent-ts / x-agent-nonce / x-agent-signature contra o método, o caminho
+// e o corpo bruto da requisição: uma assinatura não vale para outra rota
+export function verificarAssinatura(token: string, req: Request, corpo: string): string | null {
+    const { headers, method } = req
+    const { pathname, search } = new URL(req.url)
+    const ts = Number(headers.get('x-agent-ts'))
+    const nonce = headers.get('x-agent-nonce') || ''
+    const assinatura = headers.get('x-agent-signature') || ''
+    const agora = Math.floor(Date.now() / 1000)
+
+    if (!ts || !nonce || !assinatura) return 'Assinatura da requisição ausente'
+    if (Math.abs(agora - ts) > JANELA_REPLAY) return 'Timestamp fora da janela permitida'
+
+    const digest = createHash('sha256').update(corpo).digest('hex')
+    const esperada = hmac(chaveDeSessao(token), `${ts}.${nonce}.${method} ${pathname}${search}.${digest}`).toString('hex')
+    if (!iguais(Buffer.from(assinatura), Buffer.from(esperada))) return 'Assinatura inválida'
+
+    if (!registrarNonce(nonce, agora)) return 'Requisição repetida'
+    return null
+}
+
+// Lista de revogação (chaves apagadas), atualizada em segundo plano.
+// revogadasEm é a última carga bem-sucedida; uma falha só volta a ser tentada após INTERVALO_RETENTATIVA
+let revogadas = new Set<string>()
+let revogadasEm = 0
+let tentativaEm = 0
+let atualizando: Promise<void> | null = null
+
+async function atualizarRevogacoes(supabaseAdmin: SupabaseClient) {
+    tentativaEm = Date.now()
+    const { data, error } = await supabaseAdmin
+        .from('api_keys_revogadas')
+        .select('key_id')
+        .gt('revogada_em', new Date(Date.now() - AGENT_TOKEN_TTL * 1000).toISOString())
+
+    if (error) {
+        console.error("Erro ao atualizar revogações de tokens:", error.message)
+        return
+    }
+    revogadas = new Set((data || []).map((r) => r.key_id))
+    revogadasEm = Date.now()
+}
+
+// Sem lista carregada, a própria chave é conferida: na dúvida (erro do banco), o token é recusado
+async function chaveApagada(kid: string, supabaseAdmin: SupabaseClient) {
+    const { data, error } = await supabaseAdmin.from('api_keys').select('id').eq('id', kid).maybeSingle()
+    if (error) {
+        console.error("Erro ao conferir a chave do token:", error.message)
+        return true
+    }
+    return !data
+}
+
+export async function tokenRevogado(kid: string, supabaseAdmin: SupabaseClient) {
+    const agora = Date.now()
+    const vencida = agora - revogadasEm > INTERVALO_REVOGACOES && agora - tentativaEm > INTERVALO_RETENTATIVA
+    if (vencida && !atualizando) {
+        atualizando = atualizarRevogacoes(supabaseAdmin).finally(() => { atualizando = null })
+    }
+    // Só a primeira carga da instância espera o banco; as demais usam a lista atual
+    if (revogadasEm === 0 && atualizando) await atualizando
+    // Nenhuma carga deu certo ainda: uma lista vazia aceitaria tokens revogados
+    if (revogadasEm === 0) return chaveApagada(kid, supabaseAdmin)
+    return revogadas.has(kid)
+}
@@ -4,3 +4,10 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
     return twMerge(clsx(inputs))
 }
+
+// Tempo ligado no formato do coletor ("3d 4h 12m"), a partir do boot informado pelo payload v3
+// até `agora` (use a última conexão: um ativo desligado não continua ligado)
+export function formatarTempoLigado(bootEm: string, agora: Date = new Date()) {
+    const minutos = Math.max(0, Math.floor((agora.getTime() - new Date(bootEm).getTime()) / 60000))
+    return `${Math.floor(minutos / 1440)}d ${Math.floor((minutos % 1440) / 60)}h ${minutos % 60}m`
+}
@@ -18,9 +18,14 @@ import platform
 import socket
 import os
 import json
+import re
 import subprocess
 import logging
 import sys
+import time
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
 
 # Check if running in a non-interactive environment
 def is_interactive():
@@ -44,408 +49,3733 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_serial_number() -> str:
-    """Obtém o número de série do equipamento."""
+# ==========================================
+# PERFIL DE EXECUÇÃO (--profile)
+# ==========================================
+# Para investigar uma máquina lenta: com --profile, um ciclo é executado com
+# trechos cronometrados (sondas, backends e suas alternativas, comandos
+# externos, configuração e as fases de cada requisição HTTP: DNS, conexão,
+# TLS, envio e resposta) e gravado no formato Chrome Trace, que abre no
+# chrome://tracing ou no ui.perfetto.dev. Fora desse modo os trechos não
+# registram nada.
+
+_perfil: Optional["PerfilExecucao"] = None
+
+
+class PerfilExecucao:
+    """Eventos completos ("ph": "X") do Chrome Trace, em microssegundos desde o início."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.eventos: list = []
+        self.threads: Dict[int, str] = {}
+        self.lock = threading.Lock()
+
+    def registrar(self, nome: str, categoria: str, inicio: float, fim: float, args: dict) -> None:
+        thread = threading.current_thread()
+        tid = thread.native_id or 0
+        evento = {"name": nome, "cat": categoria, "ph": "X", "pid": os.getpid(), "tid": tid,
+                  "ts": round((inicio - self.inicio) * 1e6, 1), "dur": round((fim - inicio) * 1e6, 1)}
+        if args:
+            evento["args"] = args
+        with self.lock:
+            self.threads[tid] = thread.name
+            self.eventos.append(evento)
+
+    def salvar(self, caminho: str) -> None:
+        nomes = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": nome}}
+                 for tid, nome in self.threads.items()]
+        processo = {"name": "process_name", "ph": "M", "pid": os.getpid(), "tid": 0,
+                    "args": {"name": f"coletor {VERSAO_COLETOR} ({socket.gethostname()})"}}
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": [processo] + nomes + self.eventos, "displayTimeUnit": "ms",
+                       "otherData": {"sistema": f"{platform.system()} {platform.release()}",
+                                     "python": platform.python_version()}}, f)
+
+
+class trecho:
+    """Cronometra um trecho no perfil ativo: `with trecho("nome", "categoria", chave=valor):`."""
+
+    __slots__ = ("nome", "categoria", "args", "inicio")
+
+    def __init__(self, nome: str, categoria: str = "coletor", **args):
+        self.nome, self.categoria, self.args = nome, categoria, args
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, _):
+        if _perfil is not None:
+            if erro is not None:
+                self.args["erro"] = f"{tipo.__name__}: {erro}"
+            _perfil.registrar(self.nome, self.categoria, self.inicio, time.perf_counter(), self.args)
+        return False
+
+
+def cronometrado(nome: str, categoria: str = "coletor"):
+    """Decorador: a função inteira vira um trecho do perfil."""
+    import functools
+
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            if _perfil is None:
+                return funcao(*args, **kwargs)
+            with trecho(nome, categoria):
+                return funcao(*args, **kwargs)
+        return executar
+    return decorar
+
+
+def _instrumentar_rede() -> None:
+    """Envolve as etapas de baixo nível usadas pelo requests/urllib3 (só no modo --profile)."""
+    import http.client
+    import ssl
+
+    def envolver(dono, atributo: str, nome: str, descrever):
+        original = getattr(dono, atributo)
+
+        def executar(*args, **kwargs):
+            with trecho(nome, "http", **descrever(*args, **kwargs)) as t:
+                resultado = original(*args, **kwargs)
+                if nome == "resposta":
+                    t.args["status"] = resultado.status
+                return resultado
+        setattr(dono, atributo, executar)
+
+    envolver(socket, "getaddrinfo", "dns", lambda host, *a, **k: {"host": host})
+    envolver(socket.socket, "connect", "conexão", lambda s, endereco: {"endereco": str(endereco)})
+    envolver(ssl.SSLContext, "wrap_socket", "tls", lambda c, s, *a, **k: {"host": k.get("server_hostname")})
+    envolver(http.client.HTTPConnection, "send", "upload",
+             lambda c, dados: {"bytes": len(dados) if hasattr(dados, "__len__") else None})
+    envolver(http.client.HTTPConnection, "getresponse", "resposta", lambda c: {"host": c.host})
+
+
+def iniciar_perfil() -> None:
+    global _perfil
+    _perfil = PerfilExecucao()
+    _instrumentar_rede()
+
+
+_perfil_destino: Optional[str] = None
+_cprofile = None
+
+
+def salvar_perfil() -> None:
+    """Grava o trace (e as estatísticas do cProfile); chamado também quando o orçamento estoura."""
+    if _perfil is None or not _perfil_destino:
+        return
+    try:
+        if _cprofile is not None:
+            import pstats
+            _cprofile.disable()
+            _cprofile.dump_stats(_perfil_destino + ".pstats")
+            logger.info(f"cProfile gravado em {_perfil_destino}.pstats")
+        _perfil.salvar(_perfil_destino)
+        logger.info(f"Perfil gravado em {_perfil_destino} ({len(_perfil.eventos)} trechos); "
+                    f"abra em ui.perfetto.dev ou chrome://tracing")
+        if _cprofile is not None:
+            pstats.Stats(_perfil_destino + ".pstats").sort_stats("cumulative").print_stats(15)
+    except Exception as e:
+        logger.error(f"Não foi possível gravar o perfil: {e}")
+
+
+def run_profile(destino: str, com_cprofile: bool, orcamento_total: Optional[float],
+                saida_ndjson: Optional[str] = None) -> int:
+    """Um ciclo completo (como --once) com o perfil ligado; grava o trace no destino."""
+    global _perfil_destino, _cprofile
+    iniciar_perfil()
+    _perfil_destino = destino
+    if com_cprofile:
+        import cProfile
+        _cprofile = cProfile.Profile()
+        _cprofile.enable()
     try:
+        with trecho("ciclo", "ciclo"):
+            orcamento = orcamento_total or float(config_efetiva().get("ORCAMENTO_TOTAL", ORCAMENTO_TOTAL_PADRAO))
+            return run_once(orcamento, saida_ndjson)
+    finally:
+        salvar_perfil()
+
+
+# ==========================================
+# ESTADO PERSISTENTE DO AGENTE
+# ==========================================
+# Arquivo JSON ao lado do script com o que precisa sobreviver a reinícios
+# (token do agente, capacidades detectadas, offsets etc.).
+
+ESTADO_ARQUIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "coletor_state.json")
+
+_estado: Optional[dict] = None
+_estado_lock = threading.RLock()
+
+
+def load_state() -> dict:
+    """Carrega (uma vez) o estado persistente do agente."""
+    global _estado
+    with _estado_lock:
+        if _estado is None:
+            try:
+                with trecho("ler estado"), open(ESTADO_ARQUIVO, "r") as f:
+                    _estado = json.load(f)
+            except FileNotFoundError:
+                _estado = {}
+            except Exception as e:
+                logger.warning(f"Estado do agente ilegível, recomeçando: {e}")
+                _estado = {}
+        return _estado
+
+
+@cronometrado("gravar estado")
+def save_state() -> None:
+    """Grava o estado de forma atômica (arquivo temporário + rename)."""
+    with _estado_lock:
+        temp = ESTADO_ARQUIVO + ".tmp"
+        try:
+            with open(temp, "w") as f:
+                json.dump(load_state(), f)
+            os.replace(temp, ESTADO_ARQUIVO)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o estado do agente: {e}")
+
+
+# ==========================================
+# REGISTRO DE SONDAS E AGENDADOR POR CICLO
+# ==========================================
+# Cada sonda declara o campo que preenche, o custo esperado (segundos), a
+# volatilidade do dado e as plataformas suportadas. A cada ciclo o agendador
+# decide quais sondas recoletar com base na validade do valor em cache e no
+# orçamento de tempo restante: sondas caras e estáveis rodam raramente, e as
+# baratas e voláteis rodam a cada batimento.
+
+VOLATILIDADE_ESTATICA = "estatica"  # muda só com troca de hardware/reinstalação
+VOLATILIDADE_BOOT = "boot"          # pode mudar a cada reinicialização
+VOLATILIDADE_MINUTO = "minuto"      # muda continuamente
+
+# Idade máxima (s) de um valor em cache antes de ser recoletado
+VALIDADE_POR_VOLATILIDADE = {
+    VOLATILIDADE_ESTATICA: 24 * 3600,
+    VOLATILIDADE_BOOT: 6 * 3600,
+    VOLATILIDADE_MINUTO: 0,
+}
+
+ORCAMENTO_COLETA_PADRAO = 20  # segundos por ciclo
+# Depois de uma falha, a sonda continua vencida mas só é tentada de novo após este tempo (s)
+ESPERA_APOS_FALHA = 60
+
+
+@dataclass
+class Sonda:
+    campo: str
+    funcao: Callable[[], Any]
+    custo: float
+    volatilidade: str
+    plataformas: Tuple[str, ...] = ()
+    padrao: Any = ""
+    custo_medido: Optional[float] = None
+
+    def suportada(self, sistema: str) -> bool:
+        return not self.plataformas or sistema in self.plataformas
+
+    def custo_estimado(self) -> float:
+        return self.custo_medido if self.custo_medido is not None else self.custo
+
+
+SONDAS: Dict[str, Sonda] = {}
+
+
+def sonda(campo: str, custo: float = 0.1, volatilidade: str = VOLATILIDADE_MINUTO,
+          plataformas: Tuple[str, ...] = (), padrao: Any = ""):
+    """Registra uma função como sonda do campo informado."""
+    def registrar(funcao):
+        SONDAS[campo] = Sonda(campo, funcao, custo, volatilidade, tuple(plataformas), padrao)
+        return funcao
+    return registrar
+
+
+def get_boot_id() -> Optional[str]:
+    """Identificador barato da inicialização atual (muda a cada boot)."""
+    try:
+        if platform.system() == "Linux":
+            with open("/proc/sys/kernel/random/boot_id", "r") as f:
+                return f.read().strip()
         if platform.system() == "Windows":
-            result = subprocess.run(
-                ["wmic", "bios", "get", "serialnumber"],
-                capture_output=True, text=True, timeout=10
-            )
-            lines = result.stdout.strip().split('\n')
-            if len(lines) >= 2:
-                serial = lines[1].strip()
-                if serial and serial != "To be filled by O.E.M.":
-                    return serial
-        elif platform.system() == "Linux":
-            result = subprocess.run(
-                ["sudo", "dmidecode", "-s", "system-serial-number"],
-                capture_output=True, text=True, timeout=10
-            )
-            serial = result.stdout.strip()
-            if serial and serial != "Not Specified":
-                return serial
+            import ctypes
+            ctypes.windll.kernel32.GetTickCount64.restype = ctypes.c_uint64
+            desde_boot = ctypes.windll.kernel32.GetTickCount64() / 1000
+            # Arredonda para o minuto para absorver a imprecisão do relógio
+            return str(int((time.time() - desde_boot) // 60))
     except Exception as e:
-        logger.warning(f"Não foi possível obter o serial: {e}")
+        logger.debug(f"Boot id indisponível: {e}")
+    return None
+
+
+class AgendadorSondas:
+    """Decide, a cada ciclo, quais sondas recoletar e mantém o cache dos valores."""
+
+    def __init__(self, sondas: Optional[Dict[str, Sonda]] = None):
+        self.sondas = SONDAS if sondas is None else sondas
+        self.cache: Dict[str, Tuple[Any, float, Optional[str]]] = {}
+        # Ajustes da configuração remota: sondas desligadas e validade (s) por sonda
+        self.desativadas: set = set()
+        self.validades: Dict[str, float] = {}
+        # Sondas que falharam: campo -> instante a partir do qual tentar de novo
+        self.falhas: Dict[str, float] = {}
+        # O laço principal e a API local podem executar sondas ao mesmo tempo
+        self.lock = threading.RLock()
+
+    def configurar(self, desativadas=(), validades: Optional[Dict[str, float]] = None) -> None:
+        """Aplica SONDAS_DESATIVADAS / INTERVALO_SONDAS; o serial nunca é desligado."""
+        self.desativadas = {c for c in desativadas if c in self.sondas and c != "serial"}
+        self.validades = {}
+        for campo, segundos in (validades or {}).items():
+            try:
+                self.validades[campo] = float(segundos)
+            except (TypeError, ValueError):
+                logger.warning(f"Intervalo inválido para a sonda '{campo}': {segundos}")
+
+    def ativas(self, sistema: str) -> list:
+        return [s for s in self.sondas.values() if s.suportada(sistema) and s.campo not in self.desativadas]
+
+    def _atraso(self, s: Sonda, agora: float, boot_id: Optional[str]) -> Optional[float]:
+        """Quanto a sonda está vencida (>= 1 = vencida); None se nunca coletada."""
+        if s.campo not in self.cache:
+            return None
+        _, coletado_em, boot_coleta = self.cache[s.campo]
+        if s.volatilidade == VOLATILIDADE_BOOT and boot_id != boot_coleta:
+            return float("inf")
+        validade = self.validades.get(s.campo, VALIDADE_POR_VOLATILIDADE.get(s.volatilidade, 0))
+        if validade <= 0:
+            return float("inf")
+        return (agora - coletado_em) / validade
+
+    def planejar(self, agora: Optional[float] = None, boot_id: Optional[str] = None) -> list:
+        """Lista as sondas vencidas, das nunca coletadas às menos atrasadas."""
+        agora = time.time() if agora is None else agora
+        pendentes = []
+        for s in self.ativas(platform.system()):
+            if self.falhas.get(s.campo, 0) > agora:
+                continue
+            atraso = self._atraso(s, agora, boot_id)
+            if atraso is None or atraso >= 1:
+                # Nunca coletadas primeiro; depois as mais atrasadas; empate: a mais barata
+                chave = (0 if atraso is None else 1, -(atraso or 0), s.custo_estimado())
+                pendentes.append((chave, s))
+        pendentes.sort(key=lambda item: item[0])
+        return [s for _, s in pendentes]
+
+    def executar(self, s: Sonda, boot_id: Optional[str]) -> Any:
+        inicio = time.monotonic()
+        try:
+            with trecho(f"sonda {s.campo}", "sonda"):
+                valor = s.funcao()
+        except Exception as e:
+            # O cache fica como estava (sem cache, vale o padrão): a sonda continua vencida
+            nivel = logging.DEBUG if isinstance(e, BackendIndisponivel) and s.campo != "serial" else logging.WARNING
+            logger.log(nivel, f"Sonda '{s.campo}' falhou: {e}")
+            self.falhas[s.campo] = time.time() + ESPERA_APOS_FALHA
+            return self.cache[s.campo][0] if s.campo in self.cache else s.padrao
+        self.falhas.pop(s.campo, None)
+        duracao = time.monotonic() - inicio
+        # Média móvel do custo real para planejar os próximos ciclos
+        s.custo_medido = duracao if s.custo_medido is None else 0.7 * s.custo_medido + 0.3 * duracao
+        self.cache[s.campo] = (valor, time.time(), boot_id)
+        return valor
+
+    def exportar(self) -> dict:
+        """Cache e custos medidos, para o arquivo de estado (modo --once)."""
+        return {
+            "versao": VERSAO_COLETOR,
+            "valores": {c: [v, em, boot, self.sondas[c].custo_medido]
+                        for c, (v, em, boot) in self.cache.items() if c in self.sondas},
+        }
+
+    def importar(self, dados: dict) -> None:
+        # Valores de outra versão do coletor podem ter outro formato: recomeça
+        if not dados or dados.get("versao") != VERSAO_COLETOR:
+            return
+        for campo, (valor, coletado_em, boot_id, custo) in dados.get("valores", {}).items():
+            if campo in self.sondas:
+                self.cache[campo] = (valor, coletado_em, boot_id)
+                self.sondas[campo].custo_medido = custo
+
+    def coletar(self, orcamento: float = ORCAMENTO_COLETA_PADRAO, estrito: bool = False) -> Dict[str, Any]:
+        """
+        Recoleta o que couber no orçamento e devolve os valores de todas as sondas.
+        Com estrito=True (modo --once), até sondas sem cache respeitam o orçamento;
+        só o serial roda sempre.
+        """
+        with self.lock:
+            return self._coletar(orcamento, estrito)
+
+    def _coletar(self, orcamento: float, estrito: bool) -> Dict[str, Any]:
+        inicio = time.monotonic()
+        boot_id = get_boot_id()
+        executadas, adiadas = [], []
+        for s in self.planejar(boot_id=boot_id):
+            restante = orcamento - (time.monotonic() - inicio)
+            # Sem valor em cache não há o que adiar: a sonda roda de qualquer forma
+            tem_alternativa = s.campo in self.cache or (estrito and s.campo != "serial")
+            if tem_alternativa and s.custo_estimado() > restante:
+                adiadas.append(s.campo)
+                continue
+            self.executar(s, boot_id)
+            executadas.append(s.campo)
+
+        if adiadas:
+            logger.info(f"Sondas adiadas por orçamento ({orcamento}s): {', '.join(adiadas)}")
+        logger.debug(f"Sondas executadas: {', '.join(executadas) or 'nenhuma'}")
+
+        return {
+            s.campo: (self.cache[s.campo][0] if s.campo in self.cache else s.padrao)
+            for s in self.ativas(platform.system())
+        }
+
+    def atualizar(self, campo: str, intervalo_minimo: float = 0, espera: float = 30) -> Tuple[Any, Optional[float], bool]:
+        """
+        Recoleta um campo agora; devolve (valor, coletado_em, executou).
+        Dentro de intervalo_minimo desde a última coleta, devolve o valor em cache.
+        """
+        s = self.sondas[campo]
+        if not self.lock.acquire(timeout=espera):
+            raise TimeoutError("coleta em andamento")
+        try:
+            if campo in self.cache and time.time() - self.cache[campo][1] < intervalo_minimo:
+                valor, coletado_em, _ = self.cache[campo]
+                return valor, coletado_em, False
+            valor = self.executar(s, get_boot_id())
+            # Falha sem valor anterior: devolve o padrão, sem instante de coleta
+            return valor, self.cache[campo][1] if campo in self.cache else None, True
+        finally:
+            self.lock.release()
+
+
+_agendador = AgendadorSondas()
+
+
+
+# ==========================================
+# BACKENDS DE COLETA (DESCOBERTA DE CAPACIDADES)
+# ==========================================
+# No Windows a mesma informação pode vir do PowerShell, do wmic (descontinuado
+# nas versões recentes) ou do systeminfo. Na primeira execução, e quando o SO
+# ou o coletor mudam de versão, o agente testa quais backends funcionam e
+# memoriza o mais rápido de cada sonda no arquivo de estado. Nos ciclos
+# seguintes só esse backend roda; alternativas só são testadas após uma falha.
+
+VERSAO_COLETOR = "3.0"
+
+# Quando nenhum backend funciona, espera este tempo (s) antes de testar de novo
+ESPERA_SEM_BACKEND = 6 * 3600
+
+
+def run_command(args: list, timeout: int = 10) -> str:
+    """Executa um comando do sistema e devolve a saída padrão."""
+    with trecho(f"subprocesso {os.path.basename(args[0])}", "subprocesso", comando=" ".join(args)[:300]) as t:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        t.args["codigo"] = result.returncode
+    return result.stdout
+
+
+@dataclass
+class Backend:
+    nome: str
+    funcao: Callable[[], Any]
+    comando: Optional[str] = None  # executável exigido (None = nativo)
+    plataformas: Tuple[str, ...] = ()
+
+    def disponivel(self, comandos: Dict[str, bool]) -> bool:
+        if self.plataformas and platform.system() not in self.plataformas:
+            return False
+        return self.comando is None or comandos.get(self.comando, False)
+
+
+BACKENDS: Dict[str, list] = {}
+
+
+def backend(campo: str, nome: str, comando: Optional[str] = None, plataformas: Tuple[str, ...] = ()):
+    """Registra uma forma de obter o campo; a ordem de registro é a ordem de preferência inicial."""
+    def registrar(funcao):
+        BACKENDS.setdefault(campo, []).append(Backend(nome, funcao, comando, tuple(plataformas)))
+        return funcao
+    return registrar
+
+
+class BackendIndisponivel(Exception):
+    """O backend não fornece o campo nesta máquina (não é "sem valor agora")."""
+
+
+def _executar_backend(campo: str, b: Backend, etapa: str) -> Any:
+    """
+    Executa o backend. Só exceção é falha: um campo volátil pode não ter valor
+    agora (ninguém logado) e ter no próximo ciclo. Já um campo estático ou de
+    boot vazio quer dizer que este backend não o obtém aqui (placeholder do
+    fabricante, comando sem saída): vira BackendIndisponivel.
+    """
+    with trecho(f"{campo}/{b.nome}", "backend", etapa=etapa):
+        valor = b.funcao()
+    s = SONDAS.get(campo)
+    if not valor and s is not None and s.volatilidade != VOLATILIDADE_MINUTO:
+        raise BackendIndisponivel("sem valor")
+    return valor
+
+
+def _impressao_digital() -> str:
+    return f"{platform.system()}|{platform.version()}|{VERSAO_COLETOR}"
+
+
+def _comandos_disponiveis() -> Dict[str, bool]:
+    discover_capabilities()
+    return load_state()["capacidades"]["comandos"]
+
+
+def _medir_backends(campo: str, candidatos: list) -> Tuple[Optional[str], Any]:
+    """Executa cada backend uma vez e devolve (nome, valor) do mais rápido que funcionou, preferindo os com valor."""
+    melhor, melhor_valor, melhor_chave = None, None, None
+    for b in candidatos:
+        inicio = time.monotonic()
+        try:
+            valor = _executar_backend(campo, b, "medição")
+        except Exception as e:
+            logger.debug(f"Backend {b.nome} de '{campo}' falhou: {e}")
+            continue
+        chave = (not valor, time.monotonic() - inicio)
+        if melhor_chave is None or chave < melhor_chave:
+            melhor, melhor_valor, melhor_chave = b.nome, valor, chave
+    return melhor, melhor_valor
+
+
+def discover_capabilities(forcar: bool = False) -> None:
+    """Detecta comandos e o backend mais rápido de cada sonda (só quando algo mudou)."""
+    import shutil
+
+    estado = load_state()
+    capacidades = estado.get("capacidades", {})
+    if not forcar and capacidades.get("versao") == _impressao_digital():
+        return
+
+    logger.info("Detectando capacidades do sistema (primeira execução ou mudança de versão)...")
+    inicio = time.perf_counter()
+    comandos = {c: shutil.which(c) is not None for c in ("powershell", "wmic", "systeminfo", "dmidecode", "sudo")}
+    estado["capacidades"] = {"versao": _impressao_digital(), "comandos": comandos}
+
+    preferidos = {}
+    for campo, candidatos in BACKENDS.items():
+        disponiveis = [b for b in candidatos if b.disponivel(comandos)]
+        escolhido, _ = _medir_backends(campo, disponiveis)
+        if escolhido:
+            preferidos[campo] = escolhido
+    estado["backends"] = preferidos
+    estado["sem_backend"] = {}
+    if _perfil is not None:
+        _perfil.registrar("descoberta de capacidades", "coletor", inicio, time.perf_counter(), {})
+    save_state()
+    logger.info(f"Backends escolhidos: {preferidos or 'nenhum'}")
+
+
+def run_backends(campo: str) -> Any:
+    """
+    Obtém o campo pelo backend memorizado; em caso de falha, reavalia as
+    alternativas. Se nenhuma funcionar, levanta BackendIndisponivel: a sonda
+    falha e o agendador mantém o valor anterior em vez de guardar um vazio.
+    """
+    estado = load_state()
+    preferidos = estado.setdefault("backends", {})
+    disponiveis = [b for b in BACKENDS.get(campo, []) if b.disponivel(_comandos_disponiveis())]
+    preferido = next((b for b in disponiveis if b.nome == preferidos.get(campo)), None)
+
+    if preferido:
+        # Vazio num campo volátil não é falha: o backend continua o preferido
+        try:
+            return _executar_backend(campo, preferido, "preferido")
+        except Exception as e:
+            logger.info(f"Backend '{preferido.nome}' de '{campo}' falhou ({e}); reavaliando alternativas.")
+
+    # Todos falharam (exceção) recentemente: não paga o caminho de falha a cada ciclo.
+    # O serial não espera: sem ele o ativo aparece como outro (AUTO-<hostname>)
+    sem_backend = estado.setdefault("sem_backend", {})
+    if (not preferido and campo != "serial"
+            and time.time() - sem_backend.get(campo, 0) < ESPERA_SEM_BACKEND):
+        raise BackendIndisponivel(f"nenhum backend de '{campo}' funcionou recentemente")
+
+    alternativas = [b for b in disponiveis if b is not preferido]
+    escolhido, valor = _medir_backends(campo, alternativas)
+    if escolhido:
+        preferidos[campo] = escolhido
+        sem_backend.pop(campo, None)
+    else:
+        preferidos.pop(campo, None)
+        sem_backend[campo] = time.time()
+    save_state()
+    if not escolhido:
+        raise BackendIndisponivel(f"nenhum backend de '{campo}' funcionou")
+    return valor
+
+
+def _format_disk(size_bytes: int) -> str:
+    gb = round(size_bytes / (1024 ** 3))
+    if gb >= 900: return f"{round(gb / 1024)} TB"
+    return f"{gb} GB"
+
+
+def _wmic_value(args: list) -> str:
+    lines = [line.strip() for line in run_command(args).splitlines() if line.strip()]
+    return lines[1] if len(lines) >= 2 else ""
+
+
+# --- Serial ---
 
-    return f"AUTO-{socket.gethostname()}"
+@backend("serial", "powershell", "powershell", ("Windows",))
+def _serial_powershell() -> str:
+    serial = run_command(["powershell", "-Command", "(Get-CimInstance Win32_BIOS).SerialNumber"]).strip()
+    return serial if serial and serial != "To be filled by O.E.M." else ""
 
 
+@backend("serial", "wmic", "wmic", ("Windows",))
+def _serial_wmic() -> str:
+    serial = _wmic_value(["wmic", "bios", "get", "serialnumber"])
+    return serial if serial and serial != "To be filled by O.E.M." else ""
+
+
+@backend("serial", "sysfs", None, ("Linux",))
+def _serial_sysfs() -> str:
+    with open("/sys/class/dmi/id/product_serial", "r") as f:
+        serial = f.read().strip()
+    return serial if serial and serial != "Not Specified" else ""
+
+
+@backend("serial", "dmidecode", "sudo", ("Linux",))
+def _serial_dmidecode() -> str:
+    serial = run_command(["sudo", "dmidecode", "-s", "system-serial-number"]).strip()
+    return serial if serial and serial != "Not Specified" else ""
+
+
+@sonda("serial", custo=0.5, volatilidade=VOLATILIDADE_ESTATICA, padrao=f"AUTO-{socket.gethostname()}")
+def get_serial_number() -> str:
+    """
+    Obtém o número de série do equipamento. Sem serial, a sonda falha: o
+    agendador mantém o serial anterior e tenta de novo após ESPERA_APOS_FALHA.
+    AUTO-<hostname> é só o padrão enquanto não há nenhum, nunca vai para o cache.
+    """
+    return run_backends("serial")
+
+
+# --- Processador ---
+
+@backend("processador", "powershell", "powershell", ("Windows",))
+def _cpu_powershell() -> str:
+    return run_command(["powershell", "-Command", "Get-CimInstance Win32_Processor | Select-Object -ExpandProperty Name"]).strip()
+
+
+@backend("processador", "wmic", "wmic", ("Windows",))
+def _cpu_wmic() -> str:
+    return _wmic_value(["wmic", "cpu", "get", "name"])
+
+
+@backend("processador", "proc", None, ("Linux",))
+def _cpu_proc() -> str:
+    with open("/proc/cpuinfo", "r") as f:
+        for line in f:
+            if "model name" in line:
+                return line.split(":")[1].strip()
+    return ""
+
+
+@sonda("processador", custo=1.0, volatilidade=VOLATILIDADE_ESTATICA)
 def get_cpu_info() -> str:
     """Obtém informações do processador."""
     try:
-        if platform.system() == "Windows":
-            # Tentar PowerShell primeiro (mais limpo)
-            try:
-                result = subprocess.run(
-                    ["powershell", "-Command", "Get-CimInstance Win32_Processor | Select-Object -ExpandProperty Name"],
-                    capture_output=True, text=True, timeout=10
-                )
-                if result.stdout.strip():
-                    return result.stdout.strip()
-            except:
-                pass
-            
-            # Fallback para wmic
-            result = subprocess.run(
-                ["wmic", "cpu", "get", "name"],
-                capture_output=True, text=True, timeout=10
-            )
-            lines = [l.strip() for l in result.stdout.splitlines() if l.strip()]
-            if len(lines) >= 2:
-                return lines[1]
-        elif platform.system() == "Linux":
-            with open("/proc/cpuinfo", "r") as f:
-                for line in f:
-                    if "model name" in line:
-                        return line.split(":")[1].strip()
+        cpu = run_backends("processador")
+        if cpu:
+            return cpu
     except Exception as e:
         logger.warning(f"Erro ao obter CPU: {e}")
 
     return platform.processor() or ""
 
 
-def get_ram_gb() -> str:
-    """Obtém a quantidade total de RAM em MB (estilo systeminfo)."""
-    try:
-        if platform.system() == "Windows":
-            # Tentar PowerShell formatado
+# --- Memória RAM ---
+
+@backend("memoria_ram", "powershell", "powershell", ("Windows",))
+def _ram_powershell() -> str:
+    saida = run_command(["powershell", "-Command", "[math]::Round((Get-CimInstance Win32_ComputerSystem).TotalPhysicalMemory / 1MB)"]).strip()
+    if not saida:
+        return ""
+    return f"{int(saida):,} MB".replace(",", ".")
+
+
+@backend("memoria_ram", "wmic", "wmic", ("Windows",))
+def _ram_wmic() -> str:
+    total_bytes = int(_wmic_value(["wmic", "computersystem", "get", "totalphysicalmemory"]) or 0)
+    if not total_bytes:
+        return ""
+    mb = int(total_bytes / (1024 ** 2))
+    return f"{mb:,} MB".replace(",", ".")
+
+
+@backend("memoria_ram", "systeminfo", "systeminfo", ("Windows",))
+def _ram_systeminfo() -> str:
+    # Lento, mas muito confiável
+    for line in run_command(["systeminfo"], timeout=20).splitlines():
+        if "física total" in line.lower() or "total physical memory" in line.lower():
+            # Ex: Memória física total: 10.116 MB
+            parts = line.split(":")
+            if len(parts) >= 2:
+                return parts[1].strip()
+    return ""
+
+
+@backend("memoria_ram", "proc", None, ("Linux",))
+def _ram_proc() -> str:
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            if "MemTotal" in line:
+                kb = int(line.split()[1])
+                mb = int(kb / 1024)
+                return f"{mb} MB"
+    return ""
+
+
+@sonda("memoria_ram", custo=2.0, volatilidade=VOLATILIDADE_ESTATICA)
+def get_ram_gb() -> str:
+    """Obtém a quantidade total de RAM em MB (estilo systeminfo)."""
+    try:
+        return run_backends("memoria_ram") or ""
+    except Exception as e:
+        logger.warning(f"Erro ao obter RAM: {e}")
+
+    return ""
+
+
+# --- Armazenamento ---
+
+@backend("armazenamento", "powershell", "powershell", ("Windows",))
+def _disk_powershell() -> str:
+    output = run_command(["powershell", "-Command", "Get-PhysicalDisk | Select-Object -ExpandProperty Size"]).strip().splitlines()
+    return _format_disk(int(output[0].strip())) if output else ""
+
+
+@backend("armazenamento", "wmic", "wmic", ("Windows",))
+def _disk_wmic() -> str:
+    size = _wmic_value(["wmic", "diskdrive", "get", "size"])
+    return _format_disk(int(size)) if size else ""
+
+
+@sonda("armazenamento", custo=1.0, volatilidade=VOLATILIDADE_ESTATICA, plataformas=("Windows",))
+def get_storage_info() -> str:
+    """Obtém informações de armazenamento."""
+    try:
+        return run_backends("armazenamento") or ""
+    except Exception as e:
+        logger.warning(f"Erro ao obter armazenamento: {e}")
+
+    return ""
+
+
+# --- Sistema Operacional ---
+
+@backend("sistema_operacional", "powershell", "powershell", ("Windows",))
+def _os_powershell() -> str:
+    # Nome completo e versão
+    return run_command(["powershell", "-Command", "((Get-CimInstance Win32_OperatingSystem).Caption + ' ' + (Get-CimInstance Win32_OperatingSystem).Version).Trim()"]).strip()
+
+
+@sonda("sistema_operacional", custo=1.0, volatilidade=VOLATILIDADE_BOOT, padrao="Desconhecido")
+def get_os_info() -> str:
+    """Obtém nome e versão do Sistema Operacional."""
+    try:
+        nome = run_backends("sistema_operacional")
+        if nome:
+            return nome
+        
+        system = platform.system()
+        release = platform.release()
+        return f"{system} {release}"
+    except:
+        return "Desconhecido"
+
+
+# --- Usuário logado ---
+
+@backend("ultimo_usuario", "powershell", "powershell", ("Windows",))
+def _user_powershell() -> str:
+    # PowerShell é mais confiável no Windows para saber quem está na sessão
+    user = run_command(["powershell", "-Command", "(Get-CimInstance Win32_ComputerSystem).UserName.Trim()"]).strip()
+    return user.split('\\')[-1] if user else ""
+
+
+@sonda("ultimo_usuario", custo=0.5, volatilidade=VOLATILIDADE_MINUTO, padrao="Desconhecido")
+def get_logged_user() -> str:
+    """Obtém o usuário logado atualmente."""
+    try:
+        user = run_backends("ultimo_usuario")
+        if user:
+            return user
+
+        # Fallbacks
+        try:
+            return os.getlogin()
+        except:
+            pass
+        return os.environ.get("USERNAME") or os.environ.get("USER") or "Desconhecido"
+    except:
+        return "Desconhecido"
+
+
+# --- Tempo ligado ---
+
+@backend("tempo_ligado", "powershell", "powershell", ("Windows",))
+def _uptime_powershell() -> str:
+    # PowerShell é muito mais simples para uptime
+    cmd = "(Get-Date) - (Get-CimInstance Win32_OperatingSystem).LastBootUpTime"
+    return run_command(["powershell", "-Command", f"$u = {cmd}; \"$($u.Days)d $($u.Hours)h $($u.Minutes)m\".Trim()"]).strip()
+
+
+@backend("tempo_ligado", "wmic", "wmic", ("Windows",))
+def _uptime_wmic() -> str:
+    value = _wmic_value(["wmic", "os", "get", "lastbootuptime"])
+    if not value:
+        return ""
+    boot_time_str = value.split('.')[0]
+    import datetime
+    boot_time = datetime.datetime.strptime(boot_time_str, "%Y%m%d%H%M%S")
+    uptime = datetime.datetime.now() - boot_time
+    return f"{uptime.days}d {uptime.seconds // 3600}h {(uptime.seconds % 3600) // 60}m"
+
+
+@backend("tempo_ligado", "proc", None, ("Linux",))
+def _uptime_proc() -> str:
+    with open("/proc/uptime", "r") as f:
+        uptime_seconds = float(f.readline().split()[0])
+        days = int(uptime_seconds // 86400)
+        hours = int((uptime_seconds % 86400) // 3600)
+        minutes = int((uptime_seconds % 3600) // 60)
+        return f"{days}d {hours}h {minutes}m"
+
+
+def get_uptime() -> str:
+    """Obtém o tempo de atividade do sistema."""
+    try:
+        return run_backends("tempo_ligado") or "Desconhecido"
+    except Exception as e:
+        logger.warning(f"Erro ao obter uptime: {e}")
+    
+    return "Desconhecido"
+
+
+# ==========================================
+# ESQUEMA v3: CAMPOS NUMÉRICOS CANÔNICOS
+# ==========================================
+# Ao lado dos textos legados ("10.116 MB", "1 TB", "3d 4h 12m"), o payload v3
+# traz RAM e disco em bytes e o instante do boot em UTC. Esses valores só mudam
+# quando o hardware muda ou a máquina reinicia: batimentos consecutivos saem
+# byte a byte iguais, e o servidor deriva o tempo ligado a partir de boot_em.
+
+SCHEMA_PAYLOAD = 3
+
+
+def _iso_utc(epoch: float) -> str:
+    import datetime
+    return datetime.datetime.fromtimestamp(int(epoch), datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# --- RAM (bytes) ---
+
+@backend("memoria_ram_bytes", "powershell", "powershell", ("Windows",))
+def _ram_bytes_powershell() -> Optional[int]:
+    saida = run_command(["powershell", "-Command", "(Get-CimInstance Win32_ComputerSystem).TotalPhysicalMemory"]).strip()
+    return int(saida) if saida.isdigit() else None
+
+
+@backend("memoria_ram_bytes", "wmic", "wmic", ("Windows",))
+def _ram_bytes_wmic() -> Optional[int]:
+    valor = _wmic_value(["wmic", "computersystem", "get", "totalphysicalmemory"])
+    return int(valor) if valor.isdigit() else None
+
+
+@backend("memoria_ram_bytes", "proc", None, ("Linux",))
+def _ram_bytes_proc() -> Optional[int]:
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+@sonda("memoria_ram_bytes", custo=1.0, volatilidade=VOLATILIDADE_ESTATICA, padrao=None)
+def get_ram_bytes() -> Optional[int]:
+    """RAM total em bytes."""
+    return run_backends("memoria_ram_bytes")
+
+
+# --- Armazenamento (bytes) ---
+
+@backend("armazenamento_bytes", "powershell", "powershell", ("Windows",))
+def _disk_bytes_powershell() -> Optional[int]:
+    saida = run_command(["powershell", "-Command", "(Get-PhysicalDisk | Measure-Object -Property Size -Sum).Sum"]).strip()
+    return int(saida) if saida.isdigit() else None
+
+
+@backend("armazenamento_bytes", "wmic", "wmic", ("Windows",))
+def _disk_bytes_wmic() -> Optional[int]:
+    linhas = [l.strip() for l in run_command(["wmic", "diskdrive", "get", "size"]).splitlines()[1:]]
+    total = sum(int(l) for l in linhas if l.isdigit())
+    return total or None
+
+
+@backend("armazenamento_bytes", "sysfs", None, ("Linux",))
+def _disk_bytes_sysfs() -> Optional[int]:
+    # Discos físicos: ignora loop, ram, zram, device-mapper, RAID de software e mídias removíveis
+    total = 0
+    for nome in os.listdir("/sys/block"):
+        if nome.startswith(("loop", "ram", "zram", "dm-", "md", "sr", "fd")):
+            continue
+        base = os.path.join("/sys/block", nome)
+        try:
+            with open(os.path.join(base, "removable")) as f:
+                if f.read().strip() == "1":
+                    continue
+            with open(os.path.join(base, "size")) as f:
+                total += int(f.read().strip()) * 512  # setores de 512 bytes, sempre
+        except (OSError, ValueError):
+            continue
+    return total or None
+
+
+@sonda("armazenamento_bytes", custo=1.0, volatilidade=VOLATILIDADE_ESTATICA, padrao=None)
+def get_storage_bytes() -> Optional[int]:
+    """Soma dos discos físicos em bytes."""
+    return run_backends("armazenamento_bytes")
+
+
+# --- Instante do boot (UTC) ---
+
+@backend("boot_em", "powershell", "powershell", ("Windows",))
+def _boot_powershell() -> Optional[str]:
+    saida = run_command(["powershell", "-Command",
+                         "(Get-CimInstance Win32_OperatingSystem).LastBootUpTime.ToUniversalTime().ToString('yyyy-MM-ddTHH:mm:ssZ')"]).strip()
+    return saida or None
+
+
+@backend("boot_em", "wmic", "wmic", ("Windows",))
+def _boot_wmic() -> Optional[str]:
+    # Formato CIM: yyyymmddHHMMSS.ffffff+MMM (deslocamento em minutos)
+    import datetime
+    valor = _wmic_value(["wmic", "os", "get", "lastbootuptime"])
+    if len(valor) < 25:
+        return None
+    local = datetime.datetime.strptime(valor[:14], "%Y%m%d%H%M%S")
+    utc = local - datetime.timedelta(minutes=int(valor[21:]))  # "+180" / "-180"
+    return utc.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@backend("boot_em", "proc", None, ("Linux",))
+def _boot_proc() -> Optional[str]:
+    # btime é fixo durante todo o boot (ao contrário de agora - uptime)
+    with open("/proc/stat", "r") as f:
+        for line in f:
+            if line.startswith("btime "):
+                return _iso_utc(int(line.split()[1]))
+    return None
+
+
+@sonda("boot_em", custo=0.5, volatilidade=VOLATILIDADE_BOOT, padrao=None)
+def get_boot_time() -> Optional[str]:
+    """Instante do último boot em ISO 8601 (UTC)."""
+    return run_backends("boot_em")
+
+
+# ==========================================
+# PROCESSOS EM EXECUÇÃO (LINUX)
+# ==========================================
+# Quando uma máquina é reportada como lenta, o histórico de batimentos mostra
+# o que estava rodando. Cada ciclo lê apenas /proc/<pid>/stat de todos os
+# processos (uma leitura, sem abrir o arquivo pela camada de texto) e escolhe
+# os N maiores por CPU e por memória com heap limitado, sem ordenar a lista
+# inteira. O /proc/<pid>/status (dono do processo) só é lido para os escolhidos.
+
+PROCESSOS_TOP = 5
+
+# Ticks de CPU por processo na amostra anterior: (pid, início) -> utime + stime
+_processos_anterior: Dict[Tuple[str, bytes], int] = {}
+_processos_anterior_em: Optional[float] = None
+_usuarios: Dict[int, str] = {}
+
+
+def _nome_usuario(uid: int) -> str:
+    if uid not in _usuarios:
+        try:
+            import pwd
+            _usuarios[uid] = pwd.getpwuid(uid).pw_name
+        except (ImportError, KeyError):
+            _usuarios[uid] = str(uid)
+    return _usuarios[uid]
+
+
+def _uid_processo(raiz: str, pid: str) -> Optional[int]:
+    try:
+        with open(f"{raiz}/{pid}/status", "rb") as f:
+            for linha in f:
+                if linha.startswith(b"Uid:"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def amostrar_processos(raiz: str = "/proc", n: int = PROCESSOS_TOP, agora: Optional[float] = None) -> Optional[dict]:
+    """
+    Os n processos com mais CPU (% de um núcleo desde a amostra anterior) e os n
+    com mais memória residente. Na primeira amostra, a CPU é a média desde o
+    início do processo.
+    """
+    import heapq
+    from operator import itemgetter
+
+    global _processos_anterior, _processos_anterior_em
+    hz = os.sysconf("SC_CLK_TCK")
+    agora = time.monotonic() if agora is None else agora
+    with open(f"{raiz}/uptime", "rb") as f:
+        uptime_ticks = float(f.read().split()[0]) * hz
+
+    anterior = _processos_anterior
+    intervalo = None
+    if _processos_anterior_em is not None and agora > _processos_anterior_em:
+        intervalo = (agora - _processos_anterior_em) * hz
+    atual = {}
+    processos = []  # (cpu, rss em páginas, pid, conteúdo do stat)
+
+    # Laço quente (um passo por processo): nada além do necessário para ranquear
+    abrir, ler, fechar, somente_leitura = os.open, os.read, os.close, os.O_RDONLY
+    with os.scandir(raiz) as entradas:
+        for entrada in entradas:
+            pid = entrada.name
+            if not pid.isdigit():
+                continue
+            try:
+                fd = abrir(f"{raiz}/{pid}/stat", somente_leitura)
+                try:
+                    dados = ler(fd, 1024)
+                finally:
+                    fechar(fd)
+            except OSError:
+                continue  # processo terminou durante a varredura
+            # "pid (comm) estado ..." — comm pode conter espaços e parênteses
+            campos = dados[dados.rfind(b")") + 2:].split(b" ", 22)
+            if len(campos) < 23:
+                continue
+            ticks = int(campos[11]) + int(campos[12])  # utime + stime
+            chave = (pid, campos[19])                   # starttime distingue pid reutilizado
+            atual[chave] = ticks
+            base = anterior.get(chave)
+            if intervalo and base is not None:
+                cpu = (ticks - base) / intervalo
+            else:
+                vida = uptime_ticks - int(campos[19])
+                cpu = ticks / vida if vida > 0 else 0.0
+            processos.append((cpu, int(campos[21]), pid, dados))
+
+    _processos_anterior, _processos_anterior_em = atual, agora
+    if not processos:
+        return None
+
+    pagina = os.sysconf("SC_PAGE_SIZE")
+
+    def descrever(p) -> dict:
+        uid = _uid_processo(raiz, p[2])
+        dados = p[3]
+        return {
+            "pid": int(p[2]),
+            "nome": dados[dados.find(b"(") + 1:dados.rfind(b")")].decode("utf-8", "replace"),
+            "usuario": _nome_usuario(uid) if uid is not None else None,
+            "cpu": round(p[0] * 100, 1),
+            "rss": p[1] * pagina,
+        }
+
+    return {
+        "total": len(processos),
+        "cpu": [descrever(p) for p in heapq.nlargest(n, processos, key=itemgetter(0))],
+        "memoria": [descrever(p) for p in heapq.nlargest(n, processos, key=itemgetter(1))],
+    }
+
+
+@backend("processos", "proc", None, ("Linux",))
+def _processos_proc() -> Optional[dict]:
+    return amostrar_processos()
+
+
+@sonda("processos", custo=0.1, volatilidade=VOLATILIDADE_MINUTO, plataformas=("Linux",), padrao=None)
+def get_processes() -> Optional[dict]:
+    """Maiores consumidores de CPU e memória no momento."""
+    return run_backends("processos")
+
+
+# ==========================================
+# REDE (INTERFACES E ENDEREÇOS)
+# ==========================================
+# Para achar uma máquina pelo MAC ou IP e perceber quando ela muda de sub-rede.
+# No Linux não há processo filho: nomes, MACs, estado e velocidade vêm de
+# /sys/class/net e todos os endereços de uma única consulta netlink (RTM_GETADDR).
+# O valor só muda quando o conjunto de interfaces/MACs/endereços muda; estado e
+# velocidade do link são os do momento da última mudança. Assim os batimentos
+# seguem byte a byte iguais e o servidor só grava quando a rede muda de fato.
+
+NETLINK_ROUTE = 0
+RTM_NEWADDR, RTM_GETADDR = 20, 22
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+IFA_ADDRESS, IFA_LOCAL, IFA_FLAGS = 1, 2, 8
+# Endereços IPv6 temporários (privacidade) trocam sozinhos ao longo do dia
+IFA_F_TEMPORARY, IFA_F_DEPRECATED = 0x01, 0x20
+RT_SCOPE_LINK = 253  # link-local (fe80::, 169.254.x) e host (127.x, ::1) ficam de fora
+
+# Fora do Linux a leitura exige o PowerShell (~1s): reaproveita o valor por este tempo (s)
+REDE_VALIDADE_COMANDO = 15 * 60
+
+_rede_lida_em: Optional[float] = None
+
+
+def _enderecos_netlink() -> Dict[int, list]:
+    """Endereços globais (IPv4 e IPv6, "ip/prefixo") por índice de interface."""
+    import struct
+
+    s = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        s.settimeout(2)
+        s.bind((0, 0))
+        # nlmsghdr + ifaddrmsg com família AF_UNSPEC: as duas famílias numa só consulta
+        s.send(struct.pack("=IHHII", 24, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+               + struct.pack("=BBBBI", socket.AF_UNSPEC, 0, 0, 0, 0))
+        enderecos: Dict[int, list] = {}
+        while True:
+            dados = s.recv(65536)
+            pos = 0
+            while pos + 16 <= len(dados):
+                tamanho, tipo = struct.unpack_from("=IH", dados, pos)
+                if tipo == NLMSG_DONE:
+                    return enderecos
+                if tipo == NLMSG_ERROR:
+                    raise OSError("netlink recusou a consulta de endereços")
+                if tamanho < 16:
+                    break
+                if tipo == RTM_NEWADDR:
+                    familia, prefixo, flags, escopo, indice = struct.unpack_from("=BBBBI", dados, pos + 16)
+                    atributos = {}
+                    a, fim = pos + 24, pos + tamanho
+                    while a + 4 <= fim:
+                        alen, atipo = struct.unpack_from("=HH", dados, a)
+                        if alen < 4:
+                            break
+                        atributos[atipo] = dados[a + 4:a + alen]
+                        a += (alen + 3) & ~3
+                    if IFA_FLAGS in atributos:
+                        flags = struct.unpack("=I", atributos[IFA_FLAGS][:4])[0]
+                    # IFA_LOCAL é o endereço da interface; em ponto a ponto IFA_ADDRESS é o do par
+                    bruto = atributos.get(IFA_LOCAL) or atributos.get(IFA_ADDRESS)
+                    if bruto and escopo < RT_SCOPE_LINK and not flags & (IFA_F_TEMPORARY | IFA_F_DEPRECATED):
+                        enderecos.setdefault(indice, []).append(f"{socket.inet_ntop(familia, bruto)}/{prefixo}")
+                pos += (tamanho + 3) & ~3
+    finally:
+        s.close()
+
+
+def _ler_sysfs(caminho: str) -> Optional[str]:
+    try:
+        with open(caminho, "r") as f:
+            return f.read().strip()
+    except OSError:  # ex.: speed de interface desconectada dá EINVAL
+        return None
+
+
+def ler_interfaces(raiz: str = "/sys/class/net", enderecos: Optional[Dict[int, list]] = None) -> list:
+    """
+    Interfaces de /sys/class/net com os endereços do netlink. Entram as físicas
+    e as virtuais com endereço global (VPN, bridge); veth e afins sem IP, que
+    aparecem e somem com contêineres, ficam de fora.
+    """
+    if enderecos is None:
+        enderecos = _enderecos_netlink()
+    interfaces = []
+    for nome in os.listdir(raiz):
+        base = f"{raiz}/{nome}"
+        indice = _ler_sysfs(f"{base}/ifindex")
+        if nome == "lo" or not indice or not indice.isdigit():
+            continue
+        ips = sorted(enderecos.get(int(indice), []))
+        virtual = not os.path.exists(f"{base}/device")
+        if virtual and not ips:
+            continue
+        velocidade = _ler_sysfs(f"{base}/speed")
+        interfaces.append({
+            "nome": nome,
+            "mac": _ler_sysfs(f"{base}/address") or None,
+            "virtual": virtual,
+            "estado": _ler_sysfs(f"{base}/operstate"),
+            "velocidade_mbps": int(velocidade) if velocidade and velocidade.lstrip("-").isdigit() and int(velocidade) > 0 else None,
+            "enderecos": ips,
+        })
+    return sorted(interfaces, key=lambda i: i["nome"])
+
+
+@backend("rede", "sysfs", None, ("Linux",))
+def _rede_sysfs() -> list:
+    return ler_interfaces()
+
+
+@backend("rede", "powershell", "powershell", ("Windows",))
+def _rede_powershell() -> list:
+    script = (
+        "ConvertTo-Json -Compress -InputObject @(Get-NetAdapter | ForEach-Object { $a = $_; [pscustomobject]@{"
+        "nome = $a.Name; mac = $a.MacAddress; virtual = [bool]$a.Virtual; estado = \"$($a.Status)\"; "
+        "velocidade = [int64]($a.Speed / 1000000); enderecos = @(Get-NetIPAddress -InterfaceIndex $a.ifIndex "
+        "-ErrorAction SilentlyContinue | Where-Object { $_.AddressState -eq 'Preferred' -and "
+        "$_.SuffixOrigin -ne 'Random' -and $_.IPAddress -notlike 'fe80*' -and $_.IPAddress -notlike '169.254*' } | "
+        "ForEach-Object { \"$($_.IPAddress)/$($_.PrefixLength)\" }) } })"
+    )
+    interfaces = []
+    for i in json.loads(run_command(["powershell", "-NoProfile", "-Command", script], timeout=20) or "[]"):
+        ips = sorted(i.get("enderecos") or [])
+        if i.get("virtual") and not ips:
+            continue
+        interfaces.append({
+            "nome": i["nome"],
+            "mac": (i.get("mac") or "").replace("-", ":").lower() or None,
+            "virtual": bool(i.get("virtual")),
+            "estado": (i.get("estado") or "").lower() or None,
+            "velocidade_mbps": i.get("velocidade") or None,
+            "enderecos": ips,
+        })
+    return sorted(interfaces, key=lambda i: i["nome"])
+
+
+@sonda("rede", custo=0.05, volatilidade=VOLATILIDADE_MINUTO, padrao=None)
+def get_network() -> Optional[dict]:
+    """Interfaces e endereços; devolve o mesmo valor enquanto os endereços não mudam."""
+    global _rede_lida_em
+    estado = load_state()
+    anterior = estado.get("rede")
+    if (anterior and platform.system() != "Linux" and _rede_lida_em is not None
+            and time.time() - _rede_lida_em < REDE_VALIDADE_COMANDO):
+        return anterior["valor"]
+
+    interfaces = run_backends("rede")
+    if not interfaces:
+        return anterior["valor"] if anterior else None
+    _rede_lida_em = time.time()
+
+    assinatura = [[i["nome"], i["mac"], i["enderecos"]] for i in interfaces]
+    if anterior and anterior.get("assinatura") == assinatura:
+        return anterior["valor"]
+
+    valor = {"interfaces": interfaces, "alterada_em": _iso_utc(time.time())}
+    if anterior:
+        antes = sorted(ip for _, _, ips in anterior["assinatura"] for ip in ips)
+        depois = sorted(ip for _, _, ips in assinatura for ip in ips)
+        logger.info(f"Rede mudou: {', '.join(antes) or '-'} -> {', '.join(depois) or '-'}")
+    estado["rede"] = {"assinatura": assinatura, "valor": valor}
+    save_state()
+    return valor
+
+
+# ==========================================
+# ATUALIZAÇÕES DE PACOTES (LOGS DO GERENCIADOR)
+# ==========================================
+# Para saber quando cada máquina foi atualizada e com o quê, sem reler a base
+# de pacotes a cada batimento: os logs do dpkg, do apt e do dnf/yum são lidos
+# a partir da última posição (dispositivo, inode e byte) e só as linhas novas
+# viram eventos, que seguem no próximo batimento (campo pacotes_eventos). O
+# custo acompanha a atividade, não o tamanho do log. Numa rotação, o restante
+# do arquivo antigo (.1, -AAAAMMDD), achado pelo inode, é lido antes do novo.
+# A posição só avança depois que os eventos saem (API, spool ou NDJSON): uma
+# falha no envio relê as mesmas linhas no ciclo seguinte. Não é uma sonda: é
+# um fluxo com confirmação, não um valor para o agendador guardar em cache.
+
+PACOTES_LOGS = (
+    ("/var/log/dpkg.log", "dpkg"),
+    ("/var/log/apt/history.log", "apt"),
+    ("/var/log/dnf.rpm.log", "dnf"),
+    ("/var/log/yum.log", "yum"),
+)
+PACOTES_LEITURA_MAX = 256 * 1024       # bytes por log e por ciclo; o resto fica para o próximo
+PACOTES_HISTORICO_INICIAL = 64 * 1024  # na primeira leitura, só o fim do log (a última atualização)
+
+_ACOES_DPKG = {"install": "instalacao", "upgrade": "atualizacao", "remove": "remocao"}
+_ACOES_RPM = {"Installed": "instalacao", "Install": "instalacao", "Upgrade": "atualizacao",
+              "Updated": "atualizacao", "Downgrade": "rebaixamento", "Erase": "remocao",
+              "Erased": "remocao", "Obsoleted": "remocao"}
+# No dnf, "Upgraded"/"Downgraded" trazem a versão que saiu, depois da que entrou
+_ANTERIORES_RPM = {"Upgraded": "atualizacao", "Downgraded": "rebaixamento"}
+_ARQUITETURAS_RPM = {"x86_64", "noarch", "i686", "i386", "aarch64", "ppc64le", "s390x", "armv7hl"}
+_LINHA_DNF = re.compile(r"^(\S+) \S+ (\w+): (\S+)")
+_LINHA_YUM = re.compile(r"^(\w{3} +\d+ \d\d:\d\d:\d\d) (\w+): (\S+)")
+_APT_PACOTES = ("Install", "Upgrade", "Remove", "Purge", "Downgrade", "Reinstall")
+
+# Posições lidas neste ciclo, gravadas por confirmar_eventos_pacotes
+_pacotes_pendentes: Optional[dict] = None
+
+
+def _epoch_local(texto: str, formato: str) -> Optional[float]:
+    try:
+        return time.mktime(time.strptime(texto, formato))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _eventos_dpkg(linhas: list) -> Tuple[list, int]:
+    """dpkg.log: "2026-10-19 10:23:45 upgrade libssl3:amd64 3.0.2-1 3.0.2-2" (o purge repete o remove)."""
+    eventos = []
+    for linha in linhas:
+        partes = linha.split()
+        if len(partes) != 6 or partes[2] not in _ACOES_DPKG:
+            continue
+        em = _epoch_local(f"{partes[0]} {partes[1]}", "%Y-%m-%d %H:%M:%S")
+        if em is None:
+            continue
+        antes, depois = (None if v == "<none>" else v for v in partes[4:6])
+        evento = {"em": _iso_utc(em), "acao": _ACOES_DPKG[partes[2]], "pacote": partes[3].split(":")[0]}
+        if partes[2] == "remove":
+            evento["versao"] = antes
+        else:
+            evento["versao"] = depois
+            if antes and antes != depois:
+                evento["versao_anterior"] = antes
+        eventos.append(evento)
+    return eventos, len(linhas)
+
+
+def _eventos_apt(linhas: list) -> Tuple[list, int]:
+    """
+    history.log: uma transação por bloco Start-Date ... End-Date, com o comando e
+    quem pediu (os pacotes, um a um, já vêm do dpkg.log). Um bloco ainda sem
+    End-Date não é consumido: volta inteiro no próximo ciclo. O hash do bloco
+    distingue duas transações no mesmo segundo, que de outro modo teriam a
+    mesma chave no servidor.
+    """
+    import hashlib
+    eventos, bloco, aberto_em = [], None, 0
+    for i, linha in enumerate(linhas):
+        chave, _, valor = linha.partition(": ")
+        if chave == "Start-Date":
+            bloco, aberto_em = {"inicio": " ".join(valor.split()), "pacotes": 0}, i
+        elif bloco is None:
+            continue
+        elif chave == "End-Date":
+            em = _epoch_local(bloco["inicio"], "%Y-%m-%d %H:%M:%S")
+            if em is not None:
+                bruto = "\n".join(linhas[aberto_em:i + 1]).encode("utf-8", "replace")
+                evento = {"em": _iso_utc(em), "acao": "transacao", "pacotes": bloco["pacotes"],
+                          "transacao": hashlib.sha1(bruto).hexdigest()[:16]}
+                for campo in ("comando", "usuario"):
+                    if bloco.get(campo):
+                        evento[campo] = bloco[campo][:500]
+                eventos.append(evento)
+            bloco = None
+        elif chave == "Commandline":
+            bloco["comando"] = valor.strip()
+        elif chave == "Requested-By":
+            bloco["usuario"] = valor.split(" (")[0].strip()
+        elif chave in _APT_PACOTES:
+            # "libssl3:amd64 (3.0.2-1, 3.0.2-2), openssl:amd64 (...)": um parêntese por pacote
+            bloco["pacotes"] += valor.count("(")
+    return eventos, aberto_em if bloco is not None else len(linhas)
+
+
+def _nevra(texto: str) -> Tuple[str, Optional[str]]:
+    """("openssl-libs", "1:3.0.7-25.el9") de "openssl-libs-1:3.0.7-25.el9.x86_64"; só o nome fica sem versão."""
+    base, _, arquitetura = texto.rpartition(".")
+    if arquitetura not in _ARQUITETURAS_RPM:
+        base = texto
+    partes = base.rsplit("-", 2)
+    if len(partes) < 3 or not partes[1][:1].isdigit():
+        return base, None
+    return partes[0], f"{partes[1]}-{partes[2]}"
+
+
+def _eventos_rpm(itens: list) -> list:
+    """Eventos de (epoch, marcador, pacote) do dnf.rpm.log/yum.log."""
+    eventos, abertos = [], {}
+    for em, marcador, texto in itens:
+        nome, versao = _nevra(texto)
+        if marcador in _ANTERIORES_RPM:
+            evento = abertos.pop((nome, _ANTERIORES_RPM[marcador]), None)
+            if evento and versao:
+                evento["versao_anterior"] = versao
+            continue
+        if marcador not in _ACOES_RPM:
+            continue
+        evento = {"em": _iso_utc(em), "acao": _ACOES_RPM[marcador], "pacote": nome, "versao": versao}
+        eventos.append(evento)
+        abertos[(nome, evento["acao"])] = evento
+    return eventos
+
+
+def _eventos_dnf(linhas: list) -> Tuple[list, int]:
+    """dnf.rpm.log: "2026-10-19T10:23:45+0000 SUBDEBUG Upgrade: openssl-libs-1:3.0.7-25.el9.x86_64"."""
+    import datetime
+    itens = []
+    for linha in linhas:
+        m = _LINHA_DNF.match(linha)
+        if not m:
+            continue
+        try:
+            em = datetime.datetime.strptime(m.group(1), "%Y-%m-%dT%H:%M:%S%z").timestamp()
+        except ValueError:
+            continue
+        itens.append((em, m.group(2), m.group(3)))
+    return _eventos_rpm(itens), len(linhas)
+
+
+def _eventos_yum(linhas: list) -> Tuple[list, int]:
+    """yum.log: "Oct 19 10:23:45 Updated: bash-4.2.46-35.el7_9.x86_64", sem ano (o atual, ou o anterior se cair no futuro)."""
+    ano, amanha = time.localtime().tm_year, time.time() + 86400
+    itens = []
+    for linha in linhas:
+        m = _LINHA_YUM.match(linha)
+        if not m:
+            continue
+        em = _epoch_local(f"{ano} {m.group(1)}", "%Y %b %d %H:%M:%S")
+        if em is not None and em > amanha:
+            em = _epoch_local(f"{ano - 1} {m.group(1)}", "%Y %b %d %H:%M:%S")
+        if em is not None:
+            itens.append((em, m.group(2), m.group(3)))
+    return _eventos_rpm(itens), len(linhas)
+
+
+_INTERPRETES_PACOTES = {"dpkg": _eventos_dpkg, "apt": _eventos_apt, "dnf": _eventos_dnf, "yum": _eventos_yum}
+
+
+def _ler_linhas(caminho: str, offset: int, limite: int) -> Tuple[list, bool]:
+    """Linhas completas a partir de offset, como [(texto, offset do fim)], e se a leitura chegou ao fim."""
+    with open(caminho, "rb") as f:
+        f.seek(offset)
+        dados = f.read(limite)
+    linhas, inicio = [], 0
+    while True:
+        fim = dados.find(b"\n", inicio)
+        if fim < 0:
+            break
+        linhas.append((dados[inicio:fim].decode("utf-8", "replace"), offset + fim + 1))
+        inicio = fim + 1
+    if not linhas and len(dados) == limite:
+        # Linha maior que o limite: descartada, para a leitura não parar nela
+        linhas.append(("", offset + len(dados)))
+    return linhas, len(dados) < limite
+
+
+def _marca_posicao(caminho: str, offset: int) -> str:
+    """Os bytes logo antes da posição: se mudaram, o log foi truncado e reescrito (copytruncate)."""
+    with open(caminho, "rb") as f:
+        f.seek(max(0, offset - 32))
+        return f.read(min(32, offset)).hex()
+
+
+def _avancar(caminho: str, posicao: dict, interpretar: Callable, limite: int) -> Tuple[list, dict, bool]:
+    linhas, fim = _ler_linhas(caminho, posicao["offset"], limite)
+    eventos, consumidas = interpretar([texto for texto, _ in linhas])
+    if not consumidas and not fim:
+        consumidas = len(linhas)  # bloco incompleto maior que o limite: não há como esperar por ele
+    if consumidas:
+        offset = linhas[consumidas - 1][1]
+        posicao = dict(posicao, offset=offset, marca=_marca_posicao(caminho, offset))
+    return eventos, posicao, fim
+
+
+def _posicao_inicial(caminho: str, st: os.stat_result) -> dict:
+    """Primeira leitura: só os últimos PACOTES_HISTORICO_INICIAL bytes, a partir de uma linha inteira."""
+    offset = max(0, st.st_size - PACOTES_HISTORICO_INICIAL)
+    if offset:
+        with open(caminho, "rb") as f:
+            f.seek(offset - 1)
+            f.readline()
+            offset = f.tell()
+    return {"dev": st.st_dev, "ino": st.st_ino, "offset": offset, "marca": _marca_posicao(caminho, offset)}
+
+
+def _arquivo_rotacionado(caminho: str, posicao: dict) -> Optional[str]:
+    """O arquivo antigo (caminho.1, caminho-AAAAMMDD) com o inode da posição, se ainda não foi comprimido."""
+    import glob
+    for candidato in glob.glob(glob.escape(caminho) + "?*"):
+        if candidato.endswith((".gz", ".xz", ".bz2", ".zst")):
+            continue
+        try:
+            st = os.stat(candidato)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) == (posicao["dev"], posicao["ino"]):
+            return candidato
+    return None
+
+
+def ler_log_pacotes(caminho: str, interpretar: Callable, posicao: Optional[dict],
+                    limite: int = PACOTES_LEITURA_MAX) -> Tuple[list, Optional[dict]]:
+    """
+    Eventos das linhas novas de um log desde posicao ({dev, ino, offset}) e a
+    posição depois delas. Depois de ler até o fim, a posição guarda o tamanho e
+    o mtime vistos: enquanto não mudarem, o ciclo é só o stat, sem abrir o log.
+    """
+    try:
+        st = os.stat(caminho)
+    except FileNotFoundError:
+        st = None
+    visto = [st.st_size, st.st_mtime_ns] if st is not None else None
+    if posicao is None:
+        if st is None:
+            return [], None
+        posicao = _posicao_inicial(caminho, st)
+
+    eventos = []
+    if st is None or (st.st_dev, st.st_ino) != (posicao["dev"], posicao["ino"]):
+        # Rotacionado: primeiro o restante do arquivo antigo
+        antigo = _arquivo_rotacionado(caminho, posicao)
+        if antigo:
+            eventos, posicao, fim = _avancar(antigo, posicao, interpretar, limite)
+            if not fim:
+                return eventos, posicao
+        elif st is not None:
+            logger.info(f"{caminho} rotacionado; o restante do arquivo antigo já não pode ser lido.")
+        if st is None:
+            return eventos, posicao
+        posicao = {"dev": st.st_dev, "ino": st.st_ino, "offset": 0, "marca": ""}
+    elif posicao.get("visto") == visto:
+        return [], posicao
+    elif st.st_size < posicao["offset"] or _marca_posicao(caminho, posicao["offset"]) != posicao.get("marca"):
+        posicao = {"dev": st.st_dev, "ino": st.st_ino, "offset": 0, "marca": ""}  # truncado no lugar (copytruncate)
+
+    novos, posicao, fim = _avancar(caminho, posicao, interpretar, limite)
+    if fim:
+        posicao = dict(posicao, visto=visto)
+    return eventos + novos, posicao
+
+
+def ler_eventos_pacotes(limite: int = PACOTES_LEITURA_MAX) -> list:
+    """Eventos novos de todos os logs de pacotes; as posições só valem depois de confirmar_eventos_pacotes."""
+    global _pacotes_pendentes
+    if platform.system() != "Linux":
+        return []
+    salvas = load_state().get("pacotes_logs", {})
+    posicoes, eventos = {}, []
+    for caminho, origem in PACOTES_LOGS:
+        posicao = salvas.get(caminho)
+        try:
+            novos, posicao = ler_log_pacotes(caminho, _INTERPRETES_PACOTES[origem], posicao, limite)
+        except OSError as e:
+            logger.debug(f"Log de pacotes {caminho} ilegível: {e}")
+            novos = []
+        for evento in novos:
+            evento["origem"] = origem
+        eventos += novos
+        if posicao:
+            posicoes[caminho] = posicao
+
+    _pacotes_pendentes = posicoes if posicoes != salvas else None
+    if eventos:
+        logger.info(f"Pacotes: {len(eventos)} evento(s) novo(s) nos logs do gerenciador")
+    return sorted(eventos, key=lambda e: e["em"])
+
+
+def confirmar_eventos_pacotes() -> None:
+    """Avança as posições dos logs depois que os eventos lidos foram entregues (API, spool ou NDJSON)."""
+    global _pacotes_pendentes
+    if _pacotes_pendentes is None:
+        return
+    load_state()["pacotes_logs"] = _pacotes_pendentes
+    _pacotes_pendentes = None
+    save_state()
+
+
+# ==========================================
+# GOVERNANÇA DE RECURSOS
+# ==========================================
+# Em servidores de aplicação o coletor não pode disputar CPU e disco com o que
+# importa. Com GOVERNANCA ligada, todas as threads do agente (e os comandos
+# que elas disparam, que herdam a prioridade) passam para a prioridade mínima
+# de CPU e de E/S, opcionalmente dentro de um cgroup v2 com cota de CPU; a
+# coleta espera enquanto a carga da máquina estiver alta. Independentemente
+# disso, cada batimento leva o CPU e a E/S gastos pelo próprio agente desde o
+# batimento anterior (campo consumo_coletor), para comprovar o orçamento.
+
+CARGA_MAXIMA_PADRAO = 1.5   # load average (1 min) por núcleo acima do qual a coleta espera
+ADIAMENTO_MAXIMO = 600      # s; depois disso coleta mesmo com a máquina carregada
+ADIAMENTO_PASSO = 15        # s entre verificações da carga
+CGROUP_PERIODO = 100000     # µs, período do cpu.max
+
+IOPRIO_CLASSE_OCIOSA = 3    # IOPRIO_CLASS_IDLE: só usa o disco quando ninguém mais usa
+SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+
+IDLE_PRIORITY_CLASS = 0x40
+PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000
+
+_prioridade_aplicada: Optional[str] = None
+_cgroup_aplicado = False
+_ultimo_adiamento = 0.0
+_consumo_anterior: Optional[dict] = None
+
+
+def _inicio_do_processo() -> float:
+    """Horário de início do processo (o CPU de os.times() conta desde ele, não desde o import)."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            inicio = int(f.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            ligado = float(f.read().split()[0])
+        return time.time() - ligado + inicio / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+_inicio_processo = _inicio_do_processo()
+
+
+def _ioprio_ociosa(tid: int) -> bool:
+    """ioprio_set(IOPRIO_WHO_PROCESS, tid, IDLE) via syscall (não há wrapper na libc)."""
+    import ctypes
+    numero = SYS_IOPRIO_SET.get(platform.machine())
+    if numero is None:
+        return False
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.syscall(numero, 1, tid, IOPRIO_CLASSE_OCIOSA << 13) == 0
+
+
+def reduzir_prioridade() -> str:
+    """Prioridade mínima de CPU e E/S para o agente; devolve o que foi aplicado."""
+    aplicado = []
+    sistema = platform.system()
+    if sistema == "Windows":
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        # Sem os tipos, o pseudo-handle (-1) do processo iria como int de 32 bits
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.SetPriorityClass.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+        kernel32.SetPriorityClass.restype = wintypes.BOOL
+        processo = kernel32.GetCurrentProcess()
+        # A classe IDLE é herdada pelos comandos (PowerShell, wmic); o modo de
+        # segundo plano reduz também a prioridade de E/S e de memória
+        if kernel32.SetPriorityClass(processo, IDLE_PRIORITY_CLASS):
+            aplicado.append("idle")
+        if kernel32.SetPriorityClass(processo, PROCESS_MODE_BACKGROUND_BEGIN):
+            aplicado.append("background")
+        return "+".join(aplicado)
+
+    if sistema != "Linux":
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, 19)
+            aplicado.append("nice 19")
+        except (AttributeError, OSError) as e:
+            logger.debug(f"nice indisponível: {e}")
+        return "+".join(aplicado)
+
+    # No Linux prioridade e ioprio são por thread: aplica a todas as já criadas;
+    # as futuras (e os processos filhos) herdam da thread que as cria
+    tids = [int(t) for t in os.listdir("/proc/self/task")]
+    for rotulo, aplicar in (
+        ("sched_idle", lambda tid: os.sched_setscheduler(tid, os.SCHED_IDLE, os.sched_param(0))),
+        ("nice 19", lambda tid: os.setpriority(os.PRIO_PROCESS, tid, 19)),
+        ("io idle", _ioprio_ociosa),
+    ):
+        ok = True
+        for tid in tids:
+            try:
+                ok = aplicar(tid) is not False and ok
+            except ProcessLookupError:
+                continue  # thread encerrada no meio do caminho
+            except (AttributeError, OSError) as e:
+                logger.debug(f"Governança: {rotulo} indisponível: {e}")
+                ok = False
+                break
+        if ok:
+            aplicado.append(rotulo)
+    return "+".join(aplicado)
+
+
+def entrar_cgroup(caminho: str, cpu_percentual: Optional[float] = None) -> bool:
+    """Move o agente para o cgroup v2 informado, criando-o com a cota de CPU (% de um núcleo)."""
+    pai = os.path.dirname(caminho.rstrip("/"))
+    if not os.path.exists(os.path.join(pai, "cgroup.controllers")):
+        logger.warning(f"Governança: {pai} não é um cgroup v2; cgroup ignorado.")
+        return False
+    try:
+        os.makedirs(caminho, exist_ok=True)
+        if cpu_percentual:
+            try:
+                # O controlador de CPU precisa estar habilitado no cgroup pai
+                with open(os.path.join(pai, "cgroup.subtree_control"), "w") as f:
+                    f.write("+cpu")
+            except OSError:
+                pass  # já habilitado ou gerenciado pelo systemd; o cpu.max abaixo confirma
+            cota = max(1000, int(CGROUP_PERIODO * float(cpu_percentual) / 100))
+            with open(os.path.join(caminho, "cpu.max"), "w") as f:
+                f.write(f"{cota} {CGROUP_PERIODO}")
+        with open(os.path.join(caminho, "cgroup.procs"), "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning(f"Governança: não foi possível usar o cgroup {caminho}: {e}")
+        return False
+
+
+def aplicar_governanca(config: dict) -> None:
+    """Liga a governança quando configurada. Não há volta sem reiniciar: só root pode subir a prioridade."""
+    global _prioridade_aplicada, _cgroup_aplicado
+    if not config.get("GOVERNANCA"):
+        return
+    if _prioridade_aplicada is None:
+        _prioridade_aplicada = reduzir_prioridade()
+        logger.info(f"Governança de recursos: prioridade {_prioridade_aplicada or 'inalterada'}")
+    # cgroup só pelo config.json local: exige permissão de escrita em /sys/fs/cgroup
+    local = load_config()
+    if not _cgroup_aplicado and platform.system() == "Linux" and local.get("GOVERNANCA_CGROUP"):
+        _cgroup_aplicado = entrar_cgroup(local["GOVERNANCA_CGROUP"], local.get("GOVERNANCA_CPU_MAX"))
+        if _cgroup_aplicado:
+            logger.info(f"Governança de recursos: cgroup {local['GOVERNANCA_CGROUP']} "
+                        f"(CPU máx. {local.get('GOVERNANCA_CPU_MAX') or 'sem cota'}%)")
+
+
+def carga_por_nucleo() -> Optional[float]:
+    """Load average de 1 minuto dividido pelos núcleos utilizáveis; None onde não existe (Windows)."""
+    try:
+        carga = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    try:
+        nucleos = len(os.sched_getaffinity(0))
+    except AttributeError:
+        nucleos = os.cpu_count() or 1
+    return carga / max(1, nucleos)
+
+
+def carga_alta(config: dict) -> Optional[float]:
+    """Carga por núcleo se a governança estiver ligada e a carga acima do limite; senão None."""
+    if not config.get("GOVERNANCA"):
+        return None
+    carga = carga_por_nucleo()
+    try:
+        limite = float(config.get("CARGA_MAXIMA", CARGA_MAXIMA_PADRAO))
+    except (TypeError, ValueError):
+        limite = CARGA_MAXIMA_PADRAO
+    return carga if carga is not None and carga > limite else None
+
+
+def aguardar_carga(maximo: float = ADIAMENTO_MAXIMO) -> float:
+    """Adia a coleta enquanto a carga estiver alta (até maximo s); devolve quanto esperou."""
+    global _ultimo_adiamento
+    inicio = time.monotonic()
+    carga = carga_alta(config_efetiva())
+    if carga is not None:
+        logger.info(f"Carga alta ({carga:.2f} por núcleo); adiando a coleta.")
+        while carga is not None and time.monotonic() - inicio < maximo:
+            time.sleep(min(ADIAMENTO_PASSO, maximo - (time.monotonic() - inicio)))
+            carga = carga_alta(config_efetiva())
+        if carga is not None:
+            logger.warning(f"Carga ainda alta após {maximo:.0f}s; coletando assim mesmo.")
+    _ultimo_adiamento = time.monotonic() - inicio
+    return _ultimo_adiamento
+
+
+def _io_processo() -> dict:
+    """Bytes de E/S do agente desde o início (no Linux inclui os comandos já encerrados)."""
+    if platform.system() == "Linux":
+        try:
+            with open("/proc/self/io", "r") as f:
+                campos = {k: int(v) for k, v in (linha.split(":") for linha in f)}
+            # rchar/wchar: tudo que passou por read/write; read_bytes/write_bytes: o que chegou ao disco
+            return {"leitura_bytes": campos["rchar"], "escrita_bytes": campos["wchar"],
+                    "disco_leitura_bytes": campos["read_bytes"], "disco_escrita_bytes": campos["write_bytes"]}
+        except (OSError, KeyError, ValueError):
+            return {}
+    if platform.system() == "Windows":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class IO_COUNTERS(ctypes.Structure):
+                _fields_ = [(nome, ctypes.c_ulonglong) for nome in (
+                    "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                    "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+            contadores = IO_COUNTERS()
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            kernel32.GetProcessIoCounters.argtypes = (wintypes.HANDLE, ctypes.POINTER(IO_COUNTERS))
+            kernel32.GetProcessIoCounters.restype = wintypes.BOOL
+            if kernel32.GetProcessIoCounters(kernel32.GetCurrentProcess(), ctypes.byref(contadores)):
+                return {"leitura_bytes": contadores.ReadTransferCount, "escrita_bytes": contadores.WriteTransferCount}
+        except Exception as e:
+            logger.debug(f"Contadores de E/S indisponíveis: {e}")
+    return {}
+
+
+def _contadores_consumo() -> dict:
+    tempos = os.times()
+    return {
+        "em": time.time(),
+        "cpu_s": tempos.user + tempos.system,
+        "cpu_filhos_s": tempos.children_user + tempos.children_system,
+        **_io_processo(),
+    }
+
+
+# Somados entre ciclos sem envio; o restante do relatório é do último ciclo
+CONSUMO_ACUMULADO = ("intervalo_s", "cpu_s", "cpu_filhos_s", "leitura_bytes", "escrita_bytes",
+                     "disco_leitura_bytes", "disco_escrita_bytes", "adiado_s")
+# O que vai no batimento vivo
+CONSUMO_VIVO = ("ciclos", "intervalo_s", "cpu_s", "cpu_filhos_s", "leitura_bytes", "escrita_bytes",
+                "acima_do_orcamento")
+
+
+def get_agent_usage() -> dict:
+    """
+    CPU e E/S gastos pelo próprio agente desde o último relatório entregue. Um
+    ciclo sem envio (ritmo adaptativo) soma o seu gasto ao pendente, guardado
+    no estado até confirmar_consumo, para o total da frota não perder ciclos.
+    """
+    global _consumo_anterior
+    atual = _contadores_consumo()
+    anterior = _consumo_anterior or {"em": _inicio_processo}
+    _consumo_anterior = atual
+
+    consumo = {"intervalo_s": round(atual["em"] - anterior["em"], 1)}
+    for chave, valor in atual.items():
+        if chave != "em":
+            delta = valor - anterior.get(chave, 0)
+            consumo[chave] = round(delta, 3) if isinstance(delta, float) else delta
+    config = config_efetiva()
+    carga = carga_por_nucleo()
+    if carga is not None:
+        consumo["carga"] = round(carga, 2)
+    if config.get("GOVERNANCA"):
+        consumo["prioridade"] = _prioridade_aplicada
+        consumo["adiado_s"] = round(_ultimo_adiamento, 1)
+
+    try:
+        orcamento_cpu = float(config.get("ORCAMENTO_CPU_CICLO") or 0)
+    except (TypeError, ValueError):
+        orcamento_cpu = 0
+    if orcamento_cpu:
+        gasto = consumo["cpu_s"] + consumo["cpu_filhos_s"]
+        consumo["acima_do_orcamento"] = gasto > orcamento_cpu
+        if consumo["acima_do_orcamento"]:
+            logger.warning(f"Consumo do coletor acima do orçamento: {gasto:.2f}s de CPU > {orcamento_cpu}s")
+
+    estado = load_state()
+    pendente = estado.get("consumo_pendente") or {}
+    for chave in CONSUMO_ACUMULADO:
+        if chave in pendente:
+            soma = consumo.get(chave, 0) + pendente[chave]
+            consumo[chave] = round(soma, 3) if isinstance(soma, float) else soma
+    consumo["ciclos"] = pendente.get("ciclos", 0) + 1
+    if pendente.get("acima_do_orcamento"):
+        consumo["acima_do_orcamento"] = True
+    estado["consumo_pendente"] = consumo
+    return consumo
+
+
+def confirmar_consumo(enviados: list) -> None:
+    """Zera o consumo pendente depois que um registro com ele foi entregue (API, spool ou NDJSON)."""
+    estado = load_state()
+    if estado.get("consumo_pendente") and any("consumo_coletor" in r for r in enviados):
+        estado.pop("consumo_pendente")
+        save_state()
+
+
+@cronometrado("coleta")
+def collect_system_info(orcamento: float = ORCAMENTO_COLETA_PADRAO, estrito: bool = False) -> dict:
+    """Coleta as informações do sistema via agendador de sondas."""
+    hostname = socket.gethostname()
+    valores = _agendador.coletar(orcamento, estrito)
+    serial = valores["serial"]
+
+    info = {
+        "nome": hostname,
+        "tipo": "Computador",
+        "serial": serial,
+        "status": "Em uso",
+        "processador": valores.get("processador", ""),
+        "memoria_ram": valores.get("memoria_ram", ""),
+        "armazenamento": valores.get("armazenamento", ""),
+        "acesso_remoto": None,
+        "sistema_operacional": valores.get("sistema_operacional", "Desconhecido"),
+        "ultimo_usuario": valores.get("ultimo_usuario", "Desconhecido"),
+        "schema": SCHEMA_PAYLOAD,
+    }
+    # Sondas registradas além dos campos clássicos entram no payload como estão;
+    # sem valor (None) ficam de fora, para o servidor manter o último conhecido
+    for campo, valor in valores.items():
+        if valor is not None:
+            info.setdefault(campo, valor)
+    # Não é uma sonda: mede o agente, não a máquina, e vai mesmo sem orçamento
+    info["consumo_coletor"] = get_agent_usage()
+    # Também fora do agendador: só as linhas novas dos logs de pacotes, confirmadas após o envio
+    eventos = ler_eventos_pacotes()
+    if eventos:
+        info["pacotes_eventos"] = eventos
+    # Com boot_em o servidor calcula o tempo ligado; o texto só vai como alternativa
+    if not info.get("boot_em"):
+        info["tempo_ligado"] = get_uptime()
+    # Sondas desligadas remotamente ficam fora do payload: o servidor mantém o último valor
+    for campo in _agendador.desativadas:
+        info.pop(campo, None)
+
+    logger.info(f"Informações coletadas: {hostname} (Serial: {serial})")
+    # Log detalhado para depuração
+    logger.info(f"  SO: {info.get('sistema_operacional', '-')}")
+    logger.info(f"  Usuário: {info.get('ultimo_usuario', '-')}")
+    logger.info(f"  Boot: {info.get('boot_em') or info.get('tempo_ligado', '-')}")
+    
+    return info
+
+
+# ==========================================
+# MODO HOSPEDEIRO (CONTÊINERES E VMs)
+# ==========================================
+# Em hosts de virtualização e contêineres, um único coletor inventaria os
+# convidados sem instalar nada neles: contêineres são achados pelos diretórios
+# de cgroup v2 (Docker, Podman, containerd/CRI-O, LXC) e VMs pelos XML do
+# libvirt das máquinas em execução. Cada convidado vira um registro no formato
+# de ativos, com os limites de CPU/memória lidos dos arquivos do cgroup, e
+# todos seguem com o batimento do host num único envio em lote. Só convidados
+# em execução são enviados: um parado mantém o último registro e a última
+# conexão envelhece, como a de uma máquina desligada.
+
+HOSPEDEIRO_CGROUP = "/sys/fs/cgroup"
+HOSPEDEIRO_LIBVIRT = "/run/libvirt/qemu"
+HOSPEDEIRO_DOCKER = "/var/lib/docker/containers"
+HOSPEDEIRO_PROC = "/proc"
+
+LOTE_MAX_REGISTROS = 1000  # limite do /api/collect e de fn_ingest_coletor_direto
+
+# docker-<id>.scope (systemd), docker/<id> (cgroupfs), libpod-, cri-containerd-, crio-
+_CGROUP_CONTEINER = re.compile(r"^(?:(docker|libpod|cri-containerd|crio)-)?([0-9a-f]{64})(?:\.scope)?$")
+_CGROUP_LXC = re.compile(r"^lxc\.payload\.(.+)$")
+# machine-qemu\x2d3\x2dnome\x2dda\x2dvm.scope
+_CGROUP_VM = re.compile(r"^machine-(qemu\\x2d\d+\\x2d.+)\.scope$")
+
+
+def _ler_texto(caminho: str) -> Optional[str]:
+    try:
+        with open(caminho, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _contar_cpus(lista: str) -> int:
+    """Quantidade de CPUs numa lista do cpuset ("0-3,6" -> 5)."""
+    total = 0
+    for parte in filter(None, lista.split(",")):
+        inicio, _, fim = parte.partition("-")
+        total += int(fim or inicio) - int(inicio) + 1
+    return total
+
+
+def limites_cgroup(caminho: str) -> dict:
+    """Limites de um cgroup v2; ausente ou "max" = sem limite (None). Uso atual fica de fora: muda a cada leitura."""
+    def numero(nome: str) -> Optional[int]:
+        valor = _ler_texto(f"{caminho}/{nome}")
+        return int(valor) if valor and valor.isdigit() else None
+
+    limites: Dict[str, Any] = {"cpu": None, "memoria_bytes": numero("memory.max"),
+                               "swap_bytes": numero("memory.swap.max"), "processos": numero("pids.max")}
+    cpu_max = (_ler_texto(f"{caminho}/cpu.max") or "max").split()
+    if cpu_max[0].isdigit() and len(cpu_max) > 1 and int(cpu_max[1]) > 0:
+        limites["cpu"] = round(int(cpu_max[0]) / int(cpu_max[1]), 2)
+    cpuset = _ler_texto(f"{caminho}/cpuset.cpus.effective")
+    if cpuset:
+        limites["cpus_fixadas"] = _contar_cpus(cpuset)
+    io_max = _ler_texto(f"{caminho}/io.max")
+    if io_max:
+        limites["io"] = io_max.splitlines()
+    return limites
+
+
+def _os_release(raiz: str) -> Optional[str]:
+    for caminho in ("etc/os-release", "usr/lib/os-release"):
+        texto = _ler_texto(f"{raiz}/{caminho}")
+        if texto:
+            campos = dict(l.split("=", 1) for l in texto.splitlines() if "=" in l)
+            nome = campos.get("PRETTY_NAME") or campos.get("NAME")
+            if nome:
+                return nome.strip('"')
+    return None
+
+
+def _descrever_conteiner(caminho: str, motor: str, ident: str, docker: str, proc: str) -> dict:
+    """Registro de um contêiner a partir do cgroup, do processo principal e dos metadados do motor."""
+    procs = (_ler_texto(f"{caminho}/cgroup.procs") or "").split()
+    raiz = f"{proc}/{procs[0]}/root" if procs else None
+    nome = imagem = iniciado = None
+    if motor == "docker":
+        try:
+            with open(f"{docker}/{ident}/config.v2.json", "r", encoding="utf-8") as f:
+                config = json.load(f)
+            nome = (config.get("Name") or "").lstrip("/") or None
+            imagem = (config.get("Config") or {}).get("Image")
+            iniciado = (config.get("State") or {}).get("StartedAt") or ""
+            iniciado = iniciado[:19] + "Z" if iniciado[:4].isdigit() and not iniciado.startswith("0001") else None
+        except (OSError, ValueError):
+            pass
+    elif motor == "lxc":
+        nome = ident
+    # Sem metadados do motor, o hostname do namespace UTS costuma ser o nome do pod/contêiner
+    if not nome and raiz:
+        nome = _ler_texto(f"{raiz}/etc/hostname")
+    nome = nome or ident[:12]
+    return {
+        "nome": nome,
+        "tipo": "Contêiner",
+        "status": "Em uso",
+        "sistema_operacional": (_os_release(raiz) if raiz else None) or imagem or "Desconhecido",
+        "boot_em": iniciado,
+        "convidado": {"motor": motor, "id": ident, "imagem": imagem},
+        "limites": limites_cgroup(caminho),
+    }
+
+
+def descobrir_cgroups(raiz: str = HOSPEDEIRO_CGROUP) -> Tuple[list, Dict[str, str]]:
+    """
+    Percorre a árvore de cgroups uma vez: ([(caminho, motor, id)] dos contêineres,
+    {"qemu-<id>-<nome>": caminho} dos escopos do libvirt). Não desce dentro de um convidado.
+    """
+    conteineres, vms = [], {}
+    for diretorio, subdiretorios, _ in os.walk(raiz):
+        for nome in list(subdiretorios):
+            caminho = os.path.join(diretorio, nome)
+            m = _CGROUP_CONTEINER.match(nome)
+            if m:
+                motor = {None: os.path.basename(diretorio) if os.path.basename(diretorio) == "docker" else "cri",
+                         "libpod": "podman"}.get(m.group(1), m.group(1))
+                conteineres.append((caminho, motor, m.group(2)))
+            elif _CGROUP_LXC.match(nome):
+                conteineres.append((caminho, "lxc", _CGROUP_LXC.match(nome).group(1)))
+            elif _CGROUP_VM.match(nome):
+                vms[_CGROUP_VM.match(nome).group(1).replace("\\x2d", "-")] = caminho
+            else:
+                continue
+            subdiretorios.remove(nome)
+    return conteineres, vms
+
+
+def _nome_maquina_libvirt(id_dominio: str, nome: str) -> Tuple[str, bool]:
+    """
+    Nome da máquina que o libvirt registra no systemd para a VM em execução
+    ("qemu-<id>-<nome>", como virDomainDriverGenerateMachineName): do nome só
+    ficam letras, dígitos, "-" e "." (sem repetir nem terminar em "-"/"."), e o
+    total para em 64 caracteres. Devolve (nome, se foi truncado).
+    """
+    saida, pular, truncado = f"qemu-{id_dominio}-", True, False
+    for ch in nome:
+        if len(saida) >= 64:
+            truncado = True
+            break
+        if ch in ".-":
+            if not pular:
+                saida += ch
+            pular = True
+            continue
+        pular = False
+        if ch.isascii() and ch.isalnum():
+            saida += ch
+    return saida.rstrip("-."), truncado
+
+
+def _cgroup_da_vm(dominio, cgroups_vm: Dict[str, str]) -> Optional[str]:
+    """Escopo do cgroup da VM pelo nome exato; prefixo só para nome truncado, e se for o único."""
+    if not dominio.get("id") or dominio.get("id") == "-1":
+        return None  # definição de VM parada: não há escopo
+    esperado, truncado = _nome_maquina_libvirt(dominio.get("id"), dominio.findtext("name"))
+    if esperado in cgroups_vm:
+        return cgroups_vm[esperado]
+    if truncado:
+        # Outra versão do libvirt pode cortar em outro ponto; o id em "qemu-<id>-" é único entre as em execução
+        candidatos = [c for n, c in cgroups_vm.items()
+                      if n.startswith(f"qemu-{dominio.get('id')}-") and (n.startswith(esperado) or esperado.startswith(n))]
+        if len(candidatos) == 1:
+            return candidatos[0]
+    return None
+
+
+def _descrever_vm(xml: str, cgroups_vm: Dict[str, str]) -> Optional[dict]:
+    """Registro de uma VM a partir do XML do libvirt (definição ou estado em execução)."""
+    import xml.etree.ElementTree as ET
+
+    raiz = ET.parse(xml).getroot()
+    dominio = raiz if raiz.tag == "domain" else raiz.find("domain")  # <domstatus><domain>...
+    if dominio is None or not dominio.findtext("name"):
+        return None
+    nome = dominio.findtext("name")
+    fatores = {"b": 1, "bytes": 1, "kib": 1024, "k": 1024, "mib": 1024 ** 2, "m": 1024 ** 2,
+               "gib": 1024 ** 3, "g": 1024 ** 3, "tib": 1024 ** 4, "t": 1024 ** 4}
+
+    def em_bytes(elemento) -> Optional[int]:
+        if elemento is None or not (elemento.text or "").strip().isdigit():
+            return None
+        return int(elemento.text) * fatores.get((elemento.get("unit") or "KiB").lower(), 1024)
+
+    memoria = em_bytes(dominio.find("memory"))
+    vcpus = int(dominio.findtext("vcpu") or 1)
+    discos = [d.find("source").get("file") or d.find("source").get("dev")
+              for d in dominio.findall("devices/disk[@device='disk']") if d.find("source") is not None]
+    interfaces = [{"nome": (i.find("target").get("dev") if i.find("target") is not None else None),
+                   "mac": i.find("mac").get("address").lower(), "virtual": True,
+                   "estado": None, "velocidade_mbps": None, "enderecos": []}
+                  for i in dominio.findall("devices/interface") if i.find("mac") is not None]
+
+    # Limites: os do cgroup da VM em execução; sem ele, os declarados no XML
+    caminho = _cgroup_da_vm(dominio, cgroups_vm)
+    if caminho:
+        limites = limites_cgroup(caminho)
+    else:
+        quota, periodo = dominio.findtext("cputune/quota"), dominio.findtext("cputune/period") or "100000"
+        limites = {"cpu": round(int(quota) / int(periodo), 2) if quota and int(quota) > 0 else None,
+                   "memoria_bytes": em_bytes(dominio.find("memtune/hard_limit"))}
+    limites["vcpus"] = vcpus
+    limites["discos"] = discos
+
+    # Serial SMBIOS configurado no libvirt é o mesmo que um coletor dentro da VM enviaria
+    serial = dominio.findtext("sysinfo/system/entry[@name='serial']")
+    return {
+        "nome": dominio.findtext("title") or nome,
+        "serial": serial or f"VM-{dominio.findtext('uuid')}",
+        "tipo": "Máquina Virtual",
+        "status": "Em uso",
+        "processador": f"{vcpus} vCPU",
+        "memoria_ram": f"{memoria // 1024 ** 2} MB" if memoria else "",
+        "memoria_ram_bytes": memoria,
+        "convidado": {"motor": dominio.get("type") or "libvirt", "id": dominio.findtext("uuid"), "imagem": None},
+        "limites": limites,
+        "rede": {"interfaces": interfaces} if interfaces else None,
+    }
+
+
+@cronometrado("convidados")
+def coletar_convidados(hospedeiro: str, cgroup: str = HOSPEDEIRO_CGROUP, libvirt: str = HOSPEDEIRO_LIBVIRT,
+                       docker: str = HOSPEDEIRO_DOCKER, proc: str = HOSPEDEIRO_PROC) -> list:
+    """Um registro por contêiner ou VM em execução, ligados ao serial do hospedeiro."""
+    registros = []
+    conteineres, cgroups_vm = descobrir_cgroups(cgroup) if os.path.isdir(cgroup) else ([], {})
+    for caminho, motor, ident in sorted(conteineres):
+        # Escopo que sobrou de um contêiner parado não tem processos (nem nos filhos)
+        if "populated 0" in (_ler_texto(f"{caminho}/cgroup.events") or ""):
+            continue
+        try:
+            registro = _descrever_conteiner(caminho, motor, ident, docker, proc)
+        except Exception as e:
+            logger.debug(f"Contêiner {ident[:12]} ignorado: {e}")
+            continue
+        # O nome (estável entre recriações) identifica o contêiner dentro do host
+        registro["serial"] = f"CT-{hospedeiro}-{registro['nome']}"
+        registros.append(registro)
+
+    if os.path.isdir(libvirt):
+        for arquivo in sorted(os.listdir(libvirt)):
+            if not arquivo.endswith(".xml"):
+                continue
+            try:
+                registro = _descrever_vm(os.path.join(libvirt, arquivo), cgroups_vm)
+            except Exception as e:
+                logger.debug(f"Domínio {arquivo} ignorado: {e}")
+                continue
+            if registro:
+                registros.append(registro)
+
+    for registro in registros:
+        registro.update({"hospedeiro": hospedeiro, "schema": SCHEMA_PAYLOAD})
+        # Como no batimento, campo sem valor fica de fora e o servidor mantém o último
+        for campo in [c for c, v in registro.items() if v is None]:
+            del registro[campo]
+    return registros
+
+
+def modo_hospedeiro() -> bool:
+    """MODO_HOSPEDEIRO no config.json local (ou --hospedeiro)."""
+    return bool(load_config().get("MODO_HOSPEDEIRO"))
+
+
+def numerar(registros: list) -> list:
+    """
+    Dá a cada registro seu "seq": (serial, seq) é a chave de idempotência do
+    envio. Só cresce, mesmo com o estado perdido: o maior entre o último + 1 e o
+    relógio em ms. Retentativas, cópias do hedging e o spool reenviam o mesmo
+    seq; o servidor descarta repetições e registros mais antigos que o último.
+    """
+    estado = load_state()
+    seq = estado.get("seq", 0)
+    for registro in registros:
+        seq = max(seq + 1, int(time.time() * 1000))
+        registro["seq"] = seq
+    estado["seq"] = seq
+    save_state()
+    return registros
+
+
+def registros_do_ciclo(info: dict) -> list:
+    """O batimento do host e, no modo hospedeiro, os dos convidados, já numerados."""
+    if not modo_hospedeiro():
+        return numerar([info])
+    inicio = time.monotonic()
+    convidados = coletar_convidados(info["serial"])
+    logger.info(f"Modo hospedeiro: {len(convidados)} convidado(s) em {time.monotonic() - inicio:.2f}s")
+    return numerar([info] + convidados)
+
+
+def enviar_ciclo(registros: list) -> bool:
+    """Envia os registros do ciclo num único lote (dividido só acima do limite do servidor)."""
+    if len(registros) == 1:
+        return send_to_api(registros[0])
+    return all(send_to_api(registros[i:i + LOTE_MAX_REGISTROS])
+               for i in range(0, len(registros), LOTE_MAX_REGISTROS))
+
+
+# ==========================================
+# RITMO ADAPTATIVO DOS BATIMENTOS
+# ==========================================
+# A coleta local continua a cada HEARTBEAT_INTERVAL, mas o registro completo só
+# é enviado quando algum campo muda. Sem mudança vai apenas um batimento "vivo"
+# (serial, seq, boot e os totais de consumo do agente), e o intervalo entre eles dobra a cada um até
+# HEARTBEAT_MAXIMO. O teto também segue o ritmo de cada campo: um campo que
+# costuma mudar a cada 40 minutos limita o intervalo a 20. Uma mudança volta
+# ao intervalo base no mesmo ciclo. Cada batimento declara em
+# intervalo_batimento quanto pode demorar o próximo; o painel e a análise da
+# frota usam esse valor para decidir quando o ativo está offline.
+
+HEARTBEAT_MAXIMO_PADRAO = 1800
+BATIMENTO_COMPLETO_MAXIMO = 6 * 3600  # sem mudança, ainda assim um completo a cada 6h
+# Medições que mudam a todo ciclo: seguem no completo, mas não contam como mudança
+RITMO_IGNORADOS = {"seq", "consumo_coletor", "tempo_ligado", "processos", "intervalo_batimento"}
+
+
+def _impressao_valor(valor: Any) -> str:
+    import hashlib
+    return hashlib.sha1(json.dumps(valor, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def heartbeat_maximo(base: float) -> float:
+    """HEARTBEAT_MAXIMO da configuração efetiva (0 desliga o ritmo adaptativo)."""
+    try:
+        return float(config_efetiva().get("HEARTBEAT_MAXIMO", max(base, HEARTBEAT_MAXIMO_PADRAO)))
+    except (TypeError, ValueError):
+        logger.warning("HEARTBEAT_MAXIMO inválido na configuração, usando o padrão.")
+        return max(base, HEARTBEAT_MAXIMO_PADRAO)
+
+
+def planejar_envio(registros: list, base: float, agora: Optional[float] = None) -> Tuple[list, dict]:
+    """
+    Decide o que enviar neste ciclo: o registro completo de quem mudou (ou está
+    há BATIMENTO_COMPLETO_MAXIMO sem completo), um batimento "vivo" de quem
+    passaria do intervalo declarado se esperasse mais um ciclo, e nada dos
+    demais. Devolve os registros a enviar e o novo ritmo, que só vale depois de
+    confirmar_envio: se o envio falhar, a mudança é detectada de novo no ciclo
+    seguinte.
+    """
+    agora = time.time() if agora is None else agora
+    maximo = heartbeat_maximo(base)
+    if maximo <= 0:
+        return registros, {}
+
+    anterior = load_state().get("ritmo", {})
+    ritmo, envio = {}, []
+    for registro in registros:
+        serial = registro["serial"]
+        antes = anterior.get(serial) or {}
+        campos_antes = antes.get("campos", {})
+        campos, mudaram = {}, []
+        for campo, valor in registro.items():
+            if campo in RITMO_IGNORADOS:
+                continue
+            impressao = _impressao_valor(valor)
+            impressao_antes, mudou_em, media = campos_antes.get(campo, (None, None, None))
+            if impressao != impressao_antes:
+                # Média móvel do tempo entre mudanças do campo
+                if mudou_em is not None:
+                    decorrido = agora - mudou_em
+                    media = decorrido if media is None else 0.5 * media + 0.5 * decorrido
+                mudou_em = agora
+                mudaram.append(campo)
+            campos[campo] = [impressao, mudou_em, media]
+
+        medias = [media for _, _, media in campos.values() if media]
+        teto = max(base, min([maximo] + [media / 2 for media in medias]))
+        intervalo = antes.get("intervalo", base)
+        enviado_em = antes.get("enviado_em", 0)
+        completo_em = antes.get("completo_em", 0)
+
+        if mudaram or agora - completo_em >= BATIMENTO_COMPLETO_MAXIMO:
+            # O completo periódico (sem mudança) mantém o intervalo em que estava
+            if mudaram:
+                intervalo = base
+            registro["intervalo_batimento"] = int(intervalo)
+            envio.append(registro)
+            enviado_em = completo_em = agora
+            if antes and mudaram:
+                logger.info(f"{serial}: mudou {', '.join(mudaram)}; envio completo e intervalo de volta a {int(base)}s")
+        elif agora + base - enviado_em > intervalo:
+            intervalo = min(teto, intervalo * 2)
+            vivo = {"serial": serial, "seq": registro.get("seq"), "schema": registro.get("schema"),
+                    "vivo": True, "intervalo_batimento": int(intervalo)}
+            if registro.get("boot_em"):
+                vivo["boot_em"] = registro["boot_em"]
+            if registro.get("consumo_coletor"):
+                # Só os totais: o ciclo sem envio também conta no consumo da frota
+                vivo["consumo_coletor"] = {c: v for c, v in registro["consumo_coletor"].items() if c in CONSUMO_VIVO}
+            envio.append(vivo)
+            enviado_em = agora
+
+        ritmo[serial] = {"campos": campos, "intervalo": intervalo,
+                         "enviado_em": enviado_em, "completo_em": completo_em}
+
+    completos = sum(1 for r in envio if not r.get("vivo"))
+    logger.info(f"Ritmo: {completos} completo(s), {len(envio) - completos} vivo(s), "
+                f"{len(registros) - len(envio)} sem envio neste ciclo")
+    return envio, ritmo
+
+
+def confirmar_envio(ritmo: dict) -> None:
+    """Grava o ritmo planejado depois de um envio bem-sucedido (ou de um ciclo sem envio)."""
+    if not ritmo:
+        return
+    # Convidados que sumiram saem junto: o ritmo guarda só os seriais deste ciclo
+    load_state()["ritmo"] = ritmo
+    save_state()
+
+
+_config: Optional[dict] = None
+
+
+def load_config() -> dict:
+    """Carrega (uma vez) o config.json local ou de pastas superiores."""
+    global _config
+    if _config is not None:
+        return _config
+
+    _config = {}
+    # Lista de locais para procurar: diretório atual, diretório do script, raiz do projeto
+    search_paths = [
+        os.getcwd(),
+        os.path.dirname(os.path.abspath(__file__)),
+        os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    ]
+    
+    for path in search_paths:
+        full_path = os.path.join(path, "config.json")
+        if os.path.exists(full_path):
+            try:
+                with trecho("configuração local", caminho=full_path), open(full_path, "r") as f:
+                    _config = json.load(f)
+                    logger.info(f"Configuração carregada de: {full_path}")
+                    break
+            except:
+                continue
+    return _config
+
+
+# Chaves que a configuração remota pode definir; credenciais continuam locais
+CHAVES_CONFIG_REMOTA = (
+    "HEARTBEAT_INTERVAL", "ORCAMENTO_COLETA", "APP_URLS", "HEDGING", "TIMEOUT_ENVIO",
+    "SONDAS_DESATIVADAS", "INTERVALO_SONDAS", "ATUALIZACAO_AUTOMATICA", "ORCAMENTO_TOTAL",
+    "GOVERNANCA", "CARGA_MAXIMA", "ORCAMENTO_CPU_CICLO", "HEARTBEAT_MAXIMO",
+)
+
+
+def config_efetiva() -> dict:
+    """config.json local com a configuração remota (quando houver) por cima."""
+    remota = load_state().get("config_remota", {}).get("documento", {})
+    efetiva = dict(load_config())
+    efetiva.update({k: v for k, v in remota.items() if k in CHAVES_CONFIG_REMOTA})
+    return efetiva
+
+
+def get_credentials() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Obtém URL e Chave de API (variáveis de ambiente, config.json ou prompt).
+    """
+    if os.environ.get("APP_URL") and os.environ.get("API_KEY"):
+        return os.environ["APP_URL"], os.environ["API_KEY"]
+
+    config_file = "config.json"
+    config = load_config()
+    if not os.environ.get("APP_URL"):
+        os.environ["APP_URL"] = config.get("APP_URL", "")
+    if not os.environ.get("API_KEY"):
+        os.environ["API_KEY"] = config.get("API_KEY", "")
+
+    url = os.environ.get("APP_URL")
+    key = os.environ.get("API_KEY")
+
+    # Se não tiver nas variáveis, solicita ao usuário apenas se for interativo
+    if not url or not key:
+        if not is_interactive():
+            logger.error("URL e Chave são obrigatórios mas não foram encontrados e o script não está em modo interativo.")
+            return None, None
+
+        print("\n" + "="*50)
+        print("CONFIGURAÇÃO INICIAL (Apenas na primeira vez)")
+        print("="*50)
+        
+        while not url:
+            print("\nEntre com a URL do Sistema de Inventário (ex: https://seu-app.vercel.app):")
+            url = input("> ").strip().rstrip('/')
+            if not url:
+                print("❌ A URL é obrigatória.")
+        
+        while not key:
+            print("\nEntre com a CHAVE de API (gerada no painel):")
+            key = input("> ").strip()
+            if not key:
+                print("❌ A Chave de API é obrigatória.")
+        
+        # Salva para próximas execuções
+        if url and key:
+            try:
+                save_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_file)
+                with open(save_path, "w") as f:
+                    json.dump({"APP_URL": url, "API_KEY": key}, f)
+                print(f"\n✅ Configuração salva em {save_path} para próximas execuções.")
+            except Exception as e:
+                logger.warning(f"Não foi possível salvar configuração: {e}")
+            os.environ["APP_URL"], os.environ["API_KEY"] = url, key
+
+    if not url or not key:
+        logger.error("URL e Chave são obrigatórios para continuar.")
+        return None, None
+
+    return url, key
+
+
+# ==========================================
+# TOKEN DO AGENTE
+# ==========================================
+# A Chave de API é enviada uma única vez para /api/agent/token em troca de um
+# token assinado e expirável. Cada requisição é assinada com a chave de sessão
+# (timestamp + nonce + hash do corpo), o que impede replays, e o servidor a
+# valida em memória. Servidores antigos sem o endpoint continuam recebendo x-api-key.
+
+TOKEN_RENOVAR_ANTES = 300  # segundos antes de expirar
+
+_token_lock = threading.Lock()
+_tokens_indisponiveis = set()  # URLs de servidores sem o endpoint de token
+
+
+@cronometrado("token do agente")
+def get_agent_token(url: str, key: str, forcar: bool = False) -> Optional[dict]:
+    """Obtém um token válido (do estado ou trocando a chave); None para usar a chave direto."""
+    with _token_lock:
+        tokens = load_state().setdefault("tokens", {})
+        token = tokens.get(url)
+        if token and not forcar and token.get("expira_em", 0) - time.time() > TOKEN_RENOVAR_ANTES:
+            return token
+        if url in _tokens_indisponiveis:
+            return None
+
+        try:
+            response = requests.post(f"{url}/api/agent/token", headers={"x-api-key": key}, timeout=timeout_envio())
+        except Exception as e:
+            logger.warning(f"Não foi possível obter token do agente: {e}")
+            return None
+
+        if response.status_code in (404, 405, 501):
+            logger.info(f"Servidor {url} sem suporte a tokens de agente; usando a Chave de API.")
+            _tokens_indisponiveis.add(url)
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Falha ao obter token do agente: {response.status_code} - {response.text}")
+            return None
+
+        dados = response.json()
+        token = {
+            "token": dados["token"],
+            "chave_sessao": dados["chave_sessao"],
+            "expira_em": dados["expira_em"],
+        }
+        tokens[url] = token
+        save_state()
+        logger.info("Token do agente obtido.")
+        return token
+
+
+def sign_request(token: dict, metodo: str, caminho: str, corpo: bytes) -> dict:
+    """Cabeçalhos de autenticação da requisição (método, caminho e corpo) assinada com a chave de sessão."""
+    import hashlib
+    import hmac
+    import uuid
+
+    ts = str(int(time.time()))
+    nonce = uuid.uuid4().hex
+    mensagem = f"{ts}.{nonce}.{metodo} {caminho}.{hashlib.sha256(corpo).hexdigest()}".encode()
+    return {
+        "Authorization": f"Bearer {token['token']}",
+        "x-agent-ts": ts,
+        "x-agent-nonce": nonce,
+        "x-agent-signature": hmac.new(token["chave_sessao"].encode(), mensagem, hashlib.sha256).hexdigest(),
+    }
+
+
+# ==========================================
+# MÚLTIPLOS ENDPOINTS, FAILOVER E HEDGING
+# ==========================================
+# APP_URLS (config.json) lista endpoints de ingestão alternativos. Cada um tem
+# a saúde acompanhada (latência recente e falhas consecutivas); endpoints que
+# falham entram em quarentena crescente e os saudáveis são tentados primeiro.
+# Com HEDGING ativo, se o primeiro endpoint não responder dentro do p95 da sua
+# latência, uma segunda cópia vai para o próximo e vale a primeira resposta.
+
+TIMEOUT_ENVIO = 15
+HEDGE_ATRASO_PADRAO = 2.0   # s, enquanto não há amostras suficientes para o p95
+HEDGE_AMOSTRAS_MIN = 10
+FALHAS_PARA_QUARENTENA = 3
+QUARENTENA_MAX = 900
+
+# Prazo absoluto (time.time) da execução --once; limita os timeouts de rede
+_prazo_final: Optional[float] = None
+
+
+def timeout_envio() -> float:
+    """Timeout de cada requisição: TIMEOUT_ENVIO, sem passar do prazo do --once."""
+    timeout = float(config_efetiva().get("TIMEOUT_ENVIO", TIMEOUT_ENVIO))
+    if _prazo_final is not None:
+        # Meio segundo de folga para, em caso de falha, ainda gravar o spool
+        timeout = min(timeout, max(0.5, _prazo_final - time.time() - 0.5))
+    return timeout
+
+
+class SaudeEndpoint:
+    """Latências recentes e falhas de um endpoint de ingestão."""
+
+    def __init__(self):
+        from collections import deque
+        self.latencias = deque(maxlen=50)
+        self.falhas_consecutivas = 0
+        self.quarentena_ate = 0.0
+
+    def registrar(self, ok: bool, latencia: float) -> None:
+        if ok:
+            self.latencias.append(latencia)
+            self.falhas_consecutivas = 0
+            self.quarentena_ate = 0.0
+            return
+        self.falhas_consecutivas += 1
+        if self.falhas_consecutivas >= FALHAS_PARA_QUARENTENA:
+            excesso = self.falhas_consecutivas - FALHAS_PARA_QUARENTENA
+            self.quarentena_ate = time.time() + min(QUARENTENA_MAX, 60 * (2 ** excesso))
+
+    def em_quarentena(self) -> bool:
+        return time.time() < self.quarentena_ate
+
+    def latencia_media(self) -> float:
+        return sum(self.latencias) / len(self.latencias) if self.latencias else float("inf")
+
+    def p95(self) -> float:
+        if len(self.latencias) < HEDGE_AMOSTRAS_MIN:
+            return HEDGE_ATRASO_PADRAO
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+
+
+_saude_endpoints: Dict[str, SaudeEndpoint] = {}
+_saude_lock = threading.Lock()
+_pool_envio = None
+
+
+def get_endpoints(url: str) -> list:
+    """Endpoints de ingestão: APP_URL primeiro, depois APP_URLS (config ou env, separados por vírgula)."""
+    extras = os.environ.get("APP_URLS", "").split(",") if os.environ.get("APP_URLS") else config_efetiva().get("APP_URLS", [])
+    endpoints = []
+    for e in [url] + list(extras):
+        e = (e or "").strip().rstrip("/")
+        if e and e not in endpoints:
+            endpoints.append(e)
+    return endpoints
+
+
+def _saude(url: str) -> SaudeEndpoint:
+    with _saude_lock:
+        return _saude_endpoints.setdefault(url, SaudeEndpoint())
+
+
+def rank_endpoints(endpoints: list) -> list:
+    """Saudáveis primeiro, pela latência média; a ordem configurada desempata."""
+    return sorted(endpoints, key=lambda e: (_saude(e).em_quarentena(), _saude(e).latencia_media(), endpoints.index(e)))
+
+
+def _request_endpoint(url: str, key: str, corpo: bytes, caminho: str = "/api/collect",
+                      metodo: str = "POST", headers_extra: Optional[dict] = None):
+    """Requisição autenticada num endpoint; registra latência e saúde."""
+    token = get_agent_token(url, key)
+    inicio = time.monotonic()
+    try:
+        for tentativa in (1, 2):
+            headers = {"Content-Type": "application/json", **(headers_extra or {})}
+            if token:
+                headers.update(sign_request(token, metodo, caminho, corpo))
+            else:
+                headers["x-api-key"] = key
+
+            with trecho(f"{metodo} {caminho}", "http", url=url, bytes=len(corpo or b"")) as t:
+                response = requests.request(
+                    metodo,
+                    f"{url}{caminho}",
+                    headers=headers,
+                    data=corpo or None,
+                    timeout=timeout_envio()
+                )
+                t.args["status"] = response.status_code
+
+            # Token expirado ou revogado: troca a chave de novo e repete uma vez
+            if response.status_code == 401 and token and tentativa == 1:
+                logger.info("Token recusado pelo servidor; renovando.")
+                token = get_agent_token(url, key, forcar=True)
+                continue
+            break
+    except Exception:
+        _saude(url).registrar(False, time.monotonic() - inicio)
+        raise
+
+    _saude(url).registrar(response.status_code < 500, time.monotonic() - inicio)
+    return response
+
+
+def _hedging_ativo() -> bool:
+    valor = os.environ.get("HEDGING", config_efetiva().get("HEDGING", False))
+    return str(valor).lower() in ("1", "true", "sim", "yes")
+
+
+def post_with_failover(key: str, endpoints: list, corpo: bytes, caminho: str = "/api/collect"):
+    """
+    Envia para o melhor endpoint e passa ao próximo em erro de conexão ou 5xx.
+    Com hedging, o próximo também é acionado quando o atual passa do seu p95.
+    Devolve a primeira resposta aceitável; senão a última resposta ou exceção.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    global _pool_envio
+
+    if _pool_envio is None:
+        _pool_envio = ThreadPoolExecutor(max_workers=4)
+
+    fila = rank_endpoints(endpoints)
+    hedging = _hedging_ativo()
+    pendentes = {}
+    ultima_resposta, ultimo_erro = None, None
+
+    while fila or pendentes:
+        if fila and not pendentes:
+            url = fila.pop(0)
+            pendentes[_pool_envio.submit(_request_endpoint, url, key, corpo, caminho)] = url
+
+        espera = _saude(list(pendentes.values())[-1]).p95() if hedging and fila else None
+        feitos, _ = wait(list(pendentes), timeout=espera, return_when=FIRST_COMPLETED)
+
+        if not feitos:
+            # Hedge: o endpoint atual passou do seu p95; uma cópia vai para o próximo
+            url = fila.pop(0)
+            logger.info(f"Sem resposta em {espera:.2f}s; enviando cópia para {url}.")
+            pendentes[_pool_envio.submit(_request_endpoint, url, key, corpo, caminho)] = url
+            continue
+
+        for futuro in feitos:
+            url = pendentes.pop(futuro)
+            try:
+                resposta = futuro.result()
+            except Exception as e:
+                ultimo_erro = e
+                logger.warning(f"Falha ao enviar para {url}: {e}")
+                continue
+            ultima_resposta = resposta
+            # Vale a primeira resposta aceitável; as cópias restantes terminam em segundo plano
+            if resposta.status_code < 500:
+                return resposta
+            logger.warning(f"Endpoint {url} respondeu {resposta.status_code}; tentando o próximo.")
+
+        # Uma falha rápida aciona logo o próximo, mesmo com outra cópia em andamento
+        if fila and pendentes:
+            url = fila.pop(0)
+            pendentes[_pool_envio.submit(_request_endpoint, url, key, corpo, caminho)] = url
+
+    if ultima_resposta is not None:
+        return ultima_resposta
+    raise ultimo_erro or requests.exceptions.ConnectionError("Nenhum endpoint disponível")
+
+
+@cronometrado("envio ao servidor")
+def send_to_api(data) -> bool:
+    """
+    Envia dados (um registro ou uma lista deles) para a API do Inventário (Next.js)
+    ou, com a ingestão direta configurada, para o PostgREST.
+    """
+    direta = ingestao_direta()
+    if direta:
+        return send_direto(data, *direta)
+
+    url, key = get_credentials()
+    if not url or not key:
+        return False
+
+    corpo = json.dumps(data).encode("utf-8")
+
+    try:
+        response = post_with_failover(key, get_endpoints(url), corpo)
+
+        if response.status_code in (200, 201):
+            logger.info("✅ Dados enviados com sucesso!")
+            return True
+        else:
+            logger.error(f"❌ Erro ao enviar: {response.status_code} - {response.text}")
+            return False
+
+    except requests.exceptions.ConnectionError:
+        logger.error("❌ Erro de conexão. Verifique se a URL está correta e se você tem internet.")
+        return False
+    except requests.exceptions.Timeout:
+        logger.error("❌ Timeout na requisição. Tente novamente mais tarde.")
+        return False
+    except Exception as e:
+        logger.error(f"❌ Erro inesperado: {e}")
+        return False
+
+
+# ==========================================
+# INGESTÃO DIRETA (POSTGREST)
+# ==========================================
+# Em redes internas confiáveis, os batimentos (e os lotes do "import") podem
+# ir direto para a API REST do banco, sem a função do Next.js no caminho:
+# um POST em fn_ingest_coletor_direto por envio, com uma credencial que só
+# pode executar essa função (scripts/credencial_ingestao.py). O merge e o
+# modo 'log' continuam no banco, os mesmos do /api/collect. Configuração
+# remota, tokens e atualização continuam usando APP_URL e API_KEY.
+
+
+def ingestao_direta() -> Optional[Tuple[str, str, Optional[str]]]:
+    """(URL REST, credencial, apikey do gateway) quando configurada no config.json local."""
+    config = load_config()
+    url = os.environ.get("INGESTAO_DIRETA_URL") or config.get("INGESTAO_DIRETA_URL")
+    token = os.environ.get("INGESTAO_DIRETA_TOKEN") or config.get("INGESTAO_DIRETA_TOKEN")
+    if not url or not token:
+        return None
+    return url.rstrip("/"), token, os.environ.get("INGESTAO_DIRETA_APIKEY") or config.get("INGESTAO_DIRETA_APIKEY")
+
+
+def send_direto(data, url: str, token: str, apikey: Optional[str] = None) -> bool:
+    """Um registro ou lote numa única chamada RPC ao PostgREST."""
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    if apikey:
+        headers["apikey"] = apikey  # exigido pelo gateway do Supabase; o PostgREST local dispensa
+    corpo = json.dumps({"p_registros": data}).encode("utf-8")
+    inicio = time.monotonic()
+    try:
+        response = requests.post(f"{url}/rpc/fn_ingest_coletor_direto", headers=headers, data=corpo,
+                                 timeout=timeout_envio())
+    except requests.exceptions.RequestException as e:
+        _saude(url).registrar(False, time.monotonic() - inicio)
+        logger.error(f"❌ Ingestão direta indisponível: {e}")
+        return False
+    _saude(url).registrar(response.status_code < 500, time.monotonic() - inicio)
+
+    if response.status_code == 200:
+        logger.info("✅ Dados enviados com sucesso (ingestão direta)!")
+        return True
+    try:
+        mensagem = response.json().get("message") or response.text
+    except ValueError:
+        mensagem = response.text
+    logger.error(f"❌ Erro na ingestão direta: {response.status_code} - {mensagem}")
+    return False
+
+
+# ==========================================
+# CONFIGURAÇÃO REMOTA
+# ==========================================
+# O painel publica um documento (configuracoes.coletor_config) com as mesmas
+# chaves do config.json. O agente o consulta em /api/agent/config com
+# If-None-Match: no caso comum a resposta é um 304 sem corpo. O documento e o
+# ETag ficam no arquivo de estado, valendo também após reinícios.
+
+CONFIG_REMOTA_INTERVALO = 300  # s entre consultas
+_config_remota_indisponivel = False
+
+
+@cronometrado("configuração remota")
+def fetch_remote_config(forcar: bool = False) -> bool:
+    """Consulta a configuração remota; True se o documento mudou."""
+    global _config_remota_indisponivel
+    if _config_remota_indisponivel:
+        return False
+    estado = load_state()
+    atual = estado.setdefault("config_remota", {})
+    # O horário da consulta fica no estado para valer também entre execuções --once
+    if not forcar and time.time() - atual.get("consultada_em", 0) < CONFIG_REMOTA_INTERVALO:
+        return False
+    atual["consultada_em"] = time.time()
+    save_state()
+
+    url, key = get_credentials()
+    if not url or not key:
+        return False
+    headers = {"If-None-Match": atual["etag"]} if atual.get("etag") else {}
+
+    for endpoint in rank_endpoints(get_endpoints(url)):
+        try:
+            response = _request_endpoint(endpoint, key, b"", "/api/agent/config", "GET", headers)
+        except Exception as e:
+            logger.warning(f"Configuração remota indisponível em {endpoint}: {e}")
+            continue
+
+        if response.status_code == 304:
+            return False
+        if response.status_code in (404, 405):
+            logger.info("Servidor sem configuração remota; usando apenas o config.json.")
+            _config_remota_indisponivel = True
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Configuração remota: {response.status_code} em {endpoint}")
+            continue
+
+        try:
+            documento = response.json()
+            if not isinstance(documento, dict):
+                raise ValueError("o documento não é um objeto JSON")
+        except Exception as e:
+            logger.warning(f"Configuração remota inválida, mantendo a atual: {e}")
+            return False
+
+        estado["config_remota"] = {
+            "etag": response.headers.get("ETag"),
+            "documento": documento,
+            "consultada_em": atual["consultada_em"],
+        }
+        save_state()
+        logger.info(f"Configuração remota atualizada: {json.dumps(documento)}")
+        return documento != atual.get("documento")
+    return False
+
+
+@cronometrado("aplicar configuração")
+def aplicar_config() -> Tuple[int, float]:
+    """Aplica a configuração efetiva às sondas; devolve (intervalo, orçamento) do ciclo."""
+    config = config_efetiva()
+    try:
+        heartbeat_interval = int(config.get("HEARTBEAT_INTERVAL", 300))
+        orcamento_coleta = float(config.get("ORCAMENTO_COLETA", ORCAMENTO_COLETA_PADRAO))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Intervalo/orçamento inválidos na configuração, usando o padrão: {e}")
+        heartbeat_interval, orcamento_coleta = 300, ORCAMENTO_COLETA_PADRAO
+    aplicar_governanca(config)
+    _agendador.configurar(config.get("SONDAS_DESATIVADAS") or (), config.get("INTERVALO_SONDAS") or {})
+    return heartbeat_interval, orcamento_coleta
+
+
+# ==========================================
+# AUTOATUALIZAÇÃO
+# ==========================================
+# O painel publica /scripts/coletor-manifest.json (scripts/publicar_coletor.py)
+# com versão, sha256 e URL do coletor, deltas a partir de versões anteriores e
+# o percentual de rollout, tudo assinado com RSA (PKCS#1 v1.5, SHA-256). O
+# agente confere a assinatura, baixa o delta para o seu arquivo atual quando
+# existe (senão o script inteiro), valida o sha256, troca o arquivo de forma
+# atômica e reinicia. Se a nova versão não confirmar um envio em até
+# ATUALIZACAO_TENTATIVAS inicializações, o .bak é restaurado.
+
+# Módulo (hex) da chave pública de publicação, expoente 65537. Vazio = desligado.
+CHAVE_ATUALIZACAO = ""
+ATUALIZACAO_INTERVALO = 6 * 3600
+ATUALIZACAO_TENTATIVAS = 3
+MANIFESTO_CAMINHO = "/scripts/coletor-manifest.json"
+
+# Prefixo DigestInfo (DER) do SHA-256, RFC 8017 seção 9.2
+_DIGEST_INFO_SHA256 = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+def verificar_assinatura_rsa(dados: bytes, assinatura: bytes, modulo_hex: str, expoente: int = 65537) -> bool:
+    """Verificação RSASSA-PKCS1-v1_5 com SHA-256 usando apenas pow()."""
+    import hashlib
+    import hmac
+    try:
+        n = int(modulo_hex, 16)
+    except (TypeError, ValueError):
+        return False
+    k = (n.bit_length() + 7) // 8
+    t = _DIGEST_INFO_SHA256 + hashlib.sha256(dados).digest()
+    # Chave fraca (publicar_coletor.py gera 3072 bits) ou módulo par, que não é RSA
+    if n.bit_length() < 2048 or n % 2 == 0 or len(assinatura) != k:
+        return False
+    s = int.from_bytes(assinatura, "big")
+    if s >= n:
+        return False
+    em = pow(s, expoente, n).to_bytes(k, "big")
+    esperado = b"\x00\x01" + b"\xff" * (k - len(t) - 3) + b"\x00" + t
+    return hmac.compare_digest(em, esperado)
+
+
+def manifesto_canonico(manifesto: dict) -> bytes:
+    """Bytes assinados do manifesto: JSON ordenado, sem o campo de assinatura."""
+    corpo = {k: v for k, v in manifesto.items() if k != "assinatura"}
+    return json.dumps(corpo, sort_keys=True, separators=(",", ":"), ensure_ascii=True).encode()
+
+
+def aplicar_delta(base: bytes, delta: dict) -> bytes:
+    """Reconstrói o arquivo: [inicio, fim] copia linhas da base; texto é inserido."""
+    linhas = base.decode("utf-8").splitlines(keepends=True)
+    partes = []
+    for op in delta["ops"]:
+        if isinstance(op, str):
+            partes.append(op)
+        else:
+            inicio, fim = op
+            partes.extend(linhas[inicio:fim])
+    return "".join(partes).encode("utf-8")
+
+
+def _versao_tupla(versao: str) -> tuple:
+    try:
+        return tuple(int(p) for p in str(versao).split("."))
+    except ValueError:
+        return (0,)
+
+
+def _balde_rollout(serial: str) -> int:
+    """Posição fixa (0-99) do equipamento na fila de rollout."""
+    import hashlib
+    return int(hashlib.sha256(serial.encode()).hexdigest()[:8], 16) % 100
+
+
+def _sha256(dados: bytes) -> str:
+    import hashlib
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _script_atual() -> Tuple[str, bytes]:
+    caminho = os.path.abspath(__file__)
+    with open(caminho, "rb") as f:
+        return caminho, f.read()
+
+
+def _chave_atualizacao() -> str:
+    # Só o config.json local pode trocar a chave; a configuração remota não
+    return load_config().get("CHAVE_ATUALIZACAO") or CHAVE_ATUALIZACAO
+
+
+def _baixar_atualizacao(endpoint: str, manifesto: dict, atual: bytes, sha_atual: str) -> Optional[bytes]:
+    """Delta quando houver um a partir do arquivo atual; senão o script inteiro."""
+    delta = (manifesto.get("deltas") or {}).get(sha_atual)
+    if delta:
+        try:
+            r = requests.get(f"{endpoint}{delta['url']}", timeout=timeout_envio())
+            if r.status_code == 200 and _sha256(r.content) == delta["sha256"]:
+                novo = aplicar_delta(atual, json.loads(r.content))
+                if _sha256(novo) == manifesto["sha256"]:
+                    logger.info(f"Atualização via delta ({len(r.content)} bytes).")
+                    return novo
+            logger.warning("Delta inválido; baixando o script completo.")
+        except Exception as e:
+            logger.warning(f"Falha no delta ({e}); baixando o script completo.")
+
+    try:
+        r = requests.get(f"{endpoint}{manifesto['url']}", timeout=timeout_envio())
+    except Exception as e:
+        logger.warning(f"Falha ao baixar a atualização: {e}")
+        return None
+    if r.status_code != 200 or _sha256(r.content) != manifesto["sha256"]:
+        logger.warning(f"Atualização descartada: download {r.status_code} ou sha256 divergente.")
+        return None
+    logger.info(f"Atualização completa baixada ({len(r.content)} bytes).")
+    return r.content
+
+
+def _instalar_atualizacao(novo: bytes, manifesto: dict) -> bool:
+    """Troca atômica do script, mantendo o anterior em .bak."""
+    import shutil
+    caminho, _ = _script_atual()
+    try:
+        # Código que nem compila nunca chega a substituir o atual
+        compile(novo, caminho, "exec")
+        temp = caminho + ".novo"
+        with open(temp, "wb") as f:
+            f.write(novo)
+        shutil.copy2(caminho, caminho + ".bak")
+        os.replace(temp, caminho)
+    except Exception as e:
+        logger.error(f"Não foi possível instalar a atualização: {e}")
+        return False
+
+    load_state().setdefault("atualizacao", {})["pendente"] = {
+        "sha256": manifesto["sha256"],
+        "versao": manifesto["versao"],
+        "anterior": VERSAO_COLETOR,
+        "inicializacoes": 0,
+    }
+    save_state()
+    logger.info(f"Coletor atualizado de v{VERSAO_COLETOR} para v{manifesto['versao']}.")
+    return True
+
+
+@cronometrado("atualização")
+def check_for_update(serial: str, forcar: bool = False) -> bool:
+    """Consulta o manifesto e instala uma nova versão; True se o chamador deve reiniciar."""
+    chave = _chave_atualizacao()
+    if not chave or str(config_efetiva().get("ATUALIZACAO_AUTOMATICA", True)).lower() in ("false", "0", "nao", "não"):
+        return False
+    estado = load_state().setdefault("atualizacao", {})
+    if estado.get("pendente"):
+        return False
+    if "consultado_em" not in estado:
+        # Primeira consulta num ponto aleatório do intervalo, para espalhar o tráfego
+        import random
+        estado["consultado_em"] = time.time() - random.uniform(0, ATUALIZACAO_INTERVALO)
+    if not forcar and time.time() - estado["consultado_em"] < ATUALIZACAO_INTERVALO:
+        return False
+    estado["consultado_em"] = time.time()
+    save_state()
+
+    url, _ = get_credentials()
+    if not url:
+        return False
+
+    headers = {"If-None-Match": estado["etag"]} if estado.get("etag") and estado.get("manifesto") else {}
+    manifesto, origem = None, None
+    for endpoint in rank_endpoints(get_endpoints(url)):
+        try:
+            r = requests.get(f"{endpoint}{MANIFESTO_CAMINHO}", headers=headers, timeout=timeout_envio())
+        except Exception as e:
+            logger.debug(f"Manifesto indisponível em {endpoint}: {e}")
+            continue
+        if r.status_code == 304:
+            manifesto, origem = estado["manifesto"], endpoint
+            break
+        if r.status_code == 200:
             try:
-                result = subprocess.run(
-                    ["powershell", "-Command", "[math]::Round((Get-CimInstance Win32_ComputerSystem).TotalPhysicalMemory / 1MB)"],
-                    capture_output=True, text=True, timeout=10
-                )
-                if result.stdout.strip():
-                    mb = int(result.stdout.strip())
-                    return f"{mb:,} MB".replace(",", ".")
-            except:
-                pass
+                manifesto, origem = r.json(), endpoint
+            except ValueError:
+                continue
+            estado["etag"], estado["manifesto"] = r.headers.get("ETag"), manifesto
+            save_state()
+            break
+        if r.status_code == 404:
+            return False
 
-            # Fallback para wmic
-            try:
-                result = subprocess.run(
-                    ["wmic", "computersystem", "get", "totalphysicalmemory"],
-                    capture_output=True, text=True, timeout=10
-                )
-                lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
-                if len(lines) >= 2:
-                    total_bytes = int(lines[1])
-                    mb = int(total_bytes / (1024 ** 2))
-                    return f"{mb:,} MB".replace(",", ".")
-            except:
-                pass
+    if not manifesto:
+        return False
 
-            # Fallback final: systeminfo (Lento, mas muito confiável)
-            try:
-                result = subprocess.run(
-                    ["systeminfo"],
-                    capture_output=True, text=True, timeout=20
-                )
-                for line in result.stdout.splitlines():
-                    if "física total" in line.lower() or "total physical memory" in line.lower():
-                        # Ex: Memória física total: 10.116 MB
-                        parts = line.split(":")
-                        if len(parts) >= 2:
-                            return parts[1].strip()
-            except:
-                pass
-        elif platform.system() == "Linux":
-            with open("/proc/meminfo", "r") as f:
-                for line in f:
-                    if "MemTotal" in line:
-                        kb = int(line.split()[1])
-                        mb = int(kb / 1024)
-                        return f"{mb} MB"
+    try:
+        import base64
+        assinatura = base64.b64decode(manifesto.get("assinatura", ""))
+        if not verificar_assinatura_rsa(manifesto_canonico(manifesto), assinatura, chave):
+            logger.warning("Manifesto de atualização com assinatura inválida; ignorado.")
+            return False
     except Exception as e:
-        logger.warning(f"Erro ao obter RAM: {e}")
+        logger.warning(f"Manifesto de atualização ilegível: {e}")
+        return False
 
-    return ""
+    _, atual = _script_atual()
+    sha_atual = _sha256(atual)
+    if manifesto["sha256"] == sha_atual or _versao_tupla(manifesto["versao"]) <= _versao_tupla(VERSAO_COLETOR):
+        return False
+    if manifesto["sha256"] in estado.get("recusadas", []):
+        return False
+    if _balde_rollout(serial) >= int(manifesto.get("rollout", 100)):
+        logger.debug(f"v{manifesto['versao']} ainda não liberada para este equipamento (rollout {manifesto.get('rollout')}%).")
+        return False
 
+    logger.info(f"Nova versão disponível: v{manifesto['versao']}")
+    novo = _baixar_atualizacao(origem, manifesto, atual, sha_atual)
+    return novo is not None and _instalar_atualizacao(novo, manifesto)
 
-def get_storage_info() -> str:
-    """Obtém informações de armazenamento."""
-    try:
-        if platform.system() == "Windows":
-            try:
-                result = subprocess.run(
-                    ["powershell", "-Command", "Get-PhysicalDisk | Select-Object -ExpandProperty Size"],
-                    capture_output=True, text=True, timeout=10
-                )
-                output = result.stdout.strip().splitlines()
-                if output:
-                    size_bytes = int(output[0].strip())
-                    gb = round(size_bytes / (1024 ** 3))
-                    if gb >= 900: return f"{round(gb / 1024)} TB"
-                    return f"{gb} GB"
-            except:
-                result = subprocess.run(
-                    ["wmic", "diskdrive", "get", "size"],
-                    capture_output=True, text=True, timeout=10
-                )
-                lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
-                if len(lines) >= 2:
-                    size_bytes = int(lines[1])
-                    gb = round(size_bytes / (1024 ** 3))
-                    if gb >= 900: return f"{round(gb / 1024)} TB"
-                    return f"{gb} GB"
-    except Exception as e:
-        logger.warning(f"Erro ao obter armazenamento: {e}")
 
-    return ""
+def reiniciar_coletor() -> None:
+    """Substitui o processo atual pelo script (recém-trocado) com os mesmos argumentos."""
+    caminho, _ = _script_atual()
+    logger.info("Reiniciando o coletor...")
+    logging.shutdown()
+    os.execv(sys.executable, [sys.executable, caminho] + sys.argv[1:])
 
 
-def get_os_info() -> str:
-    """Obtém nome e versão do Sistema Operacional."""
+def reverter_atualizacao(motivo: str) -> bool:
+    """Restaura o .bak e marca a versão como recusada; True se houve reversão."""
+    estado = load_state().setdefault("atualizacao", {})
+    pendente = estado.pop("pendente", None)
+    if not pendente:
+        return False
+    caminho, _ = _script_atual()
+    logger.error(f"Revertendo a atualização v{pendente['versao']}: {motivo}")
+    estado.setdefault("recusadas", []).append(pendente["sha256"])
+    save_state()
     try:
-        if platform.system() == "Windows":
-            # Tentar via PowerShell para nome completo e versão
-            try:
-                result = subprocess.run(
-                    ["powershell", "-Command", "((Get-CimInstance Win32_OperatingSystem).Caption + ' ' + (Get-CimInstance Win32_OperatingSystem).Version).Trim()"],
-                    capture_output=True, text=True, timeout=10
-                )
-                if result.stdout.strip():
-                    return result.stdout.strip()
-            except Exception as e:
-                logger.debug(f"PowerShell SO failed: {e}")
-        
-        system = platform.system()
-        release = platform.release()
-        return f"{system} {release}"
-    except:
-        return "Desconhecido"
+        os.replace(caminho + ".bak", caminho)
+    except OSError as e:
+        logger.error(f"Não foi possível restaurar a versão anterior: {e}")
+        return False
+    return True
 
 
-def get_logged_user() -> str:
-    """Obtém o usuário logado atualmente."""
-    try:
-        # PowerShell é mais confiável no Windows para saber quem está na sessão
-        if platform.system() == "Windows":
-            try:
-                result = subprocess.run(
-                    ["powershell", "-Command", "(Get-CimInstance Win32_ComputerSystem).UserName.Trim()"],
-                    capture_output=True, text=True, timeout=10
-                )
-                user = result.stdout.strip()
-                if user:
-                    return user.split('\\')[-1]
-            except Exception as e:
-                logger.debug(f"PowerShell User failed: {e}")
+def verificar_atualizacao_pendente() -> None:
+    """Na inicialização: conta tentativas da versão nova e reverte se ela não se firmou."""
+    estado = load_state().get("atualizacao", {})
+    pendente = estado.get("pendente")
+    if not pendente:
+        return
+    _, atual = _script_atual()
+    if _sha256(atual) != pendente["sha256"]:
+        # O arquivo foi trocado por fora (download manual): nada a confirmar
+        estado.pop("pendente")
+        save_state()
+        return
+    pendente["inicializacoes"] += 1
+    save_state()
+    if pendente["inicializacoes"] > ATUALIZACAO_TENTATIVAS and reverter_atualizacao(
+            f"sem envio confirmado em {ATUALIZACAO_TENTATIVAS} inicializações"):
+        reiniciar_coletor()
 
-        # Fallbacks
-        try:
-            return os.getlogin()
-        except:
-            pass
-        return os.environ.get("USERNAME") or os.environ.get("USER") or "Desconhecido"
-    except:
-        return "Desconhecido"
 
+def confirmar_atualizacao() -> None:
+    """Chamado após um envio bem-sucedido: a versão instalada passa a ser a definitiva."""
+    estado = load_state().get("atualizacao", {})
+    if estado.pop("pendente", None):
+        save_state()
+        logger.info(f"Atualização para v{VERSAO_COLETOR} confirmada.")
 
-def get_uptime() -> str:
-    """Obtém o tempo de atividade do sistema."""
+
+# ==========================================
+# SAÍDA NDJSON E IMPORTAÇÃO EM LOTE
+# ==========================================
+# Para sites sem acesso à rede, o coletor grava um registro JSON por linha
+# (--output ndjson). O comando `import` lê esse arquivo em streaming e envia
+# lotes de tamanho limitado com concorrência pequena, gravando um checkpoint
+# com o byte até onde tudo já foi confirmado, para retomar após interrupção.
+
+IMPORT_LOTE_BYTES = 256 * 1024
+IMPORT_LOTE_MAX_REGISTROS = 500
+IMPORT_CONCORRENCIA = 4
+IMPORT_TENTATIVAS = 5
+
+
+def write_ndjson(data: dict, destino: str = "-") -> bool:
+    """Acrescenta um registro como uma linha JSON no arquivo (ou stdout com '-')."""
+    linha = json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
     try:
-        if platform.system() == "Windows":
-            # PowerShell é muito mais simples para uptime
-            try:
-                cmd = "(Get-Date) - (Get-CimInstance Win32_OperatingSystem).LastBootUpTime"
-                result = subprocess.run(
-                    ["powershell", "-Command", f"$u = {cmd}; \"$($u.Days)d $($u.Hours)h $($u.Minutes)m\".Trim()"],
-                    capture_output=True, text=True, timeout=10
-                )
-                if result.stdout.strip():
-                    return result.stdout.strip()
-            except Exception as e:
-                logger.debug(f"PowerShell Uptime failed: {e}")
-
-            # Fallback para wmic
-            result = subprocess.run(
-                ["wmic", "os", "get", "lastbootuptime"],
-                capture_output=True, text=True, timeout=10
-            )
-            lines = [line.strip() for line in result.stdout.strip().split('\n') if line.strip()]
-            if len(lines) >= 2:
-                boot_time_str = lines[1].split('.')[0]
-                import datetime
-                boot_time = datetime.datetime.strptime(boot_time_str, "%Y%m%d%H%M%S")
-                uptime = datetime.datetime.now() - boot_time
-                return f"{uptime.days}d {uptime.seconds // 3600}h {(uptime.seconds % 3600) // 60}m"
-        elif platform.system() == "Linux":
-            with open("/proc/uptime", "r") as f:
-                uptime_seconds = float(f.readline().split()[0])
-                days = int(uptime_seconds // 86400)
-                hours = int((uptime_seconds % 86400) // 3600)
-                minutes = int((uptime_seconds % 3600) // 60)
-                return f"{days}d {hours}h {minutes}m"
+        if destino == "-":
+            sys.stdout.write(linha)
+            sys.stdout.flush()
+        else:
+            with open(destino, "a", encoding="utf-8") as f:
+                f.write(linha)
+        return True
     except Exception as e:
-        logger.warning(f"Erro ao obter uptime: {e}")
-    
-    return "Desconhecido"
+        logger.error(f"❌ Erro ao gravar NDJSON em {destino}: {e}")
+        return False
 
 
-def collect_system_info() -> dict:
-    """Coleta todas as informações do sistema."""
-    hostname = socket.gethostname()
-    serial = get_serial_number()
+def _ler_checkpoint(caminho: str, arquivo: str) -> Tuple[int, int]:
+    """Devolve (offset confirmado, registros já enviados) do checkpoint."""
+    try:
+        with open(caminho, "r") as f:
+            cp = json.load(f)
+        if cp.get("arquivo") == os.path.abspath(arquivo) and cp.get("offset", 0) <= os.path.getsize(arquivo):
+            return int(cp["offset"]), int(cp.get("enviados", 0))
+        logger.warning("Checkpoint pertence a outro arquivo; importação recomeça do início.")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Checkpoint ilegível ({e}); importação recomeça do início.")
+    return 0, 0
 
-    info = {
-        "nome": hostname,
-        "tipo": "Computador",
-        "serial": serial,
-        "status": "Em uso",
-        "processador": get_cpu_info(),
-        "memoria_ram": get_ram_gb(),
-        "armazenamento": get_storage_info(),
-        "acesso_remoto": None,
-        "sistema_operacional": get_os_info(),
-        "ultimo_usuario": get_logged_user(),
-        "tempo_ligado": get_uptime(),
-    }
 
-    logger.info(f"Informações coletadas: {hostname} (Serial: {serial})")
-    # Log detalhado para depuração
-    logger.info(f"  SO: {info['sistema_operacional']}")
-    logger.info(f"  Usuário: {info['ultimo_usuario']}")
-    logger.info(f"  Tempo Ligado: {info['tempo_ligado']}")
-    
-    return info
+def _gravar_checkpoint(caminho: str, arquivo: str, offset: int, enviados: int) -> None:
+    temp = caminho + ".tmp"
+    with open(temp, "w") as f:
+        json.dump({"arquivo": os.path.abspath(arquivo), "offset": offset, "enviados": enviados}, f)
+    os.replace(temp, caminho)
 
 
-def send_to_api(data: dict) -> bool:
+def iter_ndjson_batches(arquivo: str, inicio: int = 0, lote_bytes: int = IMPORT_LOTE_BYTES,
+                        lote_max: int = IMPORT_LOTE_MAX_REGISTROS):
     """
-    Envia dados para a API do Inventário (Next.js).
+    Lê o NDJSON a partir do byte `inicio` e gera (registros, offset_final) por lote.
+    Só um lote fica em memória por vez; linhas inválidas são ignoradas.
     """
-    # Tenta carregar de arquivo de configuração local ou em pastas superiores
-    config_file = "config.json"
-    config_found = False
-    
-    # Lista de locais para procurar: diretório atual, diretório do script, raiz do projeto
-    search_paths = [
-        os.getcwd(),
-        os.path.dirname(os.path.abspath(__file__)),
-        os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
-    ]
-    
-    for path in search_paths:
-        full_path = os.path.join(path, config_file)
-        if os.path.exists(full_path):
+    with open(arquivo, "rb") as f:
+        f.seek(inicio)
+        offset = inicio
+        lote, tamanho = [], 0
+        for numero, linha in enumerate(f, 1):
+            offset += len(linha)
+            linha = linha.strip()
+            if not linha:
+                continue
             try:
-                with open(full_path, "r") as f:
-                    config = json.load(f)
-                    if not os.environ.get("APP_URL"):
-                        os.environ["APP_URL"] = config.get("APP_URL", "")
-                    if not os.environ.get("API_KEY"):
-                        os.environ["API_KEY"] = config.get("API_KEY", "")
-                    config_found = True
-                    logger.info(f"Configuração carregada de: {full_path}")
-                    break
-            except:
+                lote.append(json.loads(linha))
+            except ValueError:
+                logger.warning(f"Linha {numero} inválida ignorada: {linha[:80]!r}")
                 continue
+            tamanho += len(linha)
+            if tamanho >= lote_bytes or len(lote) >= lote_max:
+                yield lote, offset
+                lote, tamanho = [], 0
+        if lote:
+            yield lote, offset
+        elif offset > inicio:
+            # Cauda só com linhas vazias/inválidas: ainda assim avança o checkpoint
+            yield [], offset
 
-    url = os.environ.get("APP_URL")
-    key = os.environ.get("API_KEY")
 
-    # Se não tiver nas variáveis, solicita ao usuário apenas se for interativo
-    if not url or not key:
-        if not is_interactive():
-            logger.error("URL e Chave são obrigatórios mas não foram encontrados e o script não está em modo interativo.")
+def _enviar_lote(lote: list) -> bool:
+    if not lote:
+        return True
+    espera = 1
+    for tentativa in range(1, IMPORT_TENTATIVAS + 1):
+        if send_to_api(lote):
+            return True
+        if tentativa < IMPORT_TENTATIVAS:
+            time.sleep(espera)
+            espera = min(espera * 2, 30)
+    return False
+
+
+def import_ndjson(arquivo: str, checkpoint: Optional[str] = None, concorrencia: int = IMPORT_CONCORRENCIA,
+                  lote_bytes: int = IMPORT_LOTE_BYTES, lote_max: int = IMPORT_LOTE_MAX_REGISTROS) -> bool:
+    """
+    Importa um arquivo NDJSON em lotes concorrentes, com memória constante e retomada.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    # Com a ingestão direta o relay não precisa de APP_URL / API_KEY
+    if not ingestao_direta():
+        url, key = get_credentials()
+        if not url or not key:
             return False
 
-        print("\n" + "="*50)
-        print("CONFIGURAÇÃO INICIAL (Apenas na primeira vez)")
-        print("="*50)
-        
-        while not url:
-            print("\nEntre com a URL do Sistema de Inventário (ex: https://seu-app.vercel.app):")
-            url = input("> ").strip().rstrip('/')
-            if not url:
-                print("❌ A URL é obrigatória.")
-        
-        while not key:
-            print("\nEntre com a CHAVE de API (gerada no painel):")
-            key = input("> ").strip()
-            if not key:
-                print("❌ A Chave de API é obrigatória.")
-        
-        # Salva para próximas execuções
-        if url and key:
-            try:
-                save_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_file)
-                with open(save_path, "w") as f:
-                    json.dump({"APP_URL": url, "API_KEY": key}, f)
-                print(f"\n✅ Configuração salva em {save_path} para próximas execuções.")
-            except Exception as e:
-                logger.warning(f"Não foi possível salvar configuração: {e}")
+    checkpoint = checkpoint or arquivo + ".checkpoint"
+    inicio, enviados = _ler_checkpoint(checkpoint, arquivo)
+    if inicio:
+        logger.info(f"Retomando importação do byte {inicio}.")
 
-    if not url or not key:
-        logger.error("URL e Chave são obrigatórios para continuar.")
+    # Lotes terminam fora de ordem; o checkpoint só avança sobre o prefixo contíguo
+    fim_por_lote: Dict[int, Tuple[int, int]] = {}
+    concluidos = set()
+    proximo_a_confirmar = 0
+    confirmado = inicio
+    falhou = False
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        em_voo = {}
+
+        def recolher(futuros) -> None:
+            nonlocal proximo_a_confirmar, confirmado, enviados, falhou
+            for futuro in futuros:
+                indice = em_voo.pop(futuro)
+                if futuro.result():
+                    concluidos.add(indice)
+                else:
+                    falhou = True
+            while proximo_a_confirmar in concluidos:
+                concluidos.discard(proximo_a_confirmar)
+                confirmado, quantidade = fim_por_lote.pop(proximo_a_confirmar)
+                enviados += quantidade
+                proximo_a_confirmar += 1
+            _gravar_checkpoint(checkpoint, arquivo, confirmado, enviados)
+
+        for indice, (lote, offset) in enumerate(iter_ndjson_batches(arquivo, inicio, lote_bytes, lote_max)):
+            if falhou:
+                break
+            fim_por_lote[indice] = (offset, len(lote))
+            em_voo[pool.submit(_enviar_lote, lote)] = indice
+            if len(em_voo) >= concorrencia:
+                feitos, _ = wait(list(em_voo), return_when=FIRST_COMPLETED)
+                recolher(feitos)
+        if em_voo:
+            recolher(wait(list(em_voo))[0])
+
+    if falhou:
+        logger.error(f"❌ Importação interrompida por falha de envio. Retome a partir do byte {confirmado}.")
         return False
-        
-    endpoint = f"{url}/api/collect"
-    headers = {
-        "x-api-key": key,
-        "Content-Type": "application/json"
-    }
 
+    logger.info(f"✅ Importação concluída: {enviados} registros enviados.")
+    return True
+
+
+# ==========================================
+# API LOCAL DE CONSULTA
+# ==========================================
+# Scripts de helpdesk e ferramentas de monitoramento na mesma máquina podem
+# consultar o último registro do coletor em vez de rodar wmic/PowerShell/
+# dmidecode por conta própria. A resposta sai de um JSON já serializado em
+# memória. Só escuta em 127.0.0.1 (API_LOCAL_PORTA) e/ou num socket Unix
+# (API_LOCAL_SOCKET); desligada por padrão.
+#
+# No socket Unix, a permissão do arquivo é a autenticação. Na porta TCP,
+# qualquer página aberta no navegador alcança 127.0.0.1: o Host precisa ser
+# 127.0.0.1:<porta> ou localhost:<porta> (DNS rebinding) e a requisição leva
+# "Authorization: Bearer <token>", lido de API_LOCAL_TOKEN_ARQUIVO (0600, criado
+# na primeira execução), que uma página de outro site não tem como enviar.
+#
+#   GET  /v1/snapshot                   último registro completo
+#   GET  /v1/campos/<campo>             valor em cache de uma sonda
+#   POST /v1/campos/<campo>/atualizar   recoleta a sonda agora
+
+API_LOCAL_ATUALIZAR_MIN = 10  # s mínimos entre recoletas do mesmo campo pela API
+API_LOCAL_TOKEN_ARQUIVO = os.path.join(os.path.dirname(ESTADO_ARQUIVO), "coletor_api_token")
+
+_snapshot: Dict[str, Any] = {"registro": None, "json": b"null", "coletado_em": None}
+_snapshot_lock = threading.Lock()
+
+
+def atualizar_snapshot(registro: dict) -> None:
+    """Publica o registro do ciclo para a API local (serializado uma única vez)."""
+    global _snapshot
+    corpo = {"versao": VERSAO_COLETOR, "coletado_em": _iso_utc(time.time()), "registro": registro}
+    novo = {"registro": registro, "json": json.dumps(corpo, ensure_ascii=False).encode("utf-8"),
+            "coletado_em": corpo["coletado_em"]}
+    with _snapshot_lock:
+        _snapshot = novo
+
+
+def _resposta_campo(campo: str, valor: Any, coletado_em: Optional[float], **extra) -> bytes:
+    return json.dumps({
+        "campo": campo,
+        "valor": valor,
+        "coletado_em": _iso_utc(coletado_em) if coletado_em else None,
+        **extra,
+    }, ensure_ascii=False).encode("utf-8")
+
+
+def token_api_local(caminho: str = API_LOCAL_TOKEN_ARQUIVO) -> str:
+    """Token da porta TCP da API local; criado uma vez, legível só pelo dono do arquivo."""
+    import secrets
     try:
-        response = requests.post(
-            endpoint,
-            headers=headers,
-            data=json.dumps(data),
-            timeout=15
-        )
+        with open(caminho, "r") as f:
+            token = f.read().strip()
+        if token:
+            return token
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    logger.info(f"Token da API local criado em {caminho}")
+    return token
 
-        if response.status_code in (200, 201):
-            logger.info("✅ Dados enviados com sucesso!")
+
+def _criar_handler_api_local():
+    import hmac
+    from http.server import BaseHTTPRequestHandler
+
+    class HandlerApiLocal(BaseHTTPRequestHandler):
+        server_version = f"coletor/{VERSAO_COLETOR}"
+        protocol_version = "HTTP/1.1"  # keep-alive: toda resposta leva Content-Length
+
+        def setup(self):
+            # Cabeçalho e corpo saem em writes separados; sem Nagle o keep-alive não
+            # espera o ACK atrasado do cliente (~40 ms por requisição). Só vale para TCP.
+            self.disable_nagle_algorithm = self.request.family != getattr(socket, "AF_UNIX", None)
+            super().setup()
+
+        def log_message(self, formato, *args):
+            logger.debug(f"API local: {formato % args}")
+
+        def address_string(self):
+            # Socket Unix não tem endereço de cliente
+            return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+        def _enviar(self, status: int, corpo: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _erro(self, status: int, mensagem: str) -> None:
+            self._enviar(status, json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8"))
+
+        def _autorizado(self) -> bool:
+            """Na porta TCP: Host de loopback e o token; no socket Unix vale a permissão do arquivo."""
+            hosts = getattr(self.server, "hosts_validos", None)
+            if hosts is None:
+                return True
+            if (self.headers.get("Host") or "").lower() not in hosts:
+                self._erro(403, "host não permitido")
+                return False
+            esperado = f"Bearer {self.server.token}".encode()
+            if not hmac.compare_digest((self.headers.get("Authorization") or "").encode(), esperado):
+                self._erro(401, "token ausente ou inválido")
+                return False
             return True
-        else:
-            logger.error(f"❌ Erro ao enviar: {response.status_code} - {response.text}")
-            return False
 
-    except requests.exceptions.ConnectionError:
-        logger.error("❌ Erro de conexão. Verifique se a URL está correta e se você tem internet.")
-        return False
-    except requests.exceptions.Timeout:
-        logger.error("❌ Timeout na requisição. Tente novamente mais tarde.")
-        return False
+        def _campo(self, partes: list) -> Optional[str]:
+            if len(partes) >= 3 and partes[:2] == ["v1", "campos"]:
+                campo = partes[2]
+                if campo in _agendador.sondas and campo not in _agendador.desativadas:
+                    return campo
+                self._erro(404, f"campo desconhecido: {campo}")
+            else:
+                self._erro(404, "rota desconhecida")
+            return None
+
+        def do_GET(self):
+            if not self._autorizado():
+                return
+            partes = [p for p in self.path.split("?")[0].split("/") if p]
+            if partes == ["v1", "snapshot"]:
+                return self._enviar(200, _snapshot["json"])
+            if len(partes) == 3:
+                campo = self._campo(partes)
+                if campo:
+                    valor, coletado_em, _ = _agendador.cache.get(campo, (None, None, None))
+                    self._enviar(200, _resposta_campo(campo, valor, coletado_em))
+                return
+            self._erro(404, "rota desconhecida")
+
+        def do_POST(self):
+            if not self._autorizado():
+                return
+            partes = [p for p in self.path.split("?")[0].split("/") if p]
+            if len(partes) != 4 or partes[3] != "atualizar":
+                return self._erro(404, "rota desconhecida")
+            campo = self._campo(partes)
+            if not campo:
+                return
+            try:
+                valor, coletado_em, executou = _agendador.atualizar(campo, API_LOCAL_ATUALIZAR_MIN)
+            except TimeoutError as e:
+                return self._erro(503, str(e))
+            # O snapshot passa a refletir o valor novo sem esperar o próximo ciclo
+            registro = _snapshot["registro"]
+            if executou and registro is not None and campo in registro and valor is not None:
+                atualizar_snapshot({**registro, campo: valor})
+            self._enviar(200, _resposta_campo(campo, valor, coletado_em, atualizado=executou))
+
+    return HandlerApiLocal
+
+
+def iniciar_api_local() -> list:
+    """Sobe os servidores configurados em threads daemon; devolve a lista de servidores."""
+    import socketserver
+    from http.server import ThreadingHTTPServer
+
+    config = load_config()  # só a configuração local pode abrir portas
+    handler = _criar_handler_api_local()
+    servidores = []
+
+    porta = config.get("API_LOCAL_PORTA")
+    if porta:
+        try:
+            servidor = ThreadingHTTPServer(("127.0.0.1", int(porta)), handler)
+            servidor.hosts_validos = {f"127.0.0.1:{int(porta)}", f"localhost:{int(porta)}"}
+            servidor.token = token_api_local()
+            servidores.append(servidor)
+            logger.info(f"API local em http://127.0.0.1:{porta} (token em {API_LOCAL_TOKEN_ARQUIVO})")
+        except Exception as e:
+            logger.warning(f"API local: não foi possível abrir a porta {porta}: {e}")
+
+    caminho = config.get("API_LOCAL_SOCKET")
+    if caminho and hasattr(socketserver, "ThreadingUnixStreamServer"):
+        class ServidorUnix(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+            def get_request(self):
+                conexao, _ = super().get_request()
+                return conexao, ("unix", 0)
+
+        try:
+            if os.path.exists(caminho):
+                os.remove(caminho)  # socket órfão de uma execução anterior
+            # O socket nasce só para o dono: entre o bind e o chmod não há janela com o modo do umask atual
+            umask = os.umask(0o177)
+            try:
+                servidor = ServidorUnix(caminho, handler)
+            finally:
+                os.umask(umask)
+            os.chmod(caminho, 0o660)
+            servidores.append(servidor)
+            logger.info(f"API local no socket {caminho}")
+        except Exception as e:
+            logger.warning(f"API local: não foi possível criar o socket {caminho}: {e}")
+
+    for servidor in servidores:
+        threading.Thread(target=servidor.serve_forever, name="api-local", daemon=True).start()
+    return servidores
+
+
+# ==========================================
+# EXECUÇÃO ÚNICA (--once) PARA CRON / AGENDADOR DE TAREFAS
+# ==========================================
+# Uma coleta, um envio e saída com código de status, tudo dentro de um
+# orçamento total de tempo. Com o orçamento apertado, só rodam as sondas
+# baratas; as demais reaproveitam o cache persistido da execução anterior.
+# Sem rede, o registro vai para um spool NDJSON local, reenviado em lote na
+# próxima execução.
+
+SAIDA_ENVIADO = 0
+SAIDA_ERRO = 1
+SAIDA_SPOOL = 2
+SAIDA_ORCAMENTO_ESGOTADO = 3
+
+ORCAMENTO_TOTAL_PADRAO = 60
+SPOOL_ARQUIVO = os.path.join(os.path.dirname(ESTADO_ARQUIVO), "coletor_spool.ndjson")
+SPOOL_MAX_REGISTROS = 500  # além disso, os mais antigos são descartados
+
+_spool_lock = threading.Lock()
+
+
+def ler_spool() -> list:
+    """Registros pendentes do spool; linhas corrompidas (gravação interrompida) são ignoradas."""
+    registros = []
+    try:
+        with open(SPOOL_ARQUIVO, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registros.append(json.loads(linha))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        logger.error(f"❌ Erro inesperado: {e}")
+        logger.warning(f"Spool ilegível, ignorando: {e}")
+    return registros
+
+
+@cronometrado("spool")
+def gravar_spool(registros: list) -> bool:
+    """Regrava o spool de forma atômica com os registros mais recentes."""
+    temp = SPOOL_ARQUIVO + ".tmp"
+    try:
+        with open(temp, "w", encoding="utf-8") as f:
+            for registro in registros[-SPOOL_MAX_REGISTROS:]:
+                f.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(temp, SPOOL_ARQUIVO)
+        return True
+    except Exception as e:
+        logger.error(f"Não foi possível gravar o spool: {e}")
         return False
 
 
+def limpar_spool() -> None:
+    try:
+        os.remove(SPOOL_ARQUIVO)
+    except FileNotFoundError:
+        pass
+
+
+def run_once(orcamento_total: float, saida_ndjson: Optional[str] = None) -> int:
+    """Executa um ciclo completo dentro de orcamento_total segundos e devolve o código de saída."""
+    global _prazo_final
+    inicio = time.time()
+    _prazo_final = inicio + orcamento_total
+    pendente: Dict[str, Any] = {}
+
+    def estourou():
+        # Vigia: passou do prazo, guarda o que já foi coletado e encerra na hora
+        with _spool_lock:
+            if pendente.get("finalizado"):
+                return  # o envio terminou no limite; a thread principal encerra normalmente
+            salvar_perfil()
+            if pendente.get("registros"):
+                if gravar_spool(ler_spool() + pendente["registros"]):
+                    confirmar_eventos_pacotes()
+                    confirmar_consumo(pendente["registros"])
+                    logger.error(f"Orçamento total de {orcamento_total}s esgotado; registro guardado no spool.")
+                    logging.shutdown()
+                    os._exit(SAIDA_SPOOL)
+            logger.error(f"Orçamento total de {orcamento_total}s esgotado.")
+            logging.shutdown()
+            os._exit(SAIDA_ORCAMENTO_ESGOTADO)
+
+    vigia = threading.Timer(orcamento_total, estourou)
+    vigia.daemon = True
+    vigia.start()
+
+    try:
+        estado = load_state()
+        if saida_ndjson is None:
+            verificar_atualizacao_pendente()
+            fetch_remote_config()
+        heartbeat_interval, orcamento_coleta = aplicar_config()
+        _agendador.importar(estado.get("sondas"))
+
+        # Metade do orçamento (no máximo TIMEOUT_ENVIO) fica reservada para o envio
+        reserva = 0 if saida_ndjson is not None else min(timeout_envio(), orcamento_total / 2)
+        orcamento_coleta = max(0.0, min(orcamento_coleta, _prazo_final - reserva - time.time()))
+        # No cron não há como esperar a carga baixar: só o serial roda, o resto vem do cache
+        carga = carga_alta(config_efetiva())
+        if carga is not None:
+            logger.info(f"Carga alta ({carga:.2f} por núcleo); coletando apenas o essencial.")
+            orcamento_coleta = 0.0
+        registro = collect_system_info(orcamento_coleta, estrito=True)
+        registros = registros_do_ciclo(registro)
+        pendente["registros"] = registros
+
+        estado["sondas"] = _agendador.exportar()
+        save_state()
+
+        if saida_ndjson is not None:
+            pendente["finalizado"] = True
+            gravados = all([write_ndjson(r, saida_ndjson) for r in registros])
+            if gravados:
+                confirmar_eventos_pacotes()
+                confirmar_consumo(registros)
+            return SAIDA_ENVIADO if gravados else SAIDA_ERRO
+
+        # Sem mudança e sem batimento vivo vencendo, a execução não faz requisição
+        envio, ritmo = planejar_envio(registros, heartbeat_interval)
+        pendente["registros"] = envio
+        spool = ler_spool()
+        enviado = enviar_ciclo(spool + envio) if spool or envio else True
+
+        with _spool_lock:
+            pendente["finalizado"] = True
+            if not enviado:
+                # No spool os eventos de pacotes já estão guardados: os logs podem avançar
+                if not gravar_spool(spool + envio):
+                    return SAIDA_ERRO
+                confirmar_eventos_pacotes()
+                confirmar_consumo(envio)
+                return SAIDA_SPOOL
+            confirmar_envio(ritmo)
+            confirmar_eventos_pacotes()
+            confirmar_consumo(envio)
+            if spool:
+                limpar_spool()
+                logger.info(f"{len(spool)} registro(s) do spool reenviados.")
+
+        confirmar_atualizacao()
+        # Só procura atualização com folga no orçamento; a nova versão vale na próxima execução
+        if _prazo_final - time.time() > timeout_envio() and check_for_update(registro["serial"]):
+            logger.info("Nova versão instalada; vale a partir da próxima execução.")
+        return SAIDA_ENVIADO
+
+    except Exception as e:
+        logger.error(f"Erro na execução única: {e}")
+        return SAIDA_ERRO
+    finally:
+        vigia.cancel()
+        logger.info(f"Execução única concluída em {time.time() - inicio:.2f}s")
+
+
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Coletor de Inventário TI")
+    parser.add_argument("--output", choices=["api", "ndjson"], default="api",
+                        help="Destino dos registros: envio à API (padrão) ou NDJSON")
+    parser.add_argument("--arquivo", default="-",
+                        help="Arquivo NDJSON de saída (padrão: stdout)")
+    parser.add_argument("--once", action="store_true",
+                        help="Coleta, envia e sai (para cron / Agendador de Tarefas). "
+                             "Código de saída: 0 enviado, 2 guardado no spool, 1 erro, 3 orçamento esgotado")
+    parser.add_argument("--orcamento-total", type=float, default=None,
+                        help=f"Tempo máximo (s) da execução --once (padrão: ORCAMENTO_TOTAL ou {ORCAMENTO_TOTAL_PADRAO})")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="Executa um ciclo (como --once) e grava a linha do tempo em ARQUIVO (Chrome Trace JSON)")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Com --profile, grava também as estatísticas do cProfile em ARQUIVO.pstats")
+    parser.add_argument("--hospedeiro", action="store_true",
+                        help="Inventaria também os contêineres e VMs da máquina (MODO_HOSPEDEIRO)")
+    sub = parser.add_subparsers(dest="comando")
+
+    imp = sub.add_parser("import", help="Envia um arquivo NDJSON em lotes")
+    imp.add_argument("arquivo_ndjson", help="Arquivo NDJSON gerado com --output ndjson")
+    imp.add_argument("--checkpoint", help="Arquivo de checkpoint (padrão: <arquivo>.checkpoint)")
+    imp.add_argument("--concorrencia", type=int, default=IMPORT_CONCORRENCIA)
+    imp.add_argument("--lote-bytes", type=int, default=IMPORT_LOTE_BYTES)
+    imp.add_argument("--lote-max", type=int, default=IMPORT_LOTE_MAX_REGISTROS)
+
+    conv = sub.add_parser("convidados", help="Lista (NDJSON) os contêineres e VMs encontrados, sem enviar")
+    conv.add_argument("--cgroup", default=HOSPEDEIRO_CGROUP)
+    conv.add_argument("--libvirt", default=HOSPEDEIRO_LIBVIRT)
+    conv.add_argument("--docker", default=HOSPEDEIRO_DOCKER)
+    conv.add_argument("--proc", default=HOSPEDEIRO_PROC)
+    conv.add_argument("--serial", default=None, help="Serial do hospedeiro (padrão: o desta máquina)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    import time
     import random
+
+    args = parse_args()
+
+    if args.comando == "import":
+        ok = import_ndjson(args.arquivo_ndjson, args.checkpoint, max(1, args.concorrencia),
+                           args.lote_bytes, args.lote_max)
+        sys.exit(0 if ok else 1)
+
+    if args.comando == "convidados":
+        serial = args.serial or _agendador.executar(SONDAS["serial"], get_boot_id())
+        for registro in coletar_convidados(serial, args.cgroup, args.libvirt, args.docker, args.proc):
+            write_ndjson(registro)
+        sys.exit(0)
+
+    if args.hospedeiro:
+        load_config()["MODO_HOSPEDEIRO"] = True
+
+    if args.profile:
+        sys.exit(run_profile(args.profile, args.cprofile, args.orcamento_total,
+                             args.arquivo if args.output == "ndjson" else None))
+
+    if args.once:
+        orcamento_total = args.orcamento_total or float(config_efetiva().get("ORCAMENTO_TOTAL", ORCAMENTO_TOTAL_PADRAO))
+        sys.exit(run_once(orcamento_total, args.arquivo if args.output == "ndjson" else None))
+
+    saida_stdout = args.output == "ndjson" and args.arquivo == "-"
     
     logger.info("=" * 50)
-    logger.info("Coletor de Inventário TI - v2.1 (MODO ESCALA)")
+    logger.info(f"Coletor de Inventário TI - v{VERSAO_COLETOR} (MODO ESCALA)")
     logger.info("=" * 50)
     logger.info("Otimizado para grandes redes com Jitter e Intervalo Configurável.")
     
-    # Carrega intervalo do config.json ou usa padrão
-    heartbeat_interval = 300 # 5 min default
-    config_file = "config.json"
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, "r") as f:
-                config = json.load(f)
-                heartbeat_interval = int(config.get("HEARTBEAT_INTERVAL", 300))
-        except: pass
+    # Intervalo, orçamento e sondas: config.json, com a configuração remota por cima
+    if args.output == "api":
+        fetch_remote_config(forcar=True)
+    heartbeat_interval, orcamento_coleta = aplicar_config()
+
+    discover_capabilities()
+
+    if args.output == "api":
+        verificar_atualizacao_pendente()
+
+    iniciar_api_local()
 
     logger.info(f"Intervalo base: {heartbeat_interval}s | Pressione Ctrl+C para encerrar.")
     logger.info("-" * 50)
 
     try:
         while True:
-            system_info = collect_system_info()
-            
-            logger.info("Enviando atualização...")
-            success = send_to_api(system_info)
+            # Mudanças feitas no painel valem a partir deste ciclo
+            if args.output == "api" and fetch_remote_config():
+                heartbeat_interval, orcamento_coleta = aplicar_config()
+                logger.info(f"Novo intervalo base: {heartbeat_interval}s")
+
+            # Governança: máquina carregada adia a coleta, no máximo por um intervalo
+            aguardar_carga(min(ADIAMENTO_MAXIMO, heartbeat_interval))
+            system_info = collect_system_info(orcamento_coleta)
+            atualizar_snapshot(system_info)
+            registros = registros_do_ciclo(system_info)
             
+            if args.output == "ndjson":
+                envio = registros
+                success = all([write_ndjson(r, args.arquivo) for r in registros])
+                enviados = len(registros)
+            else:
+                # Ritmo adaptativo: só o que mudou vai completo; o resto, batimento vivo ou nada
+                envio, ritmo = planejar_envio(registros, heartbeat_interval)
+                enviados = len(envio)
+                if envio:
+                    logger.info("Enviando atualização...")
+                success = enviar_ciclo(envio) if envio else True
+                if success:
+                    confirmar_envio(ritmo)
             if success:
+                confirmar_eventos_pacotes()
+                confirmar_consumo(envio)
+            
+            if not success:
+                logger.error("❌ Falha no envio.")
+            elif enviados:
                 logger.info("✅ Batimento cardíaco enviado.")
             else:
-                logger.error("❌ Falha no envio.")
+                logger.info("Nada mudou; sem envio neste ciclo.")
+
+            if args.output == "api":
+                if success:
+                    confirmar_atualizacao()
+                if check_for_update(system_info["serial"]):
+                    reiniciar_coletor()
             
             # Adiciona Jitter (+/- 10% do intervalo, max 30s) para evitar picos simultâneos
             jitter_range = min(30, int(heartbeat_interval * 0.1))
@@ -459,7 +3789,11 @@ if __name__ == "__main__":
         logger.info("\nEncerrando coletor.")
     except Exception as e:
         logger.error(f"Erro fatal: {e}")
+        # Versão recém-instalada que quebra o laço volta para a anterior
+        if reverter_atualizacao(f"erro fatal: {e}"):
+            reiniciar_coletor()
     
-    print("\nExecução finalizada.")
-    if is_interactive():
-        input("Pressione Enter para fechar...")
+    if not saida_stdout:
+        print("\nExecução finalizada.")
+        if is_interactive():
+            input("Pressione Enter para fechar...")
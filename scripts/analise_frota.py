@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Saúde da frota a partir do histórico de batimentos (ativos_heartbeats).
+
+Para cada ativo que já enviou dados: disponibilidade no período, períodos
+offline (quantidade, o maior, noites em que estava desligado às 3h), reinícios
+(mudanças de boot_em), tempo ligado e se está parado. Depois, o mesmo por setor
+(média e p05 da disponibilidade, p95 do tempo ligado). O resultado substitui
+frota_saude e frota_saude_setor.
+
+Os batimentos chegam por lote de ativos (fn_frota_batimentos) já em formato
+colunar e viram arrays NumPy; todo o cálculo é vetorizado sobre o lote inteiro,
+sem laço por batimento.
+
+Uso:
+    python scripts/analise_frota.py
+    python scripts/analise_frota.py --dias 7 --sem-gravar
+
+Credenciais: SUPABASE_URL (ou NEXT_PUBLIC_SUPABASE_URL) e SUPABASE_SERVICE_ROLE_KEY,
+ou --url / --chave. Requer requests e numpy.
+"""
+
+import argparse
+import base64
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import requests
+
+DIAS = 30
+LIMIAR_OFFLINE = 900            # s sem batimento para contar como offline (3 batimentos de 5 min)
+INTERVALOS_OFFLINE = 2          # ou mais que 2 intervalos declarados pelo batimento (ritmo adaptativo)
+LIMITE_PARADO = 3 * 24 * 3600   # s sem batimento para entrar na lista de parados
+TOLERANCIA_BOOT = 120           # s de diferença em boot_em que ainda é o mesmo boot
+HORA_NOITE = 3                  # hora local usada para "offline à noite"
+FUSO = "America/Sao_Paulo"
+ATIVOS_POR_LOTE = 200
+BOOT_NULO = -2 ** 31            # boot desconhecido (coletor anterior ao 3.0)
+
+
+def decodificar(texto) -> np.ndarray:
+    """int4 big-endian em base64 (fn_frota_batimentos) -> int64."""
+    if not texto:
+        return np.empty(0, dtype=np.int64)
+    return np.frombuffer(base64.b64decode(texto), dtype=">i4").astype(np.int64)
+
+
+def analisar_lote(contagens: np.ndarray, instantes: np.ndarray, boots: np.ndarray,
+                  inicios: np.ndarray, fim: int, deslocamento_noite: int,
+                  limiar: int = LIMIAR_OFFLINE, intervalos: np.ndarray = None) -> dict:
+    """
+    Métricas de um lote de ativos. instantes e boots são os batimentos de todos
+    os ativos concatenados (em ordem, segundos desde o início da janela);
+    contagens diz quantos são de cada ativo. inicios é, por ativo, o instante a
+    partir do qual ele deveria estar enviando (0 ou a data de cadastro).
+    deslocamento_noite: instante (relativo, mod 86400) que corresponde à hora da noite.
+    intervalos: por batimento, o intervalo (s) que ele declarou até o próximo (0 =
+    não informado); a lacuna depois dele só é offline acima de INTERVALOS_OFFLINE vezes esse valor.
+    """
+    n = len(contagens)
+    com_dados = contagens > 0
+    m = int(com_dados.sum())
+    if m == 0:
+        # Lote sem nenhum batimento na janela: todos offline o período inteiro
+        return {
+            "batimentos": contagens.astype(np.int64),
+            "disponibilidade": np.zeros(n),
+            "periodos_offline": np.ones(n, dtype=np.int64),
+            **{k: np.full(n, -1, dtype=np.int64) for k in
+               ("offline_max_s", "noites_offline", "reinicios", "tempo_ligado_s", "ultimo_batimento")},
+        }
+    c = contagens[com_dados]
+    primeiro = np.concatenate(([0], np.cumsum(c)[:-1])).astype(np.int64)
+    ultimo = primeiro + c - 1
+
+    # Intervalos entre batimentos consecutivos do mesmo ativo; o do último
+    # batimento de um ativo para o primeiro do seguinte não vale
+    grupo = np.repeat(np.arange(m), c)
+    d = np.diff(instantes)
+    mesmo = grupo[1:] == grupo[:-1]
+    gd = grupo[:-1]
+    limite = limiar if intervalos is None else np.maximum(limiar, INTERVALOS_OFFLINE * intervalos)
+    limite = np.broadcast_to(limite, instantes.shape)
+    off = mesmo & (d > limite[:-1])
+
+    def por_ativo(mascara, pesos=None) -> np.ndarray:
+        return np.bincount(gd[mascara], weights=None if pesos is None else pesos[mascara], minlength=m)
+
+    # Início e fim da janela também contam: do cadastro ao primeiro batimento e do último até agora
+    ini = inicios[com_dados]
+    antes = np.maximum(instantes[primeiro] - ini, 0)
+    depois = np.maximum(fim - instantes[ultimo], 0)
+    antes_off, depois_off = antes > limiar, depois > limite[ultimo]
+
+    offline_total = por_ativo(off, d) + np.where(antes_off, antes, 0) + np.where(depois_off, depois, 0)
+    periodos = por_ativo(off) + antes_off + depois_off
+    offline_max = np.zeros(m, dtype=np.int64)
+    np.maximum.at(offline_max, gd[off], d[off])
+    offline_max = np.maximum(offline_max, np.maximum(np.where(antes_off, antes, 0), np.where(depois_off, depois, 0)))
+
+    # Noites: quantas vezes a hora da noite cai dentro de um período offline
+    def noites(a, b):
+        return (b - deslocamento_noite) // 86400 - (a - deslocamento_noite) // 86400
+
+    noites_off = (por_ativo(off, noites(instantes[:-1], instantes[1:]))
+                  + np.where(antes_off, noites(ini, instantes[primeiro]), 0)
+                  + np.where(depois_off, noites(instantes[ultimo], fim), 0))
+
+    # Reinícios: boot_em muda entre batimentos consecutivos (ambos conhecidos)
+    conhecido = boots != BOOT_NULO
+    par = mesmo & conhecido[1:] & conhecido[:-1]
+    reinicios = por_ativo(par & (np.abs(np.diff(boots)) > TOLERANCIA_BOOT)).astype(np.int64)
+    informa_boot = np.bincount(grupo, weights=conhecido, minlength=m) > 0
+    boot_final = boots[ultimo]
+    ligado = np.where(boot_final != BOOT_NULO, instantes[ultimo] - boot_final, -1)
+
+    periodo = np.maximum(fim - ini, 1)
+    disponibilidade = np.clip(100.0 * (1 - offline_total / periodo), 0, 100)
+
+    # Ativos sem batimento na janela: offline o período inteiro
+    def expandir(valores, vazio, dtype=None):
+        saida = np.full(n, vazio, dtype=dtype or np.asarray(valores).dtype)
+        saida[com_dados] = valores
+        return saida
+
+    return {
+        "batimentos": contagens.astype(np.int64),
+        "disponibilidade": expandir(disponibilidade, 0.0),
+        "periodos_offline": expandir(periodos.astype(np.int64), 1),
+        "offline_max_s": expandir(offline_max, -1),
+        "noites_offline": expandir(noites_off.astype(np.int64), -1),
+        "reinicios": expandir(np.where(informa_boot, reinicios, -1), -1),
+        "tempo_ligado_s": expandir(ligado, -1),
+        "ultimo_batimento": expandir(instantes[ultimo], -1),
+    }
+
+
+def resumir_setores(setores: list, ativos: dict, parados: np.ndarray) -> list:
+    """Agrega por setor os resultados (arrays alinhados com a lista setores)."""
+    chaves = np.array([s or "" for s in setores])
+    resumo = []
+    for setor in np.unique(chaves):
+        mascara = chaves == setor
+        disp = ativos["disponibilidade"][mascara]
+        ligado = ativos["tempo_ligado_s"][mascara]
+        ligado = ligado[ligado >= 0]
+        reinicios = ativos["reinicios"][mascara]
+        reinicios = reinicios[reinicios >= 0]
+        resumo.append({
+            "setor_id": setor or None,
+            "ativos": int(mascara.sum()),
+            "parados": int(parados[mascara].sum()),
+            "disponibilidade_media": round(float(disp.mean()), 2),
+            "disponibilidade_p05": round(float(np.percentile(disp, 5)), 2),
+            "tempo_ligado_p95_s": int(np.percentile(ligado, 95)) if len(ligado) else None,
+            "reinicios_media": round(float(reinicios.mean()), 2) if len(reinicios) else None,
+        })
+    return resumo
+
+
+def _deslocamento_noite(janela_de: datetime.datetime, fuso: str) -> int:
+    try:
+        from zoneinfo import ZoneInfo
+        offset = int(datetime.datetime.now(ZoneInfo(fuso)).utcoffset().total_seconds())
+    except Exception:
+        offset = -3 * 3600
+    return (HORA_NOITE * 3600 - offset - int(janela_de.timestamp())) % 86400
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula a saúde da frota a partir dos batimentos.")
+    parser.add_argument("--dias", type=int, default=DIAS, help=f"Janela analisada (padrão: {DIAS})")
+    parser.add_argument("--limiar-offline", type=int, default=LIMIAR_OFFLINE,
+                        help=f"Segundos sem batimento para contar como offline (padrão: {LIMIAR_OFFLINE})")
+    parser.add_argument("--limite-parado", type=int, default=LIMITE_PARADO,
+                        help=f"Segundos sem batimento para considerar parado (padrão: {LIMITE_PARADO})")
+    parser.add_argument("--fuso", default=FUSO, help=f"Fuso para as noites (padrão: {FUSO})")
+    parser.add_argument("--lote", type=int, default=ATIVOS_POR_LOTE, help=f"Ativos por lote (padrão: {ATIVOS_POR_LOTE})")
+    parser.add_argument("--sem-gravar", action="store_true", help="Só imprime o resumo, sem gravar as tabelas")
+    parser.add_argument("--url", default=os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL"))
+    parser.add_argument("--chave", default=os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+    args = parser.parse_args()
+
+    if not args.url or not args.chave:
+        parser.error("informe --url e --chave (ou SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY)")
+    url = args.url.rstrip("/")
+    sessao = requests.Session()
+    sessao.headers.update({"apikey": args.chave, "Authorization": f"Bearer {args.chave}",
+                           "Content-Type": "application/json"})
+
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    janela_de = agora - datetime.timedelta(days=args.dias)
+    fim = int((agora - janela_de).total_seconds())
+    noite = _deslocamento_noite(janela_de, args.fuso)
+    inicio = time.monotonic()
+
+    seriais, cadastro, resultados, lidos, segundos_calculo = [], [], [], 0, 0.0
+    apos = ""
+    while True:
+        r = sessao.post(f"{url}/rest/v1/rpc/fn_frota_batimentos", timeout=300, data=json.dumps({
+            "p_de": janela_de.isoformat(), "p_ate": agora.isoformat(),
+            "p_apos_serial": apos, "p_limite": args.lote}))
+        if r.status_code != 200:
+            sys.exit(f"Erro {r.status_code} ao ler os batimentos: {r.text[:300]}")
+        lote = r.json()
+        if lote:
+            t0 = time.monotonic()
+            resultados.append(analisar_lote(
+                np.array([l["batimentos"] for l in lote], dtype=np.int64),
+                np.concatenate([decodificar(l["instantes"]) for l in lote]),
+                np.concatenate([decodificar(l["boots"]) for l in lote]),
+                np.array([l["inicio"] for l in lote], dtype=np.int64),
+                fim, noite, args.limiar_offline,
+                # Sem a migração 20261031, o limiar fixo vale para todos
+                np.concatenate([decodificar(l["intervalos"]) for l in lote]) if "intervalos" in lote[0] else None))
+            segundos_calculo += time.monotonic() - t0
+            seriais.extend(l["serial"] for l in lote)
+            cadastro.extend((l["ativo_id"], l["setor_id"]) for l in lote)
+            lidos += sum(l["batimentos"] for l in lote)
+        if len(lote) < args.lote:
+            break
+        apos = lote[-1]["serial"]
+
+    if not seriais:
+        print("Nenhum ativo com coletor encontrado.")
+        return
+    if not lidos:
+        # Só o modo 'log' grava em ativos_heartbeats; no 'direto' (padrão) não há histórico
+        print(f"ativos_heartbeats não tem batimentos nos últimos {args.dias} dias. Este job precisa do modo "
+              "de ingestão 'log' (UPDATE configuracoes SET valor = 'log' WHERE chave = 'coletor_modo_ingestao').",
+              file=sys.stderr)
+
+    ativos = {k: np.concatenate([r[k] for r in resultados]) for k in resultados[0]}
+    ultimo = ativos["ultimo_batimento"]
+    parados = (ultimo < 0) | (fim - ultimo > args.limite_parado)
+    setores = [setor_id for _, setor_id in cadastro]
+    por_setor = resumir_setores(setores, ativos, parados)
+
+    print(f"{len(seriais)} ativos, {lidos} batimentos em {args.dias} dias: "
+          f"{time.monotonic() - inicio:.1f}s no total, {segundos_calculo:.2f}s de cálculo")
+    print(f"Disponibilidade média: {ativos['disponibilidade'].mean():.1f}% | parados: {int(parados.sum())} | "
+          f"offline quase toda noite: {int((ativos['noites_offline'] >= 0.8 * args.dias).sum())}")
+    for i in np.argsort(ativos["disponibilidade"])[:10]:
+        print(f"  {seriais[i]:<24} {ativos['disponibilidade'][i]:6.2f}%  "
+              f"{ativos['periodos_offline'][i]} períodos offline, {ativos['reinicios'][i]} reinícios")
+
+    if args.sem_gravar:
+        return
+
+    def instante(segundos):
+        return (janela_de + datetime.timedelta(seconds=int(segundos))).isoformat() if segundos >= 0 else None
+
+    def ou_nulo(valor):
+        return int(valor) if valor >= 0 else None
+
+    janela = {"janela_de": janela_de.isoformat(), "janela_ate": agora.isoformat()}
+    linhas = [{
+        "serial": s,
+        "ativo_id": cadastro[i][0],
+        "setor_id": setores[i],
+        "batimentos": int(ativos["batimentos"][i]),
+        "disponibilidade": round(float(ativos["disponibilidade"][i]), 2),
+        "periodos_offline": int(ativos["periodos_offline"][i]),
+        "offline_max_s": ou_nulo(ativos["offline_max_s"][i]),
+        "noites_offline": max(0, int(ativos["noites_offline"][i])),
+        "reinicios": ou_nulo(ativos["reinicios"][i]),
+        "tempo_ligado_s": ou_nulo(ativos["tempo_ligado_s"][i]),
+        "ultimo_batimento": instante(ultimo[i]),
+        "parado": bool(parados[i]),
+        **janela,
+    } for i, s in enumerate(seriais)]
+    r = sessao.post(f"{url}/rest/v1/rpc/fn_frota_saude_gravar", timeout=300, data=json.dumps({
+        "p_ativos": linhas, "p_setores": [{**s, **janela} for s in por_setor]}))
+    if r.status_code != 200:
+        sys.exit(f"Erro {r.status_code} ao gravar o resumo: {r.text[:300]}")
+    print(f"Resumo gravado: {r.json()}")
+
+
+if __name__ == "__main__":
+    main()
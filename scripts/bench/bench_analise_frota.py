@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark de scripts/analise_frota.py sobre uma frota sintética.
+
+Gera, por lote, batimentos de 5 em 5 minutos com três perfis:
+    servidor    sempre ligado, com quedas curtas ocasionais
+    desktop     ligado em horário comercial nos dias úteis, desligado à noite
+    notebook    sessões aleatórias ao longo do dia
+Cada lote passa pelo mesmo caminho do job: int4 big-endian em base64 (formato
+de fn_frota_batimentos), decodificação e analisar_lote. Mede só o processamento
+local, sem banco nem rede.
+
+Uso: python scripts/bench/bench_analise_frota.py [--ativos 10000] [--dias 30]
+Requer numpy e requests (importado pelo job).
+"""
+
+import argparse
+import base64
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import analise_frota  # noqa: E402
+
+INTERVALO = 300
+FUSO = -3 * 3600
+
+
+def gerar_lote(aleatorio: np.random.Generator, ativos: int, dias: int):
+    """(contagens, instantes, boots) no formato de analisar_lote, já ordenados."""
+    slots = dias * 86400 // INTERVALO
+    t = np.arange(slots, dtype=np.int64) * INTERVALO
+    hora = ((t + FUSO) % 86400) / 3600
+    util = ((t + FUSO) // 86400 + 3) % 7 < 5  # janela começa numa quinta
+
+    perfil = aleatorio.choice(3, size=ativos, p=[0.15, 0.6, 0.25])
+    online = np.ones((ativos, slots), dtype=bool)
+
+    # Desktop: liga entre 7h e 9h, desliga entre 17h e 19h, só em dias úteis
+    desk = perfil == 1
+    liga = aleatorio.uniform(7, 9, size=(desk.sum(), 1))
+    desliga = aleatorio.uniform(17, 19, size=(desk.sum(), 1))
+    online[desk] = (hora >= liga) & (hora < desliga) & util
+
+    # Notebook: ~40% do tempo ligado, em sessões de algumas horas
+    note = perfil == 2
+    trocas = aleatorio.random((note.sum(), slots)) < 1 / 36
+    online[note] = (np.cumsum(trocas, axis=1) % 5) < 2
+
+    # Quedas curtas para todos (rede, energia): ~1 por semana
+    quedas = aleatorio.random((ativos, slots)) < 1 / 2016
+    online &= ~(np.maximum.accumulate(np.where(quedas, np.arange(slots), -100), axis=1)
+                > np.arange(slots) - aleatorio.integers(2, 12, size=(ativos, 1)))
+
+    # Boot = início da sessão ligada (servidores reiniciam só às vezes após a queda)
+    inicio_sessao = online & ~np.concatenate([np.zeros((ativos, 1), bool), online[:, :-1]], axis=1)
+    inicio_sessao[perfil == 0, 1:] &= aleatorio.random(((perfil == 0).sum(), slots - 1)) < 0.5
+    boot = np.maximum.accumulate(np.where(inicio_sessao, t - aleatorio.integers(30, 120), -10 ** 9), axis=1)
+    boot = np.where(boot < 0, -86400 * 3, boot)
+
+    jitter = aleatorio.integers(0, 20, size=(ativos, slots))
+    contagens = online.sum(axis=1).astype(np.int64)
+    return contagens, (t + jitter)[online], boot[online]
+
+
+def como_rpc(valores: np.ndarray) -> str:
+    return base64.b64encode(valores.astype(">i4").tobytes()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ativos", type=int, default=10000)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--lote", type=int, default=analise_frota.ATIVOS_POR_LOTE)
+    args = parser.parse_args()
+
+    aleatorio = np.random.default_rng(42)
+    fim = args.dias * 86400
+    noite = (analise_frota.HORA_NOITE * 3600 - FUSO) % 86400
+    geracao = decodificacao = calculo = 0.0
+    resultados, batimentos = [], 0
+
+    for inicio in range(0, args.ativos, args.lote):
+        quantidade = min(args.lote, args.ativos - inicio)
+        t0 = time.perf_counter()
+        contagens, instantes, boots = gerar_lote(aleatorio, quantidade, args.dias)
+        limites = np.cumsum(contagens)[:-1]
+        textos = [(como_rpc(i), como_rpc(b)) for i, b in zip(np.split(instantes, limites), np.split(boots, limites))]
+        t1 = time.perf_counter()
+        instantes = np.concatenate([analise_frota.decodificar(i) for i, _ in textos])
+        boots = np.concatenate([analise_frota.decodificar(b) for _, b in textos])
+        t2 = time.perf_counter()
+        resultados.append(analise_frota.analisar_lote(
+            contagens, instantes, boots, np.zeros(quantidade, dtype=np.int64), fim, noite))
+        t3 = time.perf_counter()
+        geracao += t1 - t0
+        decodificacao += t2 - t1
+        calculo += t3 - t2
+        batimentos += len(instantes)
+
+    t0 = time.perf_counter()
+    ativos = {k: np.concatenate([r[k] for r in resultados]) for k in resultados[0]}
+    parados = fim - ativos["ultimo_batimento"] > analise_frota.LIMITE_PARADO
+    setores = [f"setor-{i % 40}" for i in range(args.ativos)]
+    analise_frota.resumir_setores(setores, ativos, parados)
+    agregacao = time.perf_counter() - t0
+
+    # Lote em que nenhum ativo bateu na janela (modo 'direto', ou todos desligados)
+    vazio = np.empty(0, dtype=np.int64)
+    silencioso = analise_frota.analisar_lote(np.zeros(args.lote, dtype=np.int64), vazio, vazio,
+                                             np.zeros(args.lote, dtype=np.int64), fim, noite)
+    assert all(len(v) == args.lote for v in silencioso.values())
+    assert not silencioso["disponibilidade"].any() and (silencioso["ultimo_batimento"] == -1).all()
+
+    print(f"{args.ativos} ativos x {args.dias} dias = {batimentos} batimentos (lotes de {args.lote})")
+    print(f"geração sintética  {geracao:7.2f}s  (não faz parte do job)")
+    print(f"decodificação      {decodificacao:7.2f}s")
+    print(f"cálculo por lote   {calculo:7.2f}s")
+    print(f"agregação/setores  {agregacao:7.2f}s")
+    print(f"total do job       {decodificacao + calculo + agregacao:7.2f}s  "
+          f"(pico de memória {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB)")
+    print(f"lote sem batimentos: {args.lote} ativos offline o período inteiro")
+    print(f"disponibilidade média {ativos['disponibilidade'].mean():.1f}%, "
+          f"reinícios médios {ativos['reinicios'].mean():.1f}, "
+          f"offline quase toda noite: {int((ativos['noites_offline'] >= 0.8 * args.dias).sum())}")
+
+
+if __name__ == "__main__":
+    main()
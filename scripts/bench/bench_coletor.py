@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark do coletor em modo --once: tempo total (wall time) por execução.
+
+Roda o coletor real contra um servidor HTTP local e mede quatro cenários:
+    fria        sem estado (primeira execução: descoberta de backends e todas as sondas)
+    quente      com o estado da execução anterior (sondas estáveis vêm do cache)
+    apertada    quente, com orçamento total de 3 s
+    sem_rede    servidor fora do ar (o registro vai para o spool)
+
+Uso: python scripts/bench/bench_coletor.py [--execucoes 10]
+Requer o pacote requests (o mesmo do coletor).
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+COLETOR = os.path.join(RAIZ, "public", "scripts", "coletor.py")
+
+
+class Servidor(BaseHTTPRequestHandler):
+    """Responde como o painel: 200 na ingestão, 404 nos endpoints opcionais."""
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(tamanho)
+        self.send_response(200 if self.path == "/api/collect" else 404)
+        self.end_headers()
+        self.wfile.write(b'{"success":true}')
+
+    do_GET = do_POST = _responder
+
+
+def executar(pasta: str, url: str, orcamento: float) -> tuple:
+    ambiente = dict(os.environ, APP_URL=url, API_KEY="bench")
+    inicio = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(pasta, "coletor.py"), "--once", "--orcamento-total", str(orcamento)],
+        cwd=pasta, env=ambiente, stdin=subprocess.DEVNULL, capture_output=True
+    )
+    return time.perf_counter() - inicio, proc.returncode
+
+
+def resumir(nome: str, medidas: list) -> None:
+    tempos = sorted(t for t, _ in medidas)
+    codigos = sorted({c for _, c in medidas})
+    p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    print(f"{nome:<10} n={len(tempos):<3} mín={tempos[0]:.3f}s mediana={statistics.median(tempos):.3f}s "
+          f"p95={p95:.3f}s máx={tempos[-1]:.3f}s saída={codigos}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--execucoes", type=int, default=10)
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Servidor)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    pasta = tempfile.mkdtemp(prefix="bench_coletor_")
+    try:
+        shutil.copy(COLETOR, pasta)
+        estado = os.path.join(pasta, "coletor_state.json")
+
+        fria = []
+        for _ in range(args.execucoes):
+            if os.path.exists(estado):
+                os.remove(estado)
+            fria.append(executar(pasta, url, 60))
+        resumir("fria", fria)
+
+        resumir("quente", [executar(pasta, url, 60) for _ in range(args.execucoes)])
+        resumir("apertada", [executar(pasta, url, 3) for _ in range(args.execucoes)])
+
+        servidor.shutdown()
+        servidor.server_close()
+        resumir("sem_rede", [executar(pasta, url, 10) for _ in range(args.execucoes)])
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env bash
+# Benchmark da ingestão do coletor: fluxo antigo (4 idas ao banco) x fn_ingest_coletor (1 ida).
+#
+# Uso: PGHOST=localhost PGUSER=postgres PGDATABASE=bench ./scripts/bench/bench_ingest.sh
+# Variáveis opcionais: CLIENTES (padrão 8), DURACAO em segundos (padrão 20).
+# ATENÇÃO: recria o schema public do banco informado; use um banco descartável.
+set -euo pipefail
+
+DIR="$(cd "$(dirname "$0")" && pwd)"
+RAIZ="$(cd "$DIR/../.." && pwd)"
+CLIENTES="${CLIENTES:-8}"
+DURACAO="${DURACAO:-20}"
+
+psql -q -v ON_ERROR_STOP=1 -f "$DIR/ingest_schema.sql" >/dev/null
+psql -q -v ON_ERROR_STOP=1 -f "$RAIZ/supabase/migrations/20261019_fn_ingest_coletor.sql" >/dev/null
+
+for cenario in ingest_legado ingest_rpc; do
+    echo "== $cenario (clientes=$CLIENTES, duração=${DURACAO}s)"
+    pgbench -n -c "$CLIENTES" -j "$CLIENTES" -T "$DURACAO" -f "$DIR/$cenario.sql" \
+        | grep -E "latency average|latency stddev|tps ="
+done
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark da sonda de processos (amostrar_processos) sobre um /proc sintético.
+
+Gera uma árvore com N diretórios de processo (stat, status) e mede a varredura:
+    primeira    sem amostra anterior (CPU média desde o início do processo)
+    delta       com a amostra anterior (CPU pela diferença de ticks)
+    real        o /proc da máquina, se existir
+
+Uso: python scripts/bench/bench_processos.py [--processos 10000] [--execucoes 20]
+Requer o pacote requests (importado pelo coletor).
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+COLETOR = os.path.join(RAIZ, "public", "scripts", "coletor.py")
+
+NOMES = ["bash", "python3", "Web Content", "postgres: writer", "(sd-pam)", "kworker/3:1-events", "java"]
+
+
+def carregar_coletor():
+    spec = importlib.util.spec_from_file_location("coletor", COLETOR)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def gerar_proc(pasta: str, quantidade: int, uptime: float = 86400.0) -> None:
+    """Árvore no formato do /proc com os campos que a sonda lê."""
+    aleatorio = random.Random(42)
+    with open(os.path.join(pasta, "uptime"), "w") as f:
+        f.write(f"{uptime:.2f} {uptime * 3:.2f}\n")
+    os.makedirs(os.path.join(pasta, "self"))  # entradas não numéricas são ignoradas
+    for pid in range(1, quantidade + 1):
+        diretorio = os.path.join(pasta, str(pid))
+        os.mkdir(diretorio)
+        nome = aleatorio.choice(NOMES)
+        inicio = aleatorio.randint(0, int(uptime * 100) - 1)
+        utime, stime = aleatorio.randint(0, 50000), aleatorio.randint(0, 20000)
+        rss = aleatorio.randint(0, 400000)
+        # Campos 3 a 52 do stat do Linux 5.x; os não usados pela sonda ficam zerados
+        campos = ["S", "1", str(pid), str(pid), "0", "-1", "4194560", "0", "0", "0", "0",
+                  str(utime), str(stime), "0", "0", "20", "0", "1", "0", str(inicio),
+                  str(rss * 4096 * 3), str(rss)] + ["0"] * 30
+        with open(os.path.join(diretorio, "stat"), "w") as f:
+            f.write(f"{pid} ({nome}) {' '.join(campos)}\n")
+        with open(os.path.join(diretorio, "status"), "w") as f:
+            f.write(f"Name:\t{nome}\nState:\tS (sleeping)\nTgid:\t{pid}\nPid:\t{pid}\nPPid:\t1\n"
+                    f"Uid:\t1000\t1000\t1000\t1000\nGid:\t1000\t1000\t1000\t1000\n")
+
+
+def medir(nome: str, funcao, execucoes: int) -> None:
+    tempos = []
+    for _ in range(execucoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    print(f"{nome:<10} n={len(tempos):<3} mín={tempos[0]:.2f}ms mediana={statistics.median(tempos):.2f}ms "
+          f"p95={p95:.2f}ms máx={tempos[-1]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processos", type=int, default=10000)
+    parser.add_argument("--execucoes", type=int, default=20)
+    args = parser.parse_args()
+
+    coletor = carregar_coletor()
+    pasta = tempfile.mkdtemp(prefix="bench_proc_")
+    try:
+        gerar_proc(pasta, args.processos)
+        print(f"/proc sintético com {args.processos} processos em {pasta}")
+
+        def primeira():
+            coletor._processos_anterior_em = None
+            coletor.amostrar_processos(pasta)
+
+        medir("primeira", primeira, args.execucoes)
+        medir("delta", lambda: coletor.amostrar_processos(pasta), args.execucoes)
+        amostra = coletor.amostrar_processos(pasta)
+        assert amostra["total"] == args.processos and len(amostra["cpu"]) == coletor.PROCESSOS_TOP
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if os.path.isfile("/proc/uptime"):
+        coletor._processos_anterior_em = None
+        medir("real", lambda: coletor.amostrar_processos(), args.execucoes)
+        print(f"({coletor.amostrar_processos()['total']} processos em /proc)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+-- pgbench: fluxo antigo do /api/collect, uma ida ao banco por comando (4 no total)
+\set k random(1, 100)
+\set n random(1, 10000)
+SELECT id, user_id FROM public.api_keys WHERE key_hash = 'sk_bench_' || :k;
+SELECT * FROM public.ativos WHERE serial = 'BENCH-' || :n;
+INSERT INTO public.ativos (nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto, sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao)
+VALUES ('PC-' || :n, 'Computador', 'BENCH-' || :n, 'Em uso', 'Intel Core i5', '16.384 MB', NULL, NULL, 'Windows 11', 'usuario' || :n, '1d 2h 4m', NOW())
+ON CONFLICT (serial) DO UPDATE SET
+    nome = EXCLUDED.nome, tipo = EXCLUDED.tipo, status = EXCLUDED.status,
+    processador = EXCLUDED.processador, memoria_ram = EXCLUDED.memoria_ram,
+    armazenamento = EXCLUDED.armazenamento, acesso_remoto = EXCLUDED.acesso_remoto,
+    sistema_operacional = EXCLUDED.sistema_operacional, ultimo_usuario = EXCLUDED.ultimo_usuario,
+    tempo_ligado = EXCLUDED.tempo_ligado, ultima_conexao = EXCLUDED.ultima_conexao, updated_at = NOW();
+UPDATE public.api_keys SET last_used_at = NOW() WHERE key_hash = 'sk_bench_' || :k;
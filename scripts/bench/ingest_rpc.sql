@@ -0,0 +1,8 @@
+-- pgbench: fluxo novo, uma única chamada a fn_ingest_coletor
+\set k random(1, 100)
+\set n random(1, 10000)
+SELECT public.fn_ingest_coletor('sk_bench_' || :k, jsonb_build_object(
+    'nome', 'PC-' || :n, 'tipo', 'Computador', 'serial', 'BENCH-' || :n, 'status', 'Em uso',
+    'processador', 'Intel Core i5', 'memoria_ram', '16.384 MB', 'armazenamento', '',
+    'acesso_remoto', NULL, 'sistema_operacional', 'Windows 11', 'ultimo_usuario', 'usuario' || :n,
+    'tempo_ligado', '1d 2h 4m'));
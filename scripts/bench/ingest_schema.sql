@@ -0,0 +1,56 @@
+-- Esquema mínimo para o benchmark de ingestão num Postgres local (não é migration).
+-- Replica as colunas de `ativos` e `api_keys` usadas pelo /api/collect.
+DROP SCHEMA IF EXISTS public CASCADE;
+CREATE SCHEMA public;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        CREATE ROLE service_role NOLOGIN;
+    END IF;
+END $$;
+
+CREATE TABLE public.api_keys (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    user_id UUID,
+    label TEXT,
+    key_hash TEXT UNIQUE NOT NULL,
+    last_used_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE public.ativos (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    nome TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    serial TEXT UNIQUE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Disponível',
+    processador TEXT,
+    memoria_ram TEXT,
+    armazenamento TEXT,
+    acesso_remoto TEXT,
+    sistema_operacional TEXT,
+    ultimo_usuario TEXT,
+    tempo_ligado TEXT,
+    ultima_conexao TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_ativos_updated_at BEFORE UPDATE ON public.ativos
+FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();
+
+INSERT INTO public.api_keys (label, key_hash)
+SELECT 'bench ' || i, 'sk_bench_' || i FROM generate_series(1, 100) i;
+
+INSERT INTO public.ativos (nome, tipo, serial, status, processador, memoria_ram, sistema_operacional, ultimo_usuario, tempo_ligado)
+SELECT 'PC-' || i, 'Computador', 'BENCH-' || i, 'Em uso', 'Intel Core i5', '16.384 MB', 'Windows 11', 'usuario' || i, '1d 2h 3m'
+FROM generate_series(1, 10000) i;
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Gera a credencial da ingestão direta do coletor pelo PostgREST.
+
+É um JWT (HS256) assinado com o segredo JWT do projeto, com o papel
+coletor_ingest (só executa fn_ingest_coletor_direto) e, em "kid", o id da
+Chave de API que ele representa. Apagar essa chave no painel invalida a
+credencial na hora, mesmo antes de expirar.
+
+Uso:
+    python scripts/credencial_ingestao.py --chave-id <id da Chave de API>
+    python scripts/credencial_ingestao.py --chave-id <id> --dias 90
+
+Segredo: SUPABASE_JWT_SECRET (Supabase > Project Settings > API > JWT Secret;
+no PostgREST local, o PGRST_JWT_SECRET) ou --segredo. Sem dependências externas.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+PAPEL = "coletor_ingest"
+DIAS = 365
+
+
+def _b64url(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode()
+
+
+def gerar_credencial(segredo: str, chave_id: str, dias: int = DIAS, agora: float = None) -> str:
+    agora = int(time.time() if agora is None else agora)
+    cabecalho = {"alg": "HS256", "typ": "JWT"}
+    claims = {"role": PAPEL, "kid": chave_id, "iat": agora, "exp": agora + dias * 86400}
+    partes = [_b64url(json.dumps(p, separators=(",", ":")).encode()) for p in (cabecalho, claims)]
+    assinatura = hmac.new(segredo.encode(), ".".join(partes).encode(), hashlib.sha256).digest()
+    return ".".join(partes + [_b64url(assinatura)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera a credencial (JWT) da ingestão direta do coletor.")
+    parser.add_argument("--chave-id", required=True, help="id (uuid) da Chave de API em api_keys")
+    parser.add_argument("--dias", type=int, default=DIAS, help=f"Validade em dias (padrão: {DIAS})")
+    parser.add_argument("--segredo", default=os.environ.get("SUPABASE_JWT_SECRET"))
+    args = parser.parse_args()
+
+    if not args.segredo:
+        parser.error("informe --segredo (ou SUPABASE_JWT_SECRET)")
+    try:
+        chave_id = str(uuid.UUID(args.chave_id))
+    except ValueError:
+        parser.error("--chave-id deve ser o uuid da Chave de API")
+    print(gerar_credencial(args.segredo, chave_id, args.dias))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Espelho local (SQLite) do inventário para consulta offline em campo.
+
+Mantém uma cópia de ativos, movimentacoes, softwares e licencas num arquivo
+SQLite. A primeira sincronização baixa tudo; as seguintes pedem, por tabela,
+só as linhas com updated_at depois da marca d'água guardada no próprio banco
+(páginas por keyset em (updated_at, id), como em exportar_inventario.py), e
+apagam o que foi excluído no servidor (espelho_exclusoes). Cada página é
+gravada junto com a sua marca, então uma sincronização interrompida continua
+de onde parou. Serial, nome e usuário são colunas indexadas: as consultas não
+dependem da rede e levam milissegundos.
+
+Uso:
+    python scripts/espelho_local.py sincronizar
+    python scripts/espelho_local.py sincronizar --email tecnico@empresa.com
+    python scripts/espelho_local.py buscar "joao"
+    python scripts/espelho_local.py ativo ABC123
+    python scripts/espelho_local.py sql "SELECT tipo, COUNT(*) FROM ativos GROUP BY tipo"
+    python scripts/espelho_local.py status
+
+Credenciais (só para sincronizar): SUPABASE_URL (ou NEXT_PUBLIC_SUPABASE_URL) e
+SUPABASE_SERVICE_ROLE_KEY, ou --url / --chave. Com --email, entra com o usuário
+do painel (senha pedida no terminal ou em ESPELHO_SENHA) e a chave anônima
+(SUPABASE_ANON_KEY ou NEXT_PUBLIC_SUPABASE_ANON_KEY). Sincronizar requer requests
+e a migração 20261101_espelho_local.sql; as consultas só usam a biblioteca padrão.
+"""
+
+import argparse
+import datetime
+import getpass
+import json
+import os
+import sqlite3
+import sys
+import time
+
+BANCO = "espelho_inventario.db"
+TAMANHO_PAGINA = 1000
+# Exclusões ficam 90 dias no servidor; um espelho mais velho que isso recomeça do zero
+VALIDADE_ESPELHO = datetime.timedelta(days=89)
+# Muda quando as colunas abaixo mudam: o espelho é recriado
+VERSAO_ESPELHO = 1
+
+# Colunas promovidas de cada tabela (o registro completo fica em "dados", JSON)
+# e os índices locais
+TABELAS = {
+    "ativos": {
+        "colunas": ("serial", "nome", "tipo", "status", "ultimo_usuario", "setor_id", "ultima_conexao"),
+        "indices": (("serial",), ("nome",), ("ultimo_usuario",)),
+    },
+    "movimentacoes": {
+        "colunas": ("ativo_id", "usuario_id", "tipo_movimentacao", "data_movimentacao"),
+        "indices": (("ativo_id", "data_movimentacao"),),
+    },
+    "softwares": {
+        "colunas": ("nome", "desenvolvedor", "versao", "categoria"),
+        "indices": (("nome",),),
+    },
+    "licencas": {
+        "colunas": ("software_id", "chave_licenca", "tipo", "qtd_adquirida", "data_expiracao"),
+        "indices": (("software_id",),),
+    },
+}
+EXCLUSOES = "espelho_exclusoes"
+# Texto comparado sem diferenciar maiúsculas: LIKE 'abc%' usa o índice
+SEM_CAIXA = {"serial", "nome", "ultimo_usuario", "chave_licenca"}
+
+
+def abrir(caminho: str, somente_leitura: bool = False) -> sqlite3.Connection:
+    if somente_leitura:
+        if not os.path.exists(caminho):
+            sys.exit(f"Espelho {caminho} não encontrado; rode primeiro: espelho_local.py sincronizar")
+        return sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    con = sqlite3.connect(caminho)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    criar_esquema(con)
+    return con
+
+
+def criar_esquema(con: sqlite3.Connection) -> None:
+    """Cria as tabelas locais; um espelho de outra versão recomeça do zero."""
+    versao = con.execute("PRAGMA user_version").fetchone()[0]
+    if versao not in (0, VERSAO_ESPELHO):
+        print(f"Espelho da versão {versao}; recriando.", file=sys.stderr)
+        limpar(con)
+    with con:
+        for tabela, definicao in TABELAS.items():
+            colunas = ", ".join(f"{c} TEXT{' COLLATE NOCASE' if c in SEM_CAIXA else ''}" for c in definicao["colunas"])
+            con.execute(f"CREATE TABLE IF NOT EXISTS {tabela} (id TEXT PRIMARY KEY, updated_at TEXT, {colunas}, dados TEXT NOT NULL)")
+            for indice in definicao["indices"]:
+                con.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{'_'.join(indice)} ON {tabela} ({', '.join(indice)})")
+        con.execute("CREATE TABLE IF NOT EXISTS _marcas (tabela TEXT PRIMARY KEY, cursor TEXT NOT NULL, sincronizado_em TEXT)")
+        con.execute(f"PRAGMA user_version = {VERSAO_ESPELHO}")
+
+
+def limpar(con: sqlite3.Connection) -> None:
+    with con:
+        for tabela in list(TABELAS) + ["_marcas"]:
+            con.execute(f"DROP TABLE IF EXISTS {tabela}")
+        con.execute("PRAGMA user_version = 0")
+
+
+def ler_marca(con: sqlite3.Connection, tabela: str) -> dict:
+    linha = con.execute("SELECT cursor FROM _marcas WHERE tabela = ?", (tabela,)).fetchone()
+    return json.loads(linha[0]) if linha else {}
+
+
+def gravar_marca(con: sqlite3.Connection, tabela: str, cursor: dict) -> None:
+    con.execute("INSERT OR REPLACE INTO _marcas (tabela, cursor, sincronizado_em) VALUES (?, ?, ?)",
+                (tabela, json.dumps(cursor), datetime.datetime.now(datetime.timezone.utc).isoformat()))
+
+
+def _valor(v):
+    return json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+
+
+def gravar_pagina(con: sqlite3.Connection, tabela: str, linhas: list) -> None:
+    colunas = TABELAS[tabela]["colunas"]
+    con.executemany(
+        f"INSERT OR REPLACE INTO {tabela} (id, updated_at, {', '.join(colunas)}, dados) "
+        f"VALUES (?, ?, {', '.join('?' * len(colunas))}, ?)",
+        [(l["id"], l["updated_at"], *(_valor(l.get(c)) for c in colunas), json.dumps(l, ensure_ascii=False))
+         for l in linhas])
+
+
+def sincronizar_tabela(con: sqlite3.Connection, sessao: "requests.Session", url: str, tabela: str,
+                       tamanho: int) -> int:
+    """Baixa as linhas alteradas desde a marca; cada página é confirmada com a marca nova."""
+    from exportar_inventario import nova_marca, paginas
+    cursor, info, total = ler_marca(con, tabela), {}, 0
+    for linhas in paginas(sessao, url, "*", cursor, tamanho, info, tabela):
+        with con:
+            gravar_pagina(con, tabela, linhas)
+            gravar_marca(con, tabela, nova_marca({"updated_at": linhas[-1]["updated_at"], "id": linhas[-1]["id"]},
+                                                 info["servidor_em"]))
+        total += len(linhas)
+    return total
+
+
+def aplicar_exclusoes(con: sqlite3.Connection, sessao: "requests.Session", url: str, tamanho: int,
+                      inicio_servidor: datetime.datetime) -> int:
+    """Apaga as linhas excluídas no servidor desde a marca (na primeira vez, desde o início desta sincronização)."""
+    from exportar_inventario import MARGEM_MARCA, nova_marca, paginas
+    cursor = ler_marca(con, EXCLUSOES) or {"excluido_em": (inicio_servidor - MARGEM_MARCA).isoformat(), "id": None}
+    info, total = {}, 0
+    for linhas in paginas(sessao, url, "id,tabela,registro_id,excluido_em", cursor, tamanho, info,
+                          EXCLUSOES, "excluido_em"):
+        with con:
+            for l in linhas:
+                if l["tabela"] in TABELAS:
+                    total += con.execute(f"DELETE FROM {l['tabela']} WHERE id = ?", (l["registro_id"],)).rowcount
+            ultimo = {"excluido_em": linhas[-1]["excluido_em"], "id": linhas[-1]["id"]}
+            cursor = nova_marca(ultimo, info["servidor_em"], "excluido_em")
+            gravar_marca(con, EXCLUSOES, cursor)
+    # Mesmo sem exclusões, registra quando o espelho esteve em dia pela última vez
+    with con:
+        gravar_marca(con, EXCLUSOES, cursor)
+    return total
+
+
+def _espelho_vencido(con: sqlite3.Connection) -> bool:
+    from exportar_inventario import _instante
+    linha = con.execute("SELECT sincronizado_em FROM _marcas WHERE tabela = ?", (EXCLUSOES,)).fetchone()
+    if not linha:
+        return False
+    return datetime.datetime.now(datetime.timezone.utc) - _instante(linha[0]) > VALIDADE_ESPELHO
+
+
+def _servidor_em(sessao: "requests.Session", url: str) -> datetime.datetime:
+    """Relógio do servidor (cabeçalho Date), lido antes de baixar qualquer tabela."""
+    from email.utils import parsedate_to_datetime
+    import requests
+    try:
+        r = sessao.get(f"{url}/rest/v1/{EXCLUSOES}", params={"select": "id", "limit": "0"}, timeout=60)
+        return parsedate_to_datetime(r.headers["Date"])
+    except (requests.exceptions.RequestException, KeyError, TypeError, ValueError):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+
+def sessao_autenticada(args) -> "requests.Session":
+    import requests
+    sessao = requests.Session()
+    sessao.headers.update({"Accept": "application/json"})
+    if not args.email:
+        sessao.headers.update({"apikey": args.chave, "Authorization": f"Bearer {args.chave}"})
+        return sessao
+    senha = os.environ.get("ESPELHO_SENHA") or getpass.getpass(f"Senha de {args.email}: ")
+    r = sessao.post(f"{args.url}/auth/v1/token", params={"grant_type": "password"}, timeout=60,
+                    headers={"apikey": args.anon}, json={"email": args.email, "password": senha})
+    if r.status_code != 200:
+        sys.exit(f"Falha no login ({r.status_code}): {r.text[:300]}")
+    sessao.headers.update({"apikey": args.anon, "Authorization": f"Bearer {r.json()['access_token']}"})
+    return sessao
+
+
+def sincronizar(args) -> None:
+    con = abrir(args.banco)
+    if _espelho_vencido(con):
+        print("Espelho sem sincronizar há mais de 89 dias; baixando tudo de novo.", file=sys.stderr)
+        limpar(con)
+        criar_esquema(con)
+    sessao = sessao_autenticada(args)
+    inicio, inicio_servidor = time.monotonic(), _servidor_em(sessao, args.url)
+
+    for tabela in TABELAS:
+        t0 = time.monotonic()
+        total = sincronizar_tabela(con, sessao, args.url, tabela, args.pagina)
+        print(f"  {tabela}: {total} linha(s) em {time.monotonic() - t0:.1f}s", file=sys.stderr)
+    excluidas = aplicar_exclusoes(con, sessao, args.url, args.pagina, inicio_servidor)
+    if excluidas:
+        print(f"  {excluidas} linha(s) excluída(s) no servidor removida(s)", file=sys.stderr)
+    con.execute("PRAGMA optimize")
+    con.close()
+    print(f"Espelho {args.banco} sincronizado em {time.monotonic() - inicio:.1f}s", file=sys.stderr)
+
+
+def imprimir(linhas: list, colunas: list) -> None:
+    if not linhas:
+        return
+    larguras = [min(40, max(len(str(c)), *(len(str(l[i] if l[i] is not None else "-")) for l in linhas)))
+                for i, c in enumerate(colunas)]
+    print("  ".join(str(c).ljust(w) for c, w in zip(colunas, larguras)))
+    for linha in linhas:
+        print("  ".join(str(v if v is not None else "-")[:w].ljust(w) for v, w in zip(linha, larguras)))
+
+
+def _consultar(con: sqlite3.Connection, sql: str, params=()) -> tuple:
+    t0 = time.perf_counter()
+    cursor = con.execute(sql, params)
+    linhas = cursor.fetchall()
+    colunas = [d[0] for d in cursor.description or ()]
+    print(f"({len(linhas)} linha(s) em {(time.perf_counter() - t0) * 1000:.1f} ms)", file=sys.stderr)
+    return colunas, linhas
+
+
+def buscar(args) -> None:
+    """Ativos por serial, nome ou usuário: primeiro por prefixo (índice), depois por trecho."""
+    con = abrir(args.banco, somente_leitura=True)
+    base = ("SELECT serial, nome, tipo, status, ultimo_usuario, ultima_conexao FROM ativos "
+            "WHERE serial LIKE :t ESCAPE '\\' OR nome LIKE :t ESCAPE '\\' OR ultimo_usuario LIKE :t ESCAPE '\\' "
+            "ORDER BY nome LIMIT :n")
+    # % e _ do termo são literais (seriais como "ABC_123"), não curingas
+    termo = args.termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    colunas, linhas = _consultar(con, base, {"t": f"{termo}%", "n": args.limite})
+    if not linhas:
+        colunas, linhas = _consultar(con, base, {"t": f"%{termo}%", "n": args.limite})
+    imprimir(linhas, colunas)
+
+
+def ativo(args) -> None:
+    """Registro completo de um ativo e as suas últimas movimentações."""
+    con = abrir(args.banco, somente_leitura=True)
+    _, linhas = _consultar(con, "SELECT id, dados FROM ativos WHERE serial = ?", (args.serial,))
+    if not linhas:
+        sys.exit(f"Ativo {args.serial} não está no espelho.")
+    ativo_id, dados = linhas[0]
+    print(json.dumps(json.loads(dados), ensure_ascii=False, indent=2))
+    colunas, movimentos = _consultar(
+        con, "SELECT data_movimentacao, tipo_movimentacao, json_extract(dados, '$.observacao') AS observacao "
+             "FROM movimentacoes WHERE ativo_id = ? ORDER BY data_movimentacao DESC LIMIT ?", (ativo_id, args.limite))
+    if movimentos:
+        print("\nMovimentações:")
+        imprimir(movimentos, colunas)
+
+
+def sql(args) -> None:
+    con = abrir(args.banco, somente_leitura=True)
+    try:
+        colunas, linhas = _consultar(con, args.consulta)
+    except sqlite3.Error as e:
+        sys.exit(f"Erro na consulta: {e}")
+    imprimir(linhas, colunas)
+
+
+def status(args) -> None:
+    con = abrir(args.banco, somente_leitura=True)
+    for tabela in list(TABELAS) + [EXCLUSOES]:
+        total = con.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0] if tabela in TABELAS else "-"
+        marca = con.execute("SELECT cursor, sincronizado_em FROM _marcas WHERE tabela = ?", (tabela,)).fetchone()
+        print(f"{tabela:<20} {total!s:>8} linha(s)  marca: {json.loads(marca[0]) if marca else '-'}  "
+              f"sincronizado em: {marca[1] if marca else 'nunca'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Espelho local (SQLite) do inventário para consulta offline.")
+    parser.add_argument("--banco", default=os.environ.get("ESPELHO_BANCO", BANCO),
+                        help=f"Arquivo SQLite do espelho (padrão: {BANCO})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sinc = sub.add_parser("sincronizar", help="Baixa as alterações desde a última sincronização")
+    sinc.add_argument("--pagina", type=int, default=TAMANHO_PAGINA, help=f"Linhas por página (padrão: {TAMANHO_PAGINA})")
+    sinc.add_argument("--email", help="Entra com este usuário do painel em vez da chave de serviço")
+    sinc.add_argument("--url", default=os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL"))
+    sinc.add_argument("--chave", default=os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+    sinc.add_argument("--anon", default=os.environ.get("SUPABASE_ANON_KEY") or os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY"))
+
+    bus = sub.add_parser("buscar", help="Procura ativos por serial, nome ou usuário")
+    bus.add_argument("termo")
+    bus.add_argument("--limite", type=int, default=50)
+
+    atv = sub.add_parser("ativo", help="Mostra um ativo (pelo serial) e as suas movimentações")
+    atv.add_argument("serial")
+    atv.add_argument("--limite", type=int, default=20, help="Movimentações exibidas (padrão: 20)")
+
+    cons = sub.add_parser("sql", help="Executa uma consulta SQL (somente leitura) no espelho")
+    cons.add_argument("consulta")
+
+    sub.add_parser("status", help="Linhas por tabela e marcas d'água")
+    args = parser.parse_args()
+
+    if args.comando == "sincronizar":
+        if not args.url or not (args.anon if args.email else args.chave):
+            parser.error("informe --url e --chave (ou SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY); "
+                         "com --email, a chave anônima (--anon ou SUPABASE_ANON_KEY)")
+        args.url = args.url.rstrip("/")
+        args.pagina = max(1, args.pagina)
+        sincronizar(args)
+    else:
+        {"buscar": buscar, "ativo": ativo, "sql": sql, "status": status}[args.comando](args)
+
+
+if __name__ == "__main__":
+    main()
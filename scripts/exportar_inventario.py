@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Exporta a tabela de ativos para auditoria/BI sem passar pela interface web.
+
+Lê a API REST do Supabase (PostgREST) em páginas por keyset em (updated_at, id)
+e grava cada página assim que chega: a memória usada não depende do tamanho
+do inventário, e nenhuma página custa mais que a anterior (sem OFFSET).
+
+Uso:
+    python scripts/exportar_inventario.py --saida ativos.csv
+    python scripts/exportar_inventario.py --saida ativos.parquet --formato parquet
+    python scripts/exportar_inventario.py --saida alterados.csv --incremental
+
+Com --incremental, só saem as linhas alteradas desde a última exportação; a
+marca d'água fica em <saida>.marca.json (ou em --marca) e só avança quando a
+exportação termina. Linhas alteradas no último minuto antes da exportação podem
+sair de novo na próxima: quem consome deve fazer upsert por id.
+
+Credenciais: SUPABASE_URL (ou NEXT_PUBLIC_SUPABASE_URL) e SUPABASE_SERVICE_ROLE_KEY,
+ou --url / --chave. Requer requests; parquet requer pyarrow.
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+TABELA = "ativos"
+TAMANHO_PAGINA = 1000
+TENTATIVAS = 3
+# Transações em andamento podem gravar updated_at anterior ao de linhas já
+# visíveis; a marca d'água fica esta margem atrás do relógio do servidor
+MARGEM_MARCA = datetime.timedelta(seconds=60)
+
+
+def _filtro_keyset(cursor: dict, coluna: str = "updated_at") -> dict:
+    """Parâmetros PostgREST para "depois do cursor" na ordem (coluna, id)."""
+    # Aspas: timestamps têm ':' e '.', reservados na sintaxe de filtros do PostgREST
+    ts = f'"{cursor[coluna]}"'
+    # O limite redundante (>=) vira Index Cond em (coluna, id): sem ele o OR
+    # é só filtro e cada página varre o índice desde o início
+    filtro = {coluna: f"gte.{ts}"}
+    if cursor.get("id") is not None:
+        filtro["or"] = f'({coluna}.gt.{ts},and({coluna}.eq.{ts},id.gt.{cursor["id"]}))'
+    return filtro
+
+
+def paginas(sessao: requests.Session, url: str, colunas: str, cursor: dict, tamanho: int, info: dict,
+            tabela: str = TABELA, coluna: str = "updated_at"):
+    """Gera as páginas em ordem até uma página vazia; info["servidor_em"] recebe o relógio do servidor."""
+    while True:
+        params = {"select": colunas, "order": f"{coluna}.asc,id.asc", "limit": str(tamanho)}
+        if cursor:
+            params.update(_filtro_keyset(cursor, coluna))
+
+        for tentativa in range(TENTATIVAS):
+            try:
+                r = sessao.get(f"{url}/rest/v1/{tabela}", params=params, timeout=60)
+                if r.status_code < 500:
+                    break
+            except requests.exceptions.RequestException as e:
+                if tentativa == TENTATIVAS - 1:
+                    raise
+                print(f"Falha de rede ({e}); tentando de novo...", file=sys.stderr)
+            time.sleep(2 ** tentativa)
+        if r.status_code != 200:
+            sys.exit(f"Erro {r.status_code} ao ler {tabela}: {r.text[:300]}")
+
+        if "servidor_em" not in info:
+            try:
+                info["servidor_em"] = parsedate_to_datetime(r.headers["Date"])
+            except (KeyError, TypeError, ValueError):
+                info["servidor_em"] = datetime.datetime.now(datetime.timezone.utc)
+
+        linhas = r.json()
+        if not linhas:
+            return
+        yield linhas
+        # Só a página vazia encerra: o servidor corta em db-max-rows (1000 no
+        # Supabase) sem avisar, e uma página curta não quer dizer fim
+        ultima = linhas[-1]
+        cursor = {coluna: ultima[coluna], "id": ultima["id"]}
+
+
+class SaidaCsv:
+    def __init__(self, arquivo):
+        self.arquivo = open(arquivo, "w", newline="", encoding="utf-8")
+        self.escritor = None
+
+    def gravar(self, linhas: list) -> None:
+        if self.escritor is None:
+            self.escritor = csv.DictWriter(self.arquivo, fieldnames=list(linhas[0]), extrasaction="ignore")
+            self.escritor.writeheader()
+        for linha in linhas:
+            # jsonb sai como JSON, não como repr do Python
+            self.escritor.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+                                    for k, v in linha.items()})
+
+    def fechar(self) -> None:
+        self.arquivo.close()
+
+
+class SaidaParquet:
+    """Um row group por página; o esquema vem da primeira página."""
+
+    def __init__(self, arquivo):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            sys.exit("Formato parquet requer o pacote pyarrow: pip install pyarrow")
+        self.caminho = arquivo
+        self.escritor = None
+        self.esquema = None
+
+    def gravar(self, linhas: list) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        linhas = [{k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+                   for k, v in linha.items()} for linha in linhas]
+        if self.esquema is None:
+            inferido = pa.Table.from_pylist(linhas).schema
+            # Coluna toda nula na primeira página: texto, para aceitar valores depois
+            self.esquema = pa.schema([pa.field(c.name, pa.string() if pa.types.is_null(c.type) else c.type)
+                                      for c in inferido])
+            self.escritor = pq.ParquetWriter(self.caminho, self.esquema, compression="zstd")
+        self.escritor.write_table(pa.Table.from_pylist(linhas, schema=self.esquema))
+
+    def fechar(self) -> None:
+        if self.escritor is not None:
+            self.escritor.close()
+
+
+def ler_marca(caminho: str) -> dict:
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def gravar_marca(caminho: str, cursor: dict) -> None:
+    temp = caminho + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(cursor, f)
+    os.replace(temp, caminho)
+
+
+def _instante(texto: str) -> datetime.datetime:
+    # O PostgREST omite zeros à direita nos microssegundos; fromisoformat (< 3.11) exige 3 ou 6 dígitos
+    m = re.match(r"(.*T\d\d:\d\d:\d\d)(?:\.(\d+))?(.*)$", texto)
+    return datetime.datetime.fromisoformat(f"{m.group(1)}.{(m.group(2) or '').ljust(6, '0')[:6]}{m.group(3)}")
+
+
+def nova_marca(ultimo: dict, servidor_em: datetime.datetime, coluna: str = "updated_at") -> dict:
+    """O último cursor exportado, mas nunca além de servidor_em - MARGEM_MARCA."""
+    corte = servidor_em - MARGEM_MARCA
+    if _instante(ultimo[coluna]) <= corte:
+        return ultimo
+    return {coluna: corte.isoformat(), "id": None}
+
+
+def exportar(url: str, chave: str, saida: str, formato: str, colunas: str,
+             incremental: bool, marca: str, tamanho: int) -> None:
+    sessao = requests.Session()
+    sessao.headers.update({"apikey": chave, "Authorization": f"Bearer {chave}", "Accept": "application/json"})
+
+    cursor = ler_marca(marca) if incremental else {}
+    if incremental and cursor:
+        print(f"Exportando alterações desde {cursor['updated_at']}", file=sys.stderr)
+
+    if colunas != "*":
+        # O keyset precisa das colunas da ordenação
+        colunas = ",".join(dict.fromkeys(colunas.split(",") + ["updated_at", "id"]))
+
+    temp = saida + ".tmp"
+    escritor = (SaidaParquet if formato == "parquet" else SaidaCsv)(temp)
+    info, total, ultimo, inicio = {}, 0, None, time.monotonic()
+    try:
+        for linhas in paginas(sessao, url.rstrip("/"), colunas, cursor, tamanho, info):
+            escritor.gravar(linhas)
+            total += len(linhas)
+            ultimo = {"updated_at": linhas[-1]["updated_at"], "id": linhas[-1]["id"]}
+            if total % (tamanho * 20) == 0:
+                print(f"  {total} linhas...", file=sys.stderr)
+    finally:
+        escritor.fechar()
+
+    if not ultimo:
+        if os.path.exists(temp):
+            os.remove(temp)
+        print("Nenhuma linha para exportar.", file=sys.stderr)
+        return
+    os.replace(temp, saida)
+    gravar_marca(marca, nova_marca(ultimo, info["servidor_em"]))
+    print(f"{total} linhas exportadas para {saida} em {time.monotonic() - inicio:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o inventário de ativos (CSV ou parquet).")
+    parser.add_argument("--saida", required=True, help="Arquivo de saída")
+    parser.add_argument("--formato", choices=("csv", "parquet"),
+                        help="Padrão: pela extensão da saída (csv se não for .parquet)")
+    parser.add_argument("--colunas", default="*", help="Colunas separadas por vírgula (padrão: todas)")
+    parser.add_argument("--incremental", action="store_true", help="Só as linhas alteradas desde a última exportação")
+    parser.add_argument("--marca", help="Arquivo da marca d'água (padrão: <saida>.marca.json)")
+    parser.add_argument("--pagina", type=int, default=TAMANHO_PAGINA, help=f"Linhas por página (padrão: {TAMANHO_PAGINA})")
+    parser.add_argument("--url", default=os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL"))
+    parser.add_argument("--chave", default=os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+    args = parser.parse_args()
+
+    if not args.url or not args.chave:
+        parser.error("informe --url e --chave (ou SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY)")
+    formato = args.formato or ("parquet" if args.saida.endswith(".parquet") else "csv")
+    exportar(args.url, args.chave, args.saida, formato, args.colunas,
+             args.incremental, args.marca or f"{args.saida}.marca.json", max(1, args.pagina))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Publica uma nova versão do coletor para a autoatualização dos agentes.
+
+Gera em public/scripts/:
+    versoes/coletor-<sha12>.py       cópia imutável de cada versão publicada
+    deltas/<de12>-<para12>.json      deltas por linha a partir das versões anteriores
+    coletor-manifest.json            versão, sha256, deltas e rollout, assinado (RSA/SHA-256)
+
+Uso:
+    python scripts/publicar_coletor.py --gerar-chave publicacao.pem
+    python scripts/publicar_coletor.py --chave publicacao.pem --rollout 10
+    python scripts/publicar_coletor.py --chave publicacao.pem --rollout 100   # amplia o rollout
+
+A chave privada nunca vai para o repositório. O módulo da chave pública
+(impresso por --gerar-chave) vai em CHAVE_ATUALIZACAO no coletor.py.
+Requer o executável openssl.
+"""
+
+import argparse
+import base64
+import difflib
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PUBLICO = os.path.join(RAIZ, "public", "scripts")
+COLETOR = os.path.join(PUBLICO, "coletor.py")
+VERSOES = os.path.join(PUBLICO, "versoes")
+DELTAS = os.path.join(PUBLICO, "deltas")
+MANIFESTO = os.path.join(PUBLICO, "coletor-manifest.json")
+
+# Versões anteriores que recebem delta; as mais antigas baixam o script inteiro
+VERSOES_COM_DELTA = 5
+# Delta maior que esta fração do script não compensa
+DELTA_MAX = 0.5
+
+
+def sha256(dados: bytes) -> str:
+    return hashlib.sha256(dados).hexdigest()
+
+
+def manifesto_canonico(manifesto: dict) -> bytes:
+    """Mesma serialização que o coletor usa para conferir a assinatura."""
+    corpo = {k: v for k, v in manifesto.items() if k != "assinatura"}
+    return json.dumps(corpo, sort_keys=True, separators=(",", ":"), ensure_ascii=True).encode()
+
+
+def gerar_delta(base: bytes, novo: bytes) -> dict:
+    """Operações por linha: [inicio, fim] copia da base, texto é inserido."""
+    linhas_base = base.decode("utf-8").splitlines(keepends=True)
+    linhas_novo = novo.decode("utf-8").splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, linhas_base, linhas_novo, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(linhas_novo[j1:j2]))
+    return {"de": sha256(base), "para": sha256(novo), "ops": ops}
+
+
+def aplicar_delta(base: bytes, delta: dict) -> bytes:
+    linhas = base.decode("utf-8").splitlines(keepends=True)
+    partes = []
+    for op in delta["ops"]:
+        partes.extend([op] if isinstance(op, str) else linhas[op[0]:op[1]])
+    return "".join(partes).encode("utf-8")
+
+
+def assinar(dados: bytes, chave: str) -> str:
+    resultado = subprocess.run(
+        ["openssl", "dgst", "-sha256", "-sign", chave],
+        input=dados, capture_output=True, check=True
+    )
+    return base64.b64encode(resultado.stdout).decode()
+
+
+def gerar_chave(arquivo: str) -> None:
+    if os.path.exists(arquivo):
+        sys.exit(f"{arquivo} já existe; não vou sobrescrever.")
+    subprocess.run(["openssl", "genrsa", "-out", arquivo, "3072"], check=True, capture_output=True)
+    os.chmod(arquivo, 0o600)
+    modulo = subprocess.run(["openssl", "rsa", "-in", arquivo, "-noout", "-modulus"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    print(f"Chave privada: {arquivo} (guarde fora do repositório)")
+    print("Cole no coletor.py:")
+    print(f'CHAVE_ATUALIZACAO = "{modulo.split("=", 1)[1].lower()}"')
+
+
+def versao_do_script(conteudo: bytes) -> str:
+    m = re.search(rb'^VERSAO_COLETOR = "([^"]+)"', conteudo, re.MULTILINE)
+    if not m:
+        sys.exit("VERSAO_COLETOR não encontrada no coletor.py")
+    return m.group(1).decode()
+
+
+def publicar(chave: str, rollout: int) -> None:
+    with open(COLETOR, "rb") as f:
+        novo = f.read()
+    compile(novo, COLETOR, "exec")
+    sha_novo = sha256(novo)
+    versao = versao_do_script(novo)
+
+    anterior = {}
+    if os.path.exists(MANIFESTO):
+        with open(MANIFESTO) as f:
+            anterior = json.load(f)
+        if anterior.get("sha256") != sha_novo and tuple(map(int, versao.split("."))) <= tuple(map(int, anterior["versao"].split("."))):
+            sys.exit(f"v{versao} não é maior que a publicada (v{anterior['versao']}); atualize VERSAO_COLETOR.")
+
+    os.makedirs(VERSOES, exist_ok=True)
+    os.makedirs(DELTAS, exist_ok=True)
+    destino = os.path.join(VERSOES, f"coletor-{sha_novo[:12]}.py")
+    if not os.path.exists(destino):
+        shutil.copyfile(COLETOR, destino)
+
+    # Deltas a partir das versões publicadas mais recentes
+    publicadas = sorted(
+        (os.path.join(VERSOES, n) for n in os.listdir(VERSOES) if n.endswith(".py")),
+        key=os.path.getmtime, reverse=True
+    )
+    deltas = {}
+    for caminho in publicadas[:VERSOES_COM_DELTA + 1]:
+        with open(caminho, "rb") as f:
+            base = f.read()
+        sha_base = sha256(base)
+        if sha_base == sha_novo:
+            continue
+        delta = gerar_delta(base, novo)
+        assert aplicar_delta(base, delta) == novo
+        dados = json.dumps(delta, separators=(",", ":")).encode()
+        if len(dados) > DELTA_MAX * len(novo):
+            continue
+        nome = f"{sha_base[:12]}-{sha_novo[:12]}.json"
+        with open(os.path.join(DELTAS, nome), "wb") as f:
+            f.write(dados)
+        deltas[sha_base] = {"url": f"/scripts/deltas/{nome}", "sha256": sha256(dados), "tamanho": len(dados)}
+
+    manifesto = {
+        "versao": versao,
+        "sha256": sha_novo,
+        "tamanho": len(novo),
+        "url": f"/scripts/versoes/coletor-{sha_novo[:12]}.py",
+        "deltas": deltas,
+        "rollout": max(0, min(100, rollout)),
+        "publicado_em": anterior.get("publicado_em") if anterior.get("sha256") == sha_novo else int(time.time()),
+    }
+    manifesto["assinatura"] = assinar(manifesto_canonico(manifesto), chave)
+
+    temp = MANIFESTO + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(temp, MANIFESTO)
+
+    print(f"Publicado v{versao} ({sha_novo[:12]}), rollout {manifesto['rollout']}%, {len(deltas)} delta(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publica o coletor para autoatualização.")
+    parser.add_argument("--chave", help="Chave privada RSA (PEM) de publicação")
+    parser.add_argument("--rollout", type=int, default=100,
+                        help="Percentual dos equipamentos que recebem a versão (padrão: 100)")
+    parser.add_argument("--gerar-chave", metavar="ARQUIVO", help="Gera um novo par de chaves e sai")
+    args = parser.parse_args()
+
+    if args.gerar_chave:
+        gerar_chave(args.gerar_chave)
+    elif args.chave:
+        publicar(args.chave, args.rollout)
+    else:
+        parser.error("informe --chave ou --gerar-chave")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Reconciliação de licenças: excesso de instalações, licenças vencendo ou
+vencidas em uso, licenças presas em ativos baixados e instalações duplicadas.
+
+Lê softwares, licencas, licencas_ativos e ativos da API REST do Supabase em
+páginas por keyset (id), cruza tudo em memória com dicionários (um passo por
+registro, sem consultas por item) e grava o relatório em
+licencas_discrepancias numa única chamada (fn_licencas_gravar_discrepancias).
+
+Uso:
+    python scripts/reconciliar_licencas.py
+    python scripts/reconciliar_licencas.py --dias-aviso 60
+    python scripts/reconciliar_licencas.py --sem-gravar      # só imprime o resumo
+
+Credenciais: SUPABASE_URL (ou NEXT_PUBLIC_SUPABASE_URL) e SUPABASE_SERVICE_ROLE_KEY,
+ou --url / --chave. Requer requests.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+TAMANHO_PAGINA = 1000
+DIAS_AVISO = 30  # mesmo prazo dos alertas de licença (fn_gerar_notificacoes_automaticas)
+STATUS_BAIXADO = "Baixado"
+
+
+def ler_tabela(sessao: requests.Session, url: str, tabela: str, colunas: str, tamanho: int = TAMANHO_PAGINA):
+    """Todas as linhas da tabela, em páginas ordenadas por id (sem OFFSET)."""
+    ultimo = None
+    while True:
+        params = {"select": colunas, "order": "id.asc", "limit": str(tamanho)}
+        if ultimo:
+            params["id"] = f"gt.{ultimo}"
+        r = sessao.get(f"{url}/rest/v1/{tabela}", params=params, timeout=60)
+        if r.status_code != 200:
+            sys.exit(f"Erro {r.status_code} ao ler {tabela}: {r.text[:300]}")
+        linhas = r.json()
+        yield from linhas
+        if len(linhas) < tamanho:
+            return
+        ultimo = linhas[-1]["id"]
+
+
+def reconciliar(softwares: dict, licencas: dict, instalacoes, ativos: dict,
+                hoje: datetime.date, dias_aviso: int = DIAS_AVISO) -> list:
+    """
+    Cruza os dados e devolve as discrepâncias (dicts no formato de
+    licencas_discrepancias). softwares, licencas e ativos são indexados por id;
+    instalacoes pode ser qualquer iterável de {licenca_id, ativo_id}.
+    """
+    por_licenca = Counter()
+    por_ativo_software = Counter()
+    em_ativo_baixado = []
+    for inst in instalacoes:
+        licenca = licencas.get(inst["licenca_id"])
+        if licenca is None:
+            continue
+        por_licenca[licenca["id"]] += 1
+        por_ativo_software[(inst["ativo_id"], licenca["software_id"])] += 1
+        ativo = ativos.get(inst["ativo_id"])
+        if ativo and ativo.get("status") == STATUS_BAIXADO:
+            em_ativo_baixado.append((licenca, ativo))
+
+    def nome_software(software_id) -> str:
+        return (softwares.get(software_id) or {}).get("nome") or "?"
+
+    itens = []
+    limite_aviso = hoje + datetime.timedelta(days=dias_aviso)
+    vagas_validas = defaultdict(int)
+    instaladas = defaultdict(int)
+
+    for licenca in licencas.values():
+        software_id = licenca["software_id"]
+        usadas = por_licenca.get(licenca["id"], 0)
+        qtd = licenca.get("qtd_adquirida")
+        expira = datetime.date.fromisoformat(licenca["data_expiracao"]) if licenca.get("data_expiracao") else None
+        instaladas[software_id] += usadas
+        detalhe = {"software": nome_software(software_id), "tipo": licenca.get("tipo"),
+                   "qtd_adquirida": qtd, "instalacoes": usadas}
+
+        if expira is not None and expira < hoje:
+            if usadas:
+                itens.append({"tipo": "licenca_expirada_em_uso", "software_id": software_id,
+                              "licenca_id": licenca["id"], "quantidade": usadas,
+                              "detalhe": {**detalhe, "data_expiracao": licenca["data_expiracao"]}})
+            continue  # licença vencida não conta como vaga do software
+
+        if qtd is not None:
+            vagas_validas[software_id] += qtd
+            if usadas > qtd:
+                itens.append({"tipo": "excesso_licenca", "software_id": software_id,
+                              "licenca_id": licenca["id"], "quantidade": usadas - qtd, "detalhe": detalhe})
+        if expira is not None and expira <= limite_aviso and usadas:
+            itens.append({"tipo": "licenca_expirando", "software_id": software_id,
+                          "licenca_id": licenca["id"], "quantidade": usadas,
+                          "detalhe": {**detalhe, "data_expiracao": licenca["data_expiracao"],
+                                      "dias": (expira - hoje).days}})
+
+    for software_id, total in instaladas.items():
+        excesso = total - vagas_validas.get(software_id, 0)
+        if total and excesso > 0:
+            itens.append({"tipo": "excesso_software", "software_id": software_id, "quantidade": excesso,
+                          "detalhe": {"software": nome_software(software_id), "instalacoes": total,
+                                      "licencas_validas": vagas_validas.get(software_id, 0)}})
+
+    for licenca, ativo in em_ativo_baixado:
+        itens.append({"tipo": "instalacao_ativo_baixado", "software_id": licenca["software_id"],
+                      "licenca_id": licenca["id"], "ativo_id": ativo["id"],
+                      "detalhe": {"software": nome_software(licenca["software_id"]), "ativo": ativo.get("nome")}})
+
+    for (ativo_id, software_id), quantidade in por_ativo_software.items():
+        if quantidade > 1:
+            itens.append({"tipo": "instalacao_duplicada", "software_id": software_id, "ativo_id": ativo_id,
+                          "quantidade": quantidade,
+                          "detalhe": {"software": nome_software(software_id),
+                                      "ativo": (ativos.get(ativo_id) or {}).get("nome")}})
+    return itens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcilia licenças e instalações e grava as discrepâncias.")
+    parser.add_argument("--dias-aviso", type=int, default=DIAS_AVISO,
+                        help=f"Antecedência (dias) para licença vencendo (padrão: {DIAS_AVISO})")
+    parser.add_argument("--sem-gravar", action="store_true", help="Só imprime o resumo, sem gravar o relatório")
+    parser.add_argument("--pagina", type=int, default=TAMANHO_PAGINA, help=f"Linhas por página (padrão: {TAMANHO_PAGINA})")
+    parser.add_argument("--url", default=os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL"))
+    parser.add_argument("--chave", default=os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+    args = parser.parse_args()
+
+    if not args.url or not args.chave:
+        parser.error("informe --url e --chave (ou SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY)")
+    url = args.url.rstrip("/")
+    sessao = requests.Session()
+    sessao.headers.update({"apikey": args.chave, "Authorization": f"Bearer {args.chave}"})
+
+    inicio = time.monotonic()
+    pagina = max(1, args.pagina)
+    softwares = {s["id"]: s for s in ler_tabela(sessao, url, "softwares", "id,nome", pagina)}
+    licencas = {l["id"]: l for l in ler_tabela(
+        sessao, url, "licencas", "id,software_id,tipo,qtd_adquirida,data_expiracao", pagina)}
+    ativos = {a["id"]: a for a in ler_tabela(sessao, url, "ativos", "id,nome,status", pagina)}
+    leitura = time.monotonic() - inicio
+
+    # As instalações são a tabela maior: são cruzadas enquanto chegam, sem guardar a lista
+    contador = Counter()
+
+    def instalacoes():
+        for inst in ler_tabela(sessao, url, "licencas_ativos", "id,licenca_id,ativo_id", pagina):
+            contador["instalacoes"] += 1
+            yield inst
+
+    itens = reconciliar(softwares, licencas, instalacoes(), ativos, datetime.date.today(), args.dias_aviso)
+    total = time.monotonic() - inicio
+
+    print(f"{len(softwares)} softwares, {len(licencas)} licenças, {contador['instalacoes']} instalações, "
+          f"{len(ativos)} ativos lidos em {total:.1f}s (cadastros em {leitura:.1f}s)")
+    for tipo, quantidade in sorted(Counter(i["tipo"] for i in itens).items()):
+        print(f"  {tipo:<28} {quantidade}")
+
+    if args.sem_gravar:
+        return
+    r = sessao.post(f"{url}/rest/v1/rpc/fn_licencas_gravar_discrepancias",
+                    data=json.dumps({"p_itens": itens}, ensure_ascii=False).encode(),
+                    headers={"Content-Type": "application/json"}, timeout=120)
+    if r.status_code != 200:
+        sys.exit(f"Erro {r.status_code} ao gravar o relatório: {r.text[:300]}")
+    print(f"{r.json()} discrepâncias gravadas em licencas_discrepancias")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Substituto local do PostgREST para os testes dos scripts.
+
+Serve GET /rest/v1/<tabela> a partir de listas de dicionários em memória, com
+o subconjunto da sintaxe usado pelo paginador de exportar_inventario.py:
+select, order (asc), limit, filtros coluna=op.valor (eq, gt, gte, lt) e
+or=(...,and(...)). Como o Supabase, corta cada resposta em max_linhas
+(db-max-rows) sem avisar e devolve o relógio do servidor no cabeçalho Date.
+"""
+
+import datetime
+import json
+import re
+import threading
+import urllib.parse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OPERADORES = {
+    "eq": lambda a, b: a == b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+}
+
+
+def _chave(valor):
+    """Valor comparável: timestamps viram datetime, o resto fica como texto."""
+    texto = str(valor).strip('"')
+    m = re.match(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(.*)$", texto)
+    if m:
+        return datetime.datetime.fromisoformat(f"{m.group(1)}.{(m.group(2) or '').ljust(6, '0')[:6]}{m.group(3)}")
+    return texto
+
+
+def _dividir(texto: str) -> list:
+    """Separa os termos de um or=(...) por vírgula, respeitando parênteses e aspas."""
+    termos, nivel, aspas, atual = [], 0, False, ""
+    for c in texto:
+        if c == '"':
+            aspas = not aspas
+        elif not aspas and c == "(":
+            nivel += 1
+        elif not aspas and c == ")":
+            nivel -= 1
+        elif not aspas and nivel == 0 and c == ",":
+            termos.append(atual)
+            atual = ""
+            continue
+        atual += c
+    return termos + [atual]
+
+
+def _condicao(termo: str):
+    if termo.startswith("and("):
+        partes = [_condicao(t) for t in _dividir(termo[4:-1])]
+        return lambda l: all(p(l) for p in partes)
+    coluna, op, valor = termo.split(".", 2)
+    return _filtro(coluna, f"{op}.{valor}")
+
+
+def _filtro(coluna: str, expressao: str):
+    if coluna == "or":
+        partes = [_condicao(t) for t in _dividir(expressao[1:-1])]
+        return lambda l: any(p(l) for p in partes)
+    op, valor = expressao.split(".", 1)
+    return lambda l: l[coluna] is not None and OPERADORES[op](_chave(l[coluna]), _chave(valor))
+
+
+class PostgrestLocal:
+    """Servidor numa thread; tabelas, max_linhas, agora e falhas podem mudar entre requisições."""
+
+    def __init__(self, tabelas: dict, max_linhas: int = 1000, agora: datetime.datetime = None):
+        self.tabelas = tabelas
+        self.max_linhas = max_linhas
+        self.agora = agora or datetime.datetime.now(datetime.timezone.utc)
+        # Número da requisição (1, 2, ...) -> status HTTP a devolver no lugar da resposta
+        self.falhas = {}
+        self.requisicoes = []
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def date_time_string(self, timestamp=None):
+                # Cabeçalho Date de send_response: o relógio simulado do servidor
+                return formatdate(servidor.agora.timestamp(), usegmt=True)
+
+            def do_GET(self):
+                servidor.requisicoes.append(self.path)
+                status, corpo = servidor.responder(self.path, len(servidor.requisicoes))
+                dados = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def fechar(self) -> None:
+        self.http.shutdown()
+        self.http.server_close()
+
+    def responder(self, caminho: str, numero: int):
+        if numero in self.falhas:
+            return self.falhas[numero], {"message": "falha simulada"}
+        url = urllib.parse.urlparse(caminho)
+        tabela = url.path.rsplit("/", 1)[-1]
+        if tabela not in self.tabelas:
+            return 404, {"message": f"relation {tabela} does not exist"}
+        params = dict(urllib.parse.parse_qsl(url.query))
+        colunas = params.pop("select", "*")
+        ordem = params.pop("order", "")
+        limite = min(int(params.pop("limit", self.max_linhas)), self.max_linhas)
+
+        linhas = list(self.tabelas[tabela])
+        for coluna, expressao in params.items():
+            condicao = _filtro(coluna, expressao)
+            linhas = [l for l in linhas if condicao(l)]
+        for termo in reversed([t for t in ordem.split(",") if t]):
+            coluna = termo.rsplit(".", 1)[0]
+            linhas.sort(key=lambda l: _chave(l[coluna]))
+        linhas = linhas[:limite]
+        if colunas != "*":
+            linhas = [{c: l.get(c) for c in colunas.split(",")} for l in linhas]
+        return 200, linhas
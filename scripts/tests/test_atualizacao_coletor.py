@@ -0,0 +1,313 @@
+"""
+Testes da autoatualização do coletor: assinatura do manifesto, deltas por
+linha, recusa de versão menor e reversão para o .bak, com o publicador
+(publicar_coletor.py) gerando os arquivos que o agente (public/scripts/coletor.py)
+consome por HTTP local.
+
+Uso (requer requests e o executável openssl):
+    python -m unittest discover -s scripts/tests
+"""
+
+import base64
+import contextlib
+import functools
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SCRIPTS)
+
+import publicar_coletor  # noqa: E402
+
+COLETOR_PUBLICO = os.path.abspath(os.path.join(SCRIPTS, "..", "public", "scripts", "coletor.py"))
+
+
+def _carregar_coletor():
+    # Pelo caminho: scripts/coletor.py (cópia antiga) também se chama coletor
+    spec = importlib.util.spec_from_file_location("coletor", COLETOR_PUBLICO)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+coletor = _carregar_coletor()
+
+
+def _gerar_chave(pasta: str, nome: str) -> tuple:
+    """(arquivo PEM, módulo em hex) de uma chave nova, como em publicar_coletor.py --gerar-chave."""
+    arquivo = os.path.join(pasta, nome)
+    with contextlib.redirect_stdout(io.StringIO()) as saida:
+        publicar_coletor.gerar_chave(arquivo)
+    modulo = saida.getvalue().split('CHAVE_ATUALIZACAO = "', 1)[1].split('"', 1)[0]
+    return arquivo, modulo
+
+
+def _com_versao(script: bytes, versao: str, extra: bytes = b"") -> bytes:
+    atual = f'VERSAO_COLETOR = "{coletor.VERSAO_COLETOR}"'.encode()
+    return script.replace(atual, f'VERSAO_COLETOR = "{versao}"'.encode(), 1) + extra
+
+
+@unittest.skipUnless(shutil.which("openssl"), "requer o executável openssl")
+class AssinaturaTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pasta = tempfile.mkdtemp()
+        cls.chave, cls.modulo = _gerar_chave(cls.pasta, "publicacao.pem")
+        _, cls.outro_modulo = _gerar_chave(cls.pasta, "outra.pem")
+        cls.manifesto = {"versao": "3.1", "sha256": "ab" * 32, "url": "/scripts/versoes/coletor-x.py",
+                         "deltas": {}, "rollout": 10, "publicado_em": 1700000000, "nota": "versão de teste"}
+        cls.manifesto["assinatura"] = publicar_coletor.assinar(
+            publicar_coletor.manifesto_canonico(cls.manifesto), cls.chave)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.pasta)
+
+    def verificar(self, manifesto: dict, modulo: str = None) -> bool:
+        return coletor.verificar_assinatura_rsa(coletor.manifesto_canonico(manifesto),
+                                                base64.b64decode(manifesto["assinatura"]),
+                                                self.modulo if modulo is None else modulo)
+
+    def test_assinatura_valida(self):
+        self.assertEqual(coletor.manifesto_canonico(self.manifesto),
+                         publicar_coletor.manifesto_canonico(self.manifesto))
+        self.assertTrue(self.verificar(self.manifesto))
+        self.assertTrue(self.verificar(self.manifesto, self.modulo.upper()))
+
+    def test_assinatura_do_openssl_direto(self):
+        dados = b"qualquer conteudo\n"
+        assinatura = subprocess.run(["openssl", "dgst", "-sha256", "-sign", self.chave],
+                                    input=dados, capture_output=True, check=True).stdout
+        self.assertTrue(coletor.verificar_assinatura_rsa(dados, assinatura, self.modulo))
+        self.assertFalse(coletor.verificar_assinatura_rsa(dados + b" ", assinatura, self.modulo))
+
+    def test_manifesto_adulterado(self):
+        for campo, valor in (("rollout", 100), ("sha256", "cd" * 32), ("versao", "9.9"),
+                             ("url", "http://outro/coletor.py"), ("deltas", {"ab" * 32: {}})):
+            with self.subTest(campo=campo):
+                self.assertFalse(self.verificar({**self.manifesto, campo: valor}))
+        self.assertFalse(self.verificar({**self.manifesto, "extra": 1}))
+
+        assinatura = bytearray(base64.b64decode(self.manifesto["assinatura"]))
+        assinatura[-1] ^= 1
+        for adulterada in (bytes(assinatura), bytes(assinatura[:-1]), b"\x00" + bytes(assinatura), b""):
+            with self.subTest(tamanho=len(adulterada)):
+                self.assertFalse(self.verificar({**self.manifesto,
+                                                 "assinatura": base64.b64encode(adulterada).decode()}))
+
+    def test_modulo_invalido(self):
+        # Outra chave, texto que não é hex, vazio, chave fraca e módulo par
+        n = int(self.modulo, 16)
+        for modulo in (self.outro_modulo, "zz" + self.modulo[2:], "", "ff" * 32,
+                       format(n + 1, "x"), format(n - 1, "x")):
+            with self.subTest(modulo=modulo[:16]):
+                self.assertFalse(self.verificar(self.manifesto, modulo))
+
+    def test_assinatura_maior_que_o_modulo(self):
+        n = int(self.modulo, 16)
+        assinatura = (n + 1).to_bytes((n.bit_length() + 7) // 8, "big")
+        self.assertFalse(coletor.verificar_assinatura_rsa(b"x", assinatura, self.modulo))
+
+
+class DeltaTest(unittest.TestCase):
+    def ida_e_volta(self, base: bytes, novo: bytes) -> None:
+        delta = json.loads(json.dumps(publicar_coletor.gerar_delta(base, novo), separators=(",", ":")))
+        self.assertEqual(coletor.aplicar_delta(base, delta), novo)
+        self.assertEqual(publicar_coletor.aplicar_delta(base, delta), novo)
+        self.assertEqual(delta["de"], coletor._sha256(base))
+        self.assertEqual(delta["para"], coletor._sha256(novo))
+
+    def test_crlf_e_quebras_incomuns(self):
+        base = (b"import os\r\n"
+                b"x = 1\r\n"
+                b"# secao\x0c\n"
+                b"y = 2\n"
+                b"s = 'a\x0bb'\n"
+                b"t = '\xe2\x80\xa8'\r"
+                b"u = '\xc2\x85'\n"
+                b"sem_quebra_final = 3")
+        novo = (b"import os\r\n"
+                b"import sys\r\n"
+                b"x = 1\r\n"
+                b"# secao\x0c\n"
+                b"y = 20\n"
+                b"s = 'a\x0bb'\n"
+                b"u = '\xc2\x85'\n"
+                b"sem_quebra_final = 3\r\n")
+        self.ida_e_volta(base, novo)
+        self.ida_e_volta(novo, base)
+        self.ida_e_volta(b"", novo)
+        self.ida_e_volta(base, b"")
+
+    def test_coletor_real(self):
+        with open(COLETOR_PUBLICO, "rb") as f:
+            base = f.read()
+        novo = _com_versao(base, "99.0", b"\r\n# rodape\x0c\r\n").replace(b"\n\n\n", b"\n\n", 5)
+        self.ida_e_volta(base, novo)
+        self.ida_e_volta(base, base.replace(b"\n", b"\r\n"))
+
+    def test_delta_de_outra_base_nao_confere(self):
+        delta = publicar_coletor.gerar_delta(b"a\nb\nc\n", b"a\nB\nc\n")
+        self.assertNotEqual(coletor._sha256(coletor.aplicar_delta(b"a\nc\n", delta)), delta["para"])
+
+
+class _SemLog(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(shutil.which("openssl"), "requer o executável openssl")
+class PublicacaoEAtualizacaoTest(unittest.TestCase):
+    """Publica numa cópia de public/, serve por HTTP e atualiza um coletor numa pasta temporária."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.chaves = tempfile.mkdtemp()
+        cls.chave, cls.modulo = _gerar_chave(cls.chaves, "publicacao.pem")
+        with open(COLETOR_PUBLICO, "rb") as f:
+            cls.v30 = _com_versao(f.read(), "3.0")
+        cls.v31 = _com_versao(cls.v30, "3.1", b"\r\n# nova versao\x0c\r\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.chaves)
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        publico = os.path.join(pasta, "public")
+        scripts = os.path.join(publico, "scripts")
+        os.makedirs(scripts)
+        self.fonte = os.path.join(scripts, "coletor.py")
+        for nome, valor in (("PUBLICO", scripts), ("COLETOR", self.fonte),
+                            ("VERSOES", os.path.join(scripts, "versoes")),
+                            ("DELTAS", os.path.join(scripts, "deltas")),
+                            ("MANIFESTO", os.path.join(scripts, "coletor-manifest.json"))):
+            patcher = mock.patch.object(publicar_coletor, nome, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.manifesto = publicar_coletor.MANIFESTO
+
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_SemLog, directory=publico))
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+
+        # O agente instalado: script v3.0 e estado numa pasta própria
+        agente = os.path.join(pasta, "agente")
+        os.makedirs(agente)
+        self.instalado = os.path.join(agente, "coletor.py")
+        with open(self.instalado, "wb") as f:
+            f.write(self.v30)
+        self.reiniciar = mock.Mock()
+        for alvo, valor in (("__file__", self.instalado),
+                            ("ESTADO_ARQUIVO", os.path.join(agente, "coletor_state.json")),
+                            ("_estado", None),
+                            ("_config", {"CHAVE_ATUALIZACAO": self.modulo}),
+                            ("VERSAO_COLETOR", "3.0"),
+                            ("reiniciar_coletor", self.reiniciar)):
+            patcher = mock.patch.object(coletor, alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(os.environ, {"APP_URL": f"http://127.0.0.1:{servidor.server_address[1]}",
+                                               "API_KEY": "chave", "APP_URLS": ""})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publicar(self, script: bytes, rollout: int = 100) -> dict:
+        with open(self.fonte, "wb") as f:
+            f.write(script)
+        with contextlib.redirect_stdout(io.StringIO()):
+            publicar_coletor.publicar(self.chave, rollout)
+        with open(self.manifesto) as f:
+            return json.load(f)
+
+    def ler_instalado(self) -> bytes:
+        with open(self.instalado, "rb") as f:
+            return f.read()
+
+    def reiniciar_agente(self) -> None:
+        """Uma inicialização: o estado é relido do disco, como num processo novo."""
+        coletor._estado = None
+        coletor.verificar_atualizacao_pendente()
+
+    def test_publicador_recusa_versao_menor_ou_igual(self):
+        self.publicar(self.v31)
+        for versao in ("3.0", "3.1", "2.99"):
+            with self.subTest(versao=versao), self.assertRaises(SystemExit):
+                self.publicar(_com_versao(self.v30, versao, b"# outro conteudo\n"))
+        # Republicar o mesmo arquivo (só para ampliar o rollout) continua permitido
+        self.assertEqual(self.publicar(self.v31, rollout=50)["rollout"], 50)
+
+    def test_agente_recusa_rebaixamento(self):
+        self.publicar(_com_versao(self.v30, "2.9"))
+        self.assertFalse(coletor.check_for_update("SERIAL-1", forcar=True))
+        self.assertEqual(self.ler_instalado(), self.v30)
+        self.assertFalse(os.path.exists(self.instalado + ".bak"))
+
+    def test_agente_ignora_manifesto_adulterado(self):
+        manifesto = self.publicar(self.v31)
+        manifesto["rollout"] = 100
+        manifesto["versao"] = "3.2"
+        with open(self.manifesto, "w") as f:
+            json.dump(manifesto, f)
+        self.assertFalse(coletor.check_for_update("SERIAL-1", forcar=True))
+        self.assertEqual(self.ler_instalado(), self.v30)
+
+    def test_atualiza_por_delta_e_reverte_sem_envio_confirmado(self):
+        self.publicar(self.v30)
+        manifesto = self.publicar(self.v31)
+        self.assertIn(coletor._sha256(self.v30), manifesto["deltas"])
+
+        with mock.patch.object(coletor.requests, "get", wraps=coletor.requests.get) as get:
+            self.assertTrue(coletor.check_for_update("SERIAL-1", forcar=True))
+        baixados = [c.args[0] for c in get.call_args_list]
+        self.assertTrue(any("/scripts/deltas/" in u for u in baixados))
+        self.assertFalse(any("/scripts/versoes/" in u for u in baixados))
+        self.assertEqual(self.ler_instalado(), self.v31)
+        with open(self.instalado + ".bak", "rb") as f:
+            self.assertEqual(f.read(), self.v30)
+
+        # Até ATUALIZACAO_TENTATIVAS inicializações sem envio confirmado, a versão nova fica
+        for _ in range(coletor.ATUALIZACAO_TENTATIVAS):
+            self.reiniciar_agente()
+        self.assertEqual(self.ler_instalado(), self.v31)
+        self.reiniciar.assert_not_called()
+
+        # Na seguinte, o .bak volta e o agente reinicia na versão anterior
+        self.reiniciar_agente()
+        self.assertEqual(self.ler_instalado(), self.v30)
+        self.assertFalse(os.path.exists(self.instalado + ".bak"))
+        self.reiniciar.assert_called_once()
+
+        # A versão revertida não é instalada de novo
+        coletor._estado = None
+        estado = coletor.load_state()["atualizacao"]
+        self.assertNotIn("pendente", estado)
+        self.assertEqual(estado["recusadas"], [manifesto["sha256"]])
+        self.assertFalse(coletor.check_for_update("SERIAL-1", forcar=True))
+        self.assertEqual(self.ler_instalado(), self.v30)
+
+    def test_envio_confirmado_mantem_a_versao_nova(self):
+        self.publicar(self.v31)
+        self.assertTrue(coletor.check_for_update("SERIAL-1", forcar=True))
+        self.reiniciar_agente()
+        coletor.confirmar_atualizacao()
+        for _ in range(coletor.ATUALIZACAO_TENTATIVAS + 1):
+            self.reiniciar_agente()
+        self.assertEqual(self.ler_instalado(), self.v31)
+        self.reiniciar.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
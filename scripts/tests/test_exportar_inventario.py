@@ -0,0 +1,128 @@
+"""
+Testes do paginador e da marca d'água de exportar_inventario.py contra o
+PostgREST local (postgrest_local.py).
+
+Uso (requer requests):
+    python -m unittest discover -s scripts/tests
+"""
+
+import csv
+import datetime
+import json
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import exportar_inventario  # noqa: E402
+from postgrest_local import PostgrestLocal  # noqa: E402
+
+UTC = datetime.timezone.utc
+INICIO = datetime.datetime(2026, 10, 1, 12, 0, tzinfo=UTC)
+
+
+def _ts(instante: datetime.datetime) -> str:
+    # Como o PostgREST: sem zeros à direita nos microssegundos
+    texto = instante.isoformat(timespec="microseconds")
+    corpo, fuso = texto[:-6], texto[-6:]
+    return corpo.rstrip("0").rstrip(".") + fuso
+
+
+def _ativo(n: int, instante: datetime.datetime) -> dict:
+    return {"id": str(uuid.UUID(int=n)), "nome": f"PC-{n:03d}", "updated_at": _ts(instante)}
+
+
+class ExportarInventarioTest(unittest.TestCase):
+    def setUp(self):
+        # 25 ativos; de 3 em 3 com o mesmo updated_at, para o desempate por id cruzar páginas
+        self.ativos = [_ativo(n, INICIO + datetime.timedelta(seconds=n // 3, microseconds=120000))
+                       for n in range(25)]
+        self.servidor = PostgrestLocal({"ativos": self.ativos}, max_linhas=4,
+                                       agora=INICIO + datetime.timedelta(hours=1))
+        self.addCleanup(self.servidor.fechar)
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.saida = os.path.join(pasta.name, "ativos.csv")
+        self.marca = self.saida + ".marca.json"
+
+    def exportar(self, incremental: bool = True, tamanho: int = 10) -> list:
+        exportar_inventario.exportar(self.servidor.url, "chave", self.saida, "csv", "*",
+                                     incremental, self.marca, tamanho)
+        if not os.path.exists(self.saida):
+            return []
+        with open(self.saida, newline="", encoding="utf-8") as f:
+            return [linha["nome"] for linha in csv.DictReader(f)]
+
+    def ler_marca(self) -> dict:
+        with open(self.marca) as f:
+            return json.load(f)
+
+    def test_pagina_acima_do_limite_do_servidor_le_tudo(self):
+        # --pagina 10 com db-max-rows 4: toda página volta curta e ainda assim não é a última
+        nomes = self.exportar(incremental=False)
+        self.assertEqual(nomes, [a["nome"] for a in self.ativos])
+        self.assertTrue(all("limit=10" in r for r in self.servidor.requisicoes))
+        # 7 páginas com linhas e a vazia que encerra
+        self.assertEqual(len(self.servidor.requisicoes), 8)
+
+    def test_keyset_desempata_por_id_sem_repetir_nem_pular(self):
+        self.servidor.max_linhas = 1000
+        nomes = self.exportar(incremental=False, tamanho=2)
+        self.assertEqual(nomes, [a["nome"] for a in self.ativos])
+        self.assertEqual(len(nomes), len(set(nomes)))
+
+    def test_incremental_retoma_da_marca(self):
+        self.assertEqual(len(self.exportar()), 25)
+        self.assertEqual(self.ler_marca(), {"updated_at": self.ativos[-1]["updated_at"],
+                                            "id": self.ativos[-1]["id"]})
+
+        # Sem alterações: nada sai, a saída anterior e a marca ficam
+        marca = self.ler_marca()
+        self.assertEqual(self.exportar(), [a["nome"] for a in self.ativos])
+        self.assertEqual(self.ler_marca(), marca)
+
+        # Um ativo alterado e um novo, ambos depois da marca
+        alterado = INICIO + datetime.timedelta(minutes=10)
+        self.ativos[5]["updated_at"] = _ts(alterado)
+        self.ativos.append(_ativo(99, alterado))
+        self.assertEqual(self.exportar(), ["PC-005", "PC-099"])
+        self.assertEqual(self.ler_marca(), {"updated_at": _ts(alterado), "id": self.ativos[-1]["id"]})
+
+    def test_interrupcao_nao_avanca_a_marca(self):
+        self.exportar()
+        marca = self.ler_marca()
+        for n in range(30, 40):
+            self.ativos.append(_ativo(n, INICIO + datetime.timedelta(minutes=20)))
+
+        # A segunda página falha em todas as tentativas: a exportação aborta
+        self.servidor.falhas = {n: 503 for n in range(len(self.servidor.requisicoes) + 2, 100)}
+        with mock.patch.object(exportar_inventario.time, "sleep"), self.assertRaises(SystemExit):
+            self.exportar()
+        self.assertEqual(self.ler_marca(), marca)
+
+        # A próxima exportação recomeça da mesma marca e traz as dez
+        self.servidor.falhas = {}
+        self.assertEqual(self.exportar(), [f"PC-{n:03d}" for n in range(30, 40)])
+
+    def test_marca_fica_atras_do_relogio_do_servidor(self):
+        self.exportar()
+        # Linha gravada 10 s antes do relógio do servidor: pode haver transação mais
+        # antiga ainda não visível, então a marca para em agora - MARGEM_MARCA
+        recente = self.servidor.agora - datetime.timedelta(seconds=10)
+        self.ativos.append(_ativo(50, recente))
+        self.assertEqual(self.exportar(), ["PC-050"])
+        corte = self.servidor.agora - exportar_inventario.MARGEM_MARCA
+        self.assertEqual(self.ler_marca(), {"updated_at": corte.isoformat(), "id": None})
+
+        # Uma linha que aparece depois com updated_at dentro da margem não se perde
+        # (a PC-050 sai de novo; quem consome faz upsert por id)
+        self.ativos.append(_ativo(51, recente - datetime.timedelta(seconds=20)))
+        self.assertEqual(self.exportar(), ["PC-051", "PC-050"])
+
+
+if __name__ == "__main__":
+    unittest.main()
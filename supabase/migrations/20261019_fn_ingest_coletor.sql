@@ -0,0 +1,108 @@
+-- Migration: Ingestão do coletor em uma única chamada ao banco
+-- Data: 2026-10-19
+--
+-- Antes, cada batimento do coletor fazia 4 idas ao banco a partir do /api/collect
+-- (validar chave, ler o ativo, upsert, atualizar last_used_at) e o merge
+-- "não sobrescrever valor bom com 'Desconhecido'" rodava no Node.
+-- Agora tudo acontece em fn_ingest_coletor, chamada uma vez por requisição.
+
+-- 1. Regra de merge (mesma do route.ts): valor novo válido vence; senão mantém o antigo
+CREATE OR REPLACE FUNCTION public.fn_coletor_merge(p_novo TEXT, p_antigo TEXT)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_novo IS NOT NULL AND p_novo NOT IN ('', 'Desconhecido') THEN p_novo
+        WHEN p_antigo IS NOT NULL AND p_antigo NOT IN ('', 'Desconhecido') THEN p_antigo
+        ELSE NULLIF(p_novo, '')
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 2. Merge + upsert de um registro do coletor (sem validação de chave)
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(p_registro JSONB)
+RETURNS VOID AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+
+    -- Sobrepõe ao registro atual apenas as chaves presentes no payload
+    v_novo := jsonb_populate_record(v_atual, p_registro);
+
+    -- Mapeamento para suportar versões antigas do coletor
+    v_novo.sistema_operacional := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'sistema_operacional', ''), NULLIF(p_registro->>'so', ''), p_registro->>'os_info'),
+        v_atual.sistema_operacional);
+    v_novo.ultimo_usuario := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'ultimo_usuario', ''), NULLIF(p_registro->>'usuario', ''), p_registro->>'user'),
+        v_atual.ultimo_usuario);
+    v_novo.tempo_ligado := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'tempo_ligado', ''), p_registro->>'uptime'),
+        v_atual.tempo_ligado);
+    v_novo.processador := public.fn_coletor_merge(p_registro->>'processador', v_atual.processador);
+    v_novo.memoria_ram := public.fn_coletor_merge(p_registro->>'memoria_ram', v_atual.memoria_ram);
+    v_novo.armazenamento := public.fn_coletor_merge(p_registro->>'armazenamento', v_atual.armazenamento);
+
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao
+    ) VALUES (
+        v_novo.nome, v_novo.tipo, v_novo.serial, COALESCE(v_novo.status, 'Disponível'),
+        v_novo.processador, v_novo.memoria_ram, v_novo.armazenamento, v_novo.acesso_remoto,
+        v_novo.sistema_operacional, v_novo.ultimo_usuario, v_novo.tempo_ligado, NOW()
+    )
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Ponto de entrada: valida a chave, aplica o merge/upsert (registro ou lote)
+--    e atualiza last_used_at no máximo uma vez por minuto por chave
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor(p_key_hash TEXT, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_key_id UUID;
+    v_lote JSONB;
+    v_registro JSONB;
+BEGIN
+    SELECT id INTO v_key_id FROM public.api_keys WHERE key_hash = p_key_hash;
+    IF v_key_id IS NULL THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'chave_invalida');
+    END IF;
+
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    FOR v_registro IN SELECT value FROM jsonb_array_elements(v_lote) LOOP
+        PERFORM public.fn_coletor_upsert_ativo(v_registro);
+    END LOOP;
+
+    -- A condição evita reescrever a linha da chave a cada batimento
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = v_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Somente o backend (service_role) pode chamar a ingestão
+REVOKE EXECUTE ON FUNCTION public.fn_coletor_upsert_ativo(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.fn_ingest_coletor(TEXT, JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_coletor_upsert_ativo(JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_coletor(TEXT, JSONB) TO service_role;
@@ -0,0 +1,79 @@
+-- Migration: Lista de revogação dos tokens do agente coletor
+-- Data: 2026-10-20
+--
+-- Os tokens do coletor são validados em memória pelo /api/collect. Ao apagar uma
+-- Chave de API, o id dela entra nesta lista, que o servidor relê periodicamente
+-- para recusar os tokens emitidos a partir dela antes de expirarem.
+
+-- 1. Tabela de revogações (acesso apenas pelo service_role)
+CREATE TABLE IF NOT EXISTS public.api_keys_revogadas (
+    key_id UUID PRIMARY KEY,
+    revogada_em TIMESTAMPTZ DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_keys_revogadas_em ON public.api_keys_revogadas (revogada_em);
+
+ALTER TABLE public.api_keys_revogadas ENABLE ROW LEVEL SECURITY;
+
+-- 2. Registrar a revogação quando a chave é apagada no painel
+CREATE OR REPLACE FUNCTION public.fn_registrar_revogacao_api_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.api_keys_revogadas (key_id) VALUES (OLD.id)
+    ON CONFLICT (key_id) DO UPDATE SET revogada_em = NOW();
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS tr_registrar_revogacao_api_key ON public.api_keys;
+
+CREATE TRIGGER tr_registrar_revogacao_api_key
+AFTER DELETE ON public.api_keys
+FOR EACH ROW
+EXECUTE FUNCTION public.fn_registrar_revogacao_api_key();
+
+-- 3. Ingestão a partir de um token já validado (sem consultar api_keys pelo hash)
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+    v_registro JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    FOR v_registro IN SELECT value FROM jsonb_array_elements(v_lote) LOOP
+        PERFORM public.fn_coletor_upsert_ativo(v_registro);
+    END LOOP;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 4. A ingestão por chave passa a delegar para a mesma rotina
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor(p_key_hash TEXT, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_key_id UUID;
+BEGIN
+    SELECT id INTO v_key_id FROM public.api_keys WHERE key_hash = p_key_hash;
+    IF v_key_id IS NULL THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'chave_invalida');
+    END IF;
+
+    RETURN public.fn_ingest_coletor_token(v_key_id, p_payload);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_ingest_coletor_token(UUID, JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_coletor_token(UUID, JSONB) TO service_role;
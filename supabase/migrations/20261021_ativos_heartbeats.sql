@@ -0,0 +1,264 @@
+-- Migration: Log de batimentos do coletor (append-only, particionado por dia)
+-- Data: 2026-10-21
+--
+-- Reescrever a linha larga de `ativos` a cada batimento dispara os triggers de
+-- updated_at/auditoria e gera churn de linhas, inchaço de índices e WAL
+-- proporcionais a (frota x frequência). Com o modo 'log', o /api/collect apenas
+-- acrescenta o batimento em ativos_heartbeats; fn_fold_heartbeats aplica em
+-- `ativos` só o que mudou de fato e consolida o histórico por dia. Partições
+-- antigas são descartadas inteiras (DROP) em vez de DELETE linha a linha.
+--
+-- Ativação: UPDATE configuracoes SET valor = 'log' WHERE chave = 'coletor_modo_ingestao';
+
+-- 1. Tabela de batimentos, particionada por dia de recebimento
+CREATE TABLE IF NOT EXISTS public.ativos_heartbeats (
+    id BIGINT GENERATED ALWAYS AS IDENTITY,
+    serial TEXT NOT NULL,
+    key_id UUID,
+    payload JSONB NOT NULL,
+    recebido_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, recebido_em)
+) PARTITION BY RANGE (recebido_em);
+
+-- BRIN é quase gratuito de manter numa tabela só de inserção em ordem de tempo
+CREATE INDEX IF NOT EXISTS idx_ativos_heartbeats_recebido_em ON public.ativos_heartbeats USING BRIN (recebido_em);
+CREATE INDEX IF NOT EXISTS idx_ativos_heartbeats_serial ON public.ativos_heartbeats (serial, recebido_em);
+
+-- Partição padrão: nenhum batimento se perde se o job de partições atrasar
+CREATE TABLE IF NOT EXISTS public.ativos_heartbeats_default PARTITION OF public.ativos_heartbeats DEFAULT;
+
+ALTER TABLE public.ativos_heartbeats ENABLE ROW LEVEL SECURITY;
+
+-- 2. Histórico consolidado por ativo e dia
+CREATE TABLE IF NOT EXISTS public.ativos_heartbeats_diario (
+    serial TEXT NOT NULL,
+    dia DATE NOT NULL,
+    batimentos INTEGER NOT NULL DEFAULT 0,
+    primeiro_em TIMESTAMPTZ NOT NULL,
+    ultimo_em TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (serial, dia)
+);
+
+ALTER TABLE public.ativos_heartbeats_diario ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Histórico de batimentos visível para autenticados" ON public.ativos_heartbeats_diario
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- Marca d'água do fold (linha única)
+CREATE TABLE IF NOT EXISTS public.ativos_heartbeats_fold (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    processado_ate TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+INSERT INTO public.ativos_heartbeats_fold (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE public.ativos_heartbeats_fold ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO public.configuracoes (chave, valor, updated_at)
+VALUES ('coletor_modo_ingestao', 'direto', NOW())
+ON CONFLICT (chave) DO NOTHING;
+
+-- 3. Gestão de partições
+CREATE OR REPLACE FUNCTION public.fn_heartbeats_criar_particoes(p_dias_a_frente INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+DECLARE
+    v_dia DATE;
+BEGIN
+    FOR v_dia IN SELECT generate_series(CURRENT_DATE, CURRENT_DATE + p_dias_a_frente, INTERVAL '1 day')::DATE LOOP
+        IF to_regclass('public.ativos_heartbeats_p' || to_char(v_dia, 'YYYYMMDD')) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.ativos_heartbeats FOR VALUES FROM (%L) TO (%L)',
+                'ativos_heartbeats_p' || to_char(v_dia, 'YYYYMMDD'), v_dia, v_dia + 1
+            );
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.fn_heartbeats_remover_particoes(p_retencao INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_particao TEXT;
+    v_total INTEGER := 0;
+BEGIN
+    FOR v_particao IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.ativos_heartbeats'::regclass
+          AND c.relname ~ '^ativos_heartbeats_p[0-9]{8}$'
+          AND to_date(substring(c.relname FROM '[0-9]{8}$'), 'YYYYMMDD') + 1 <= (NOW() - p_retencao)::DATE
+    LOOP
+        EXECUTE format('DROP TABLE public.%I', v_particao);
+        v_total := v_total + 1;
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+SELECT public.fn_heartbeats_criar_particoes();
+
+-- 4. Merge/upsert com opção de só escrever quando algo mudou
+DROP FUNCTION IF EXISTS public.fn_coletor_upsert_ativo(JSONB);
+
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+
+    -- Sobrepõe ao registro atual apenas as chaves presentes no payload
+    v_novo := jsonb_populate_record(v_atual, p_registro);
+
+    -- Mapeamento para suportar versões antigas do coletor
+    v_novo.sistema_operacional := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'sistema_operacional', ''), NULLIF(p_registro->>'so', ''), p_registro->>'os_info'),
+        v_atual.sistema_operacional);
+    v_novo.ultimo_usuario := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'ultimo_usuario', ''), NULLIF(p_registro->>'usuario', ''), p_registro->>'user'),
+        v_atual.ultimo_usuario);
+    v_novo.tempo_ligado := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'tempo_ligado', ''), p_registro->>'uptime'),
+        v_atual.tempo_ligado);
+    v_novo.processador := public.fn_coletor_merge(p_registro->>'processador', v_atual.processador);
+    v_novo.memoria_ram := public.fn_coletor_merge(p_registro->>'memoria_ram', v_atual.memoria_ram);
+    v_novo.armazenamento := public.fn_coletor_merge(p_registro->>'armazenamento', v_atual.armazenamento);
+    v_novo.ultima_conexao := GREATEST(v_atual.ultima_conexao, p_recebido_em);
+
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, v_novo.tempo_ligado)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, v_atual.tempo_ligado)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao
+    ) VALUES (
+        v_novo.nome, v_novo.tipo, v_novo.serial, COALESCE(v_novo.status, 'Disponível'),
+        v_novo.processador, v_novo.memoria_ram, v_novo.armazenamento, v_novo.acesso_remoto,
+        v_novo.sistema_operacional, v_novo.ultimo_usuario, v_novo.tempo_ligado, v_novo.ultima_conexao
+    )
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_coletor_upsert_ativo(JSONB, TIMESTAMPTZ, INTERVAL) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_coletor_upsert_ativo(JSONB, TIMESTAMPTZ, INTERVAL) TO service_role;
+
+-- 5. Ingestão: no modo 'log' o batimento vai só para ativos_heartbeats
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+    v_registro JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    IF (SELECT valor FROM public.configuracoes WHERE chave = 'coletor_modo_ingestao') = 'log' THEN
+        INSERT INTO public.ativos_heartbeats (serial, key_id, payload)
+        SELECT r->>'serial', p_key_id, r FROM jsonb_array_elements(v_lote) r;
+    ELSE
+        FOR v_registro IN SELECT value FROM jsonb_array_elements(v_lote) LOOP
+            PERFORM public.fn_coletor_upsert_ativo(v_registro);
+        END LOOP;
+    END IF;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 6. Fold: aplica o último batimento de cada ativo e consolida o histórico
+CREATE OR REPLACE FUNCTION public.fn_fold_heartbeats(
+    p_resolucao_conexao INTERVAL DEFAULT INTERVAL '5 minutes'
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_de TIMESTAMPTZ;
+    -- Margem para transações de ingestão ainda não confirmadas
+    v_ate TIMESTAMPTZ := NOW() - INTERVAL '30 seconds';
+    v_rec RECORD;
+    v_lidos INTEGER := 0;
+    v_escritos INTEGER := 0;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('fn_fold_heartbeats')) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'fold_em_andamento');
+    END IF;
+
+    SELECT processado_ate INTO v_de FROM public.ativos_heartbeats_fold WHERE id = 1 FOR UPDATE;
+    IF v_de >= v_ate THEN
+        RETURN jsonb_build_object('ok', true, 'ativos', 0, 'escritos', 0);
+    END IF;
+
+    FOR v_rec IN
+        SELECT DISTINCT ON (serial) serial, payload, recebido_em
+        FROM public.ativos_heartbeats
+        WHERE recebido_em > v_de AND recebido_em <= v_ate
+        ORDER BY serial, recebido_em DESC
+    LOOP
+        v_lidos := v_lidos + 1;
+        IF public.fn_coletor_upsert_ativo(v_rec.payload, v_rec.recebido_em, p_resolucao_conexao) THEN
+            v_escritos := v_escritos + 1;
+        END IF;
+    END LOOP;
+
+    INSERT INTO public.ativos_heartbeats_diario AS d (serial, dia, batimentos, primeiro_em, ultimo_em)
+    SELECT serial, recebido_em::DATE, COUNT(*), MIN(recebido_em), MAX(recebido_em)
+    FROM public.ativos_heartbeats
+    WHERE recebido_em > v_de AND recebido_em <= v_ate
+    GROUP BY serial, recebido_em::DATE
+    ON CONFLICT (serial, dia) DO UPDATE SET
+        batimentos = d.batimentos + EXCLUDED.batimentos,
+        primeiro_em = LEAST(d.primeiro_em, EXCLUDED.primeiro_em),
+        ultimo_em = GREATEST(d.ultimo_em, EXCLUDED.ultimo_em);
+
+    UPDATE public.ativos_heartbeats_fold SET processado_ate = v_ate WHERE id = 1;
+
+    RETURN jsonb_build_object('ok', true, 'ativos', v_lidos, 'escritos', v_escritos);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_fold_heartbeats(INTERVAL) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_fold_heartbeats(INTERVAL) TO service_role;
+
+-- 7. Agendamento (quando o pg_cron estiver habilitado no projeto)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('coletor-fold-heartbeats', '* * * * *', 'SELECT public.fn_fold_heartbeats()');
+        PERFORM cron.schedule('coletor-particoes-heartbeats', '15 0 * * *',
+            'SELECT public.fn_heartbeats_criar_particoes(); SELECT public.fn_heartbeats_remover_particoes()');
+    END IF;
+END $$;
@@ -0,0 +1,23 @@
+-- Migration: Configuração remota dos coletores
+-- Data: 2026-10-22
+--
+-- Documento JSON servido em /api/agent/config, com as mesmas chaves do
+-- config.json do coletor. Os valores publicados aqui têm precedência sobre o
+-- config.json local e chegam aos agentes em até ~5 minutos.
+--
+-- Chaves aceitas:
+--   HEARTBEAT_INTERVAL   intervalo base (s) entre envios
+--   ORCAMENTO_COLETA     tempo máximo (s) com sondas por ciclo
+--   APP_URLS             endpoints de ingestão alternativos
+--   HEDGING              envio de cópia ao próximo endpoint quando o atual demora
+--   TIMEOUT_ENVIO        timeout (s) de cada envio
+--   SONDAS_DESATIVADAS   lista de sondas desligadas (ex.: ["armazenamento"])
+--   INTERVALO_SONDAS     validade (s) por sonda (ex.: {"processador": 86400})
+--
+-- Exemplo: UPDATE configuracoes SET valor = '{"HEARTBEAT_INTERVAL": 900}', updated_at = NOW()
+--          WHERE chave = 'coletor_config';
+
+-- Começa vazio: nenhum agente muda de comportamento até o documento ser editado
+INSERT INTO public.configuracoes (chave, valor, updated_at)
+VALUES ('coletor_config', '{}', NOW())
+ON CONFLICT (chave) DO NOTHING;
@@ -0,0 +1,109 @@
+-- Migration: Payload v3 do coletor (campos numéricos canônicos)
+-- Data: 2026-10-23
+--
+-- O coletor 3.0 envia, ao lado dos textos legados, RAM e disco em bytes e o
+-- instante do boot (UTC) em vez do tempo ligado formatado. Como esses valores
+-- não mudam entre batimentos, o payload fica estável e o servidor pode comparar
+-- e agregar sem interpretar strings como "10.116 MB" ou "3d 4h 12m".
+
+-- 1. Colunas tipadas
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS memoria_ram_bytes BIGINT;
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS armazenamento_bytes BIGINT;
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS boot_em TIMESTAMPTZ;
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS schema_coletor SMALLINT;
+
+-- 2. Tempo ligado no formato legado ("3d 4h 12m"), derivado do boot
+CREATE OR REPLACE FUNCTION public.fn_coletor_tempo_ligado(p_boot_em TIMESTAMPTZ, p_referencia TIMESTAMPTZ)
+RETURNS TEXT AS $$
+    SELECT format('%sd %sh %sm',
+        EXTRACT(DAY FROM d)::INT, EXTRACT(HOUR FROM d)::INT, EXTRACT(MINUTE FROM d)::INT)
+    FROM (SELECT justify_hours(GREATEST(p_referencia - p_boot_em, INTERVAL '0')) AS d) t;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 3. Upsert com os campos v3
+--    boot_em substitui tempo_ligado na detecção de mudança: o tempo ligado cresce a
+--    cada minuto, o boot não. O texto legado é recalculado a cada escrita.
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+
+    -- Sobrepõe ao registro atual apenas as chaves presentes no payload
+    -- (memoria_ram_bytes, armazenamento_bytes e boot_em já entram tipados aqui)
+    v_novo := jsonb_populate_record(v_atual, p_registro);
+
+    -- Mapeamento para suportar versões antigas do coletor
+    v_novo.sistema_operacional := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'sistema_operacional', ''), NULLIF(p_registro->>'so', ''), p_registro->>'os_info'),
+        v_atual.sistema_operacional);
+    v_novo.ultimo_usuario := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'ultimo_usuario', ''), NULLIF(p_registro->>'usuario', ''), p_registro->>'user'),
+        v_atual.ultimo_usuario);
+    v_novo.tempo_ligado := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'tempo_ligado', ''), p_registro->>'uptime'),
+        v_atual.tempo_ligado);
+    v_novo.processador := public.fn_coletor_merge(p_registro->>'processador', v_atual.processador);
+    v_novo.memoria_ram := public.fn_coletor_merge(p_registro->>'memoria_ram', v_atual.memoria_ram);
+    v_novo.armazenamento := public.fn_coletor_merge(p_registro->>'armazenamento', v_atual.armazenamento);
+    v_novo.schema_coletor := COALESCE((p_registro->>'schema')::SMALLINT, 2);
+    v_novo.ultima_conexao := GREATEST(v_atual.ultima_conexao, p_recebido_em);
+
+    -- Payload legado (com tempo_ligado) invalida o boot conhecido; v3 deriva o texto do boot
+    IF p_registro ? 'tempo_ligado' OR p_registro ? 'uptime' THEN
+        v_novo.boot_em := CASE WHEN p_registro ? 'boot_em' THEN v_novo.boot_em END;
+    END IF;
+
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, CASE WHEN v_novo.boot_em IS NULL THEN v_novo.tempo_ligado END,
+               v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, CASE WHEN v_atual.boot_em IS NULL THEN v_atual.tempo_ligado END,
+               v_atual.memoria_ram_bytes, v_atual.armazenamento_bytes, v_atual.boot_em, v_atual.schema_coletor)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    IF v_novo.boot_em IS NOT NULL THEN
+        v_novo.tempo_ligado := public.fn_coletor_tempo_ligado(v_novo.boot_em, v_novo.ultima_conexao);
+    END IF;
+
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor
+    ) VALUES (
+        v_novo.nome, v_novo.tipo, v_novo.serial, COALESCE(v_novo.status, 'Disponível'),
+        v_novo.processador, v_novo.memoria_ram, v_novo.armazenamento, v_novo.acesso_remoto,
+        v_novo.sistema_operacional, v_novo.ultimo_usuario, v_novo.tempo_ligado, v_novo.ultima_conexao,
+        v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor
+    )
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
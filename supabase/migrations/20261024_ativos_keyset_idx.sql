@@ -0,0 +1,8 @@
+-- Migration: Índice para exportação paginada por keyset
+-- Data: 2026-10-24
+--
+-- scripts/exportar_inventario.py lê ativos em ordem de (updated_at, id), uma
+-- página depois da outra. Com este índice cada página é um range scan que para
+-- no LIMIT, em vez de ordenar a tabela inteira a cada requisição.
+
+CREATE INDEX IF NOT EXISTS idx_ativos_updated_at_id ON public.ativos (updated_at, id);
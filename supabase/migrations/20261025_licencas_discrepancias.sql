@@ -0,0 +1,56 @@
+-- Migration: Relatório de discrepâncias de licenças
+-- Data: 2026-10-25
+--
+-- Gerado por scripts/reconciliar_licencas.py, que lê softwares, licenças,
+-- instalações e ativos em lote e cruza tudo em memória. Cada execução
+-- substitui o relatório inteiro.
+--
+-- Tipos:
+--   excesso_licenca             licença com mais instalações que qtd_adquirida
+--   excesso_software            instalações do software acima do total de licenças válidas
+--   licenca_expirando           licença em uso que vence nos próximos dias
+--   licenca_expirada_em_uso     licença vencida ainda instalada (instalado sem licença válida)
+--   instalacao_ativo_baixado    licença ocupada por um ativo baixado
+--   instalacao_duplicada        mesmo software com mais de uma licença no mesmo ativo
+
+-- 1. Relatório (sem chaves estrangeiras: é um retrato da última execução, e
+--    um registro apagado entre a leitura e a gravação não pode derrubá-lo)
+CREATE TABLE IF NOT EXISTS public.licencas_discrepancias (
+    id BIGSERIAL PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    software_id UUID,
+    licenca_id UUID,
+    ativo_id UUID,
+    quantidade INTEGER NOT NULL DEFAULT 1, -- excesso ou instalações afetadas
+    detalhe JSONB,
+    gerado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_licencas_discrepancias_software ON public.licencas_discrepancias (software_id);
+CREATE INDEX IF NOT EXISTS idx_licencas_discrepancias_tipo ON public.licencas_discrepancias (tipo);
+
+ALTER TABLE public.licencas_discrepancias ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Discrepâncias de licenças visíveis para autenticados" ON public.licencas_discrepancias
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- 2. Troca atômica do relatório (uma chamada por execução)
+CREATE OR REPLACE FUNCTION public.fn_licencas_gravar_discrepancias(p_itens JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    -- Execuções simultâneas: a última a gravar vence, sem misturar os relatórios
+    PERFORM pg_advisory_xact_lock(hashtext('fn_licencas_gravar_discrepancias'));
+
+    DELETE FROM public.licencas_discrepancias WHERE TRUE; -- WHERE exigido pelo pg-safeupdate
+    INSERT INTO public.licencas_discrepancias (tipo, software_id, licenca_id, ativo_id, quantidade, detalhe)
+    SELECT tipo, software_id, licenca_id, ativo_id, COALESCE(quantidade, 1), detalhe
+    FROM jsonb_to_recordset(p_itens)
+        AS r(tipo TEXT, software_id UUID, licenca_id UUID, ativo_id UUID, quantidade INTEGER, detalhe JSONB);
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_licencas_gravar_discrepancias(JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_licencas_gravar_discrepancias(JSONB) TO service_role;
@@ -0,0 +1,110 @@
+-- Migration: Saúde da frota a partir do histórico de batimentos
+-- Data: 2026-10-26
+--
+-- scripts/analise_frota.py lê os batimentos (ativos_heartbeats, modo 'log') em
+-- lotes de ativos, calcula disponibilidade, períodos offline, reinícios e
+-- ativos parados com NumPy e publica o resumo nas tabelas abaixo.
+
+-- 1. Leitura colunar: por ativo, os instantes dos batimentos e o boot informado
+--    em cada um, como int4 big-endian (segundos desde p_de) em base64. Evita
+--    devolver milhões de linhas JSON; o script decodifica direto para NumPy.
+--    Boot desconhecido (coletor < 3.0) = -2147483648. inicio = segundos entre
+--    p_de e o cadastro do ativo (0 se já existia). Só entram ativos que já
+--    enviaram dados pelo coletor e não foram baixados.
+CREATE OR REPLACE FUNCTION public.fn_frota_batimentos(
+    p_de TIMESTAMPTZ,
+    p_ate TIMESTAMPTZ DEFAULT NOW(),
+    p_apos_serial TEXT DEFAULT '',
+    p_limite INTEGER DEFAULT 200
+)
+RETURNS TABLE (serial TEXT, ativo_id UUID, setor_id UUID, inicio INTEGER,
+               batimentos INTEGER, instantes TEXT, boots TEXT) AS $$
+    SELECT a.serial, a.id, a.setor_id, GREATEST(0, EXTRACT(EPOCH FROM a.created_at - p_de))::INTEGER,
+           b.batimentos, b.instantes, b.boots
+    FROM (
+        SELECT ativos.serial, ativos.id, ativos.setor_id, ativos.created_at FROM public.ativos
+        WHERE ativos.serial > p_apos_serial
+          AND ativos.ultima_conexao IS NOT NULL
+          AND ativos.status <> 'Baixado'
+        ORDER BY ativos.serial
+        LIMIT p_limite
+    ) a
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*)::INTEGER AS batimentos,
+            encode(string_agg(int4send(EXTRACT(EPOCH FROM h.recebido_em - p_de)::INTEGER), ''::BYTEA
+                              ORDER BY h.recebido_em), 'base64') AS instantes,
+            encode(string_agg(int4send(COALESCE(CASE WHEN h.payload->>'boot_em' ~ '^\d{4}-\d\d-\d\dT\d\d:\d\d'
+                       THEN EXTRACT(EPOCH FROM (h.payload->>'boot_em')::TIMESTAMPTZ - p_de)::INTEGER END, -2147483648)), ''::BYTEA
+                              ORDER BY h.recebido_em), 'base64') AS boots
+        FROM public.ativos_heartbeats h
+        WHERE h.serial = a.serial AND h.recebido_em >= p_de AND h.recebido_em < p_ate
+    ) b
+    ORDER BY a.serial;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_frota_batimentos(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_frota_batimentos(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, INTEGER) TO service_role;
+
+-- 2. Resumo por ativo (uma linha por ativo, substituído a cada execução)
+CREATE TABLE IF NOT EXISTS public.frota_saude (
+    serial TEXT PRIMARY KEY,
+    ativo_id UUID,
+    setor_id UUID,
+    batimentos INTEGER NOT NULL,
+    disponibilidade NUMERIC(5, 2),          -- % do período observado com batimentos
+    periodos_offline INTEGER NOT NULL DEFAULT 0,
+    offline_max_s INTEGER,                  -- maior período offline (s)
+    noites_offline INTEGER NOT NULL DEFAULT 0, -- noites em que estava offline às 3h
+    reinicios INTEGER,                      -- NULL se o coletor não informa o boot
+    tempo_ligado_s INTEGER,                 -- no último batimento
+    ultimo_batimento TIMESTAMPTZ,
+    parado BOOLEAN NOT NULL DEFAULT FALSE,  -- sem batimento há mais que o limite
+    janela_de TIMESTAMPTZ NOT NULL,
+    janela_ate TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_frota_saude_setor ON public.frota_saude (setor_id);
+
+-- 3. Resumo por setor
+CREATE TABLE IF NOT EXISTS public.frota_saude_setor (
+    setor_id UUID,                          -- NULL = ativos sem setor
+    ativos INTEGER NOT NULL,
+    parados INTEGER NOT NULL,
+    disponibilidade_media NUMERIC(5, 2),
+    disponibilidade_p05 NUMERIC(5, 2),      -- os 5% piores
+    tempo_ligado_p95_s INTEGER,
+    reinicios_media NUMERIC(8, 2),
+    janela_de TIMESTAMPTZ NOT NULL,
+    janela_ate TIMESTAMPTZ NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_frota_saude_setor_unico ON public.frota_saude_setor (COALESCE(setor_id, '00000000-0000-0000-0000-000000000000'));
+
+ALTER TABLE public.frota_saude ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.frota_saude_setor ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Saúde da frota visível para autenticados" ON public.frota_saude
+    FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "Saúde da frota por setor visível para autenticados" ON public.frota_saude_setor
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- 4. Publicação atômica dos dois resumos
+CREATE OR REPLACE FUNCTION public.fn_frota_saude_gravar(p_ativos JSONB, p_setores JSONB)
+RETURNS JSONB AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('fn_frota_saude_gravar'));
+
+    DELETE FROM public.frota_saude WHERE TRUE; -- WHERE exigido pelo pg-safeupdate
+    INSERT INTO public.frota_saude
+    SELECT * FROM jsonb_populate_recordset(NULL::public.frota_saude, p_ativos);
+
+    DELETE FROM public.frota_saude_setor WHERE TRUE;
+    INSERT INTO public.frota_saude_setor
+    SELECT * FROM jsonb_populate_recordset(NULL::public.frota_saude_setor, p_setores);
+
+    RETURN jsonb_build_object('ativos', jsonb_array_length(p_ativos), 'setores', jsonb_array_length(p_setores));
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_frota_saude_gravar(JSONB, JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_frota_saude_gravar(JSONB, JSONB) TO service_role;
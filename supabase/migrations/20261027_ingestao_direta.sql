@@ -0,0 +1,246 @@
+-- Migration: Ingestão direta pelo PostgREST, em lote
+-- Data: 2026-10-27
+--
+-- Em redes internas confiáveis, o coletor (ou um relay, como o "coletor.py import")
+-- pode gravar direto na API REST do banco, sem passar pela função do Next.js:
+--     POST /rest/v1/rpc/fn_ingest_coletor_direto   {"p_registros": [...]}
+-- com um JWT de papel coletor_ingest (scripts/credencial_ingestao.py), que só
+-- pode executar essa função. O claim "kid" é o id da Chave de API de origem:
+-- apagar a chave no painel invalida a credencial na hora.
+--
+-- O merge passa a existir numa só função (fn_coletor_mesclar) e o lote é
+-- gravado com um INSERT ... ON CONFLICT por lote, em vez de um por registro.
+-- O /api/collect também passa a usar o caminho em lote.
+
+-- 1. Regras de merge (as mesmas de 20261023_coletor_schema_v3.sql), sem escrita
+CREATE OR REPLACE FUNCTION public.fn_coletor_mesclar(
+    p_atual public.ativos,          -- NULL para ativo novo
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ
+)
+RETURNS public.ativos AS $$
+DECLARE
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    -- Sobrepõe ao registro atual apenas as chaves presentes no payload
+    -- (memoria_ram_bytes, armazenamento_bytes e boot_em já entram tipados aqui)
+    v_novo := jsonb_populate_record(p_atual, p_registro);
+
+    -- Mapeamento para suportar versões antigas do coletor
+    v_novo.sistema_operacional := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'sistema_operacional', ''), NULLIF(p_registro->>'so', ''), p_registro->>'os_info'),
+        p_atual.sistema_operacional);
+    v_novo.ultimo_usuario := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'ultimo_usuario', ''), NULLIF(p_registro->>'usuario', ''), p_registro->>'user'),
+        p_atual.ultimo_usuario);
+    v_novo.tempo_ligado := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'tempo_ligado', ''), p_registro->>'uptime'),
+        p_atual.tempo_ligado);
+    v_novo.processador := public.fn_coletor_merge(p_registro->>'processador', p_atual.processador);
+    v_novo.memoria_ram := public.fn_coletor_merge(p_registro->>'memoria_ram', p_atual.memoria_ram);
+    v_novo.armazenamento := public.fn_coletor_merge(p_registro->>'armazenamento', p_atual.armazenamento);
+    v_novo.schema_coletor := COALESCE((p_registro->>'schema')::SMALLINT, 2);
+    v_novo.ultima_conexao := GREATEST(p_atual.ultima_conexao, p_recebido_em);
+    v_novo.status := COALESCE(v_novo.status, 'Disponível');
+
+    -- Payload legado (com tempo_ligado) invalida o boot conhecido; v3 deriva o texto do boot
+    IF p_registro ? 'tempo_ligado' OR p_registro ? 'uptime' THEN
+        v_novo.boot_em := CASE WHEN p_registro ? 'boot_em' THEN v_novo.boot_em END;
+    END IF;
+    -- Não entra na detecção de mudança quando há boot (ver fn_coletor_upsert_ativo)
+    IF v_novo.boot_em IS NOT NULL THEN
+        v_novo.tempo_ligado := public.fn_coletor_tempo_ligado(v_novo.boot_em, v_novo.ultima_conexao);
+    END IF;
+    RETURN v_novo;
+END;
+$$ LANGUAGE plpgsql STABLE SET search_path = public;
+
+-- 2. Escrita de ativos já mesclados (um comando para o lote inteiro; seriais sem repetição)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar(p_novos public.ativos[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor
+    )
+    SELECT n.nome, n.tipo, n.serial, n.status, n.processador, n.memoria_ram, n.armazenamento, n.acesso_remoto,
+           n.sistema_operacional, n.ultimo_usuario, n.tempo_ligado, n.ultima_conexao,
+           n.memoria_ram_bytes, n.armazenamento_bytes, n.boot_em, n.schema_coletor
+    FROM unnest(p_novos) n
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Upsert de um registro (usado pelo fold), agora sobre as duas funções acima
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+    v_novo := public.fn_coletor_mesclar(v_atual, p_registro, p_recebido_em);
+
+    -- boot_em substitui tempo_ligado na detecção de mudança: o tempo ligado cresce a cada minuto
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, CASE WHEN v_novo.boot_em IS NULL THEN v_novo.tempo_ligado END,
+               v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, CASE WHEN v_atual.boot_em IS NULL THEN v_atual.tempo_ligado END,
+               v_atual.memoria_ram_bytes, v_atual.armazenamento_bytes, v_atual.boot_em, v_atual.schema_coletor)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM public.fn_coletor_gravar(ARRAY[v_novo]);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 4. Upsert de um lote inteiro com o mesmo resultado do processamento um a um
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_lote(p_lote JSONB, p_recebido_em TIMESTAMPTZ DEFAULT NOW())
+RETURNS INTEGER AS $$
+DECLARE
+    v_rodadas INTEGER;
+    v_novos public.ativos[];
+    v_total INTEGER := 0;
+BEGIN
+    -- Trava os ativos existentes do lote em ordem de serial (como o FOR UPDATE
+    -- de cada registro, mas sem deadlock entre lotes simultâneos)
+    PERFORM 1 FROM public.ativos
+    WHERE serial IN (SELECT r->>'serial' FROM jsonb_array_elements(p_lote) r)
+    ORDER BY serial
+    FOR UPDATE;
+
+    -- O mesmo serial pode vir mais de uma vez (spool + batimento atual). Cada
+    -- ocorrência é uma rodada, na ordem do lote, para o merge enxergar a anterior;
+    -- no caso comum há uma rodada só
+    SELECT MAX(n) INTO v_rodadas
+    FROM (SELECT COUNT(*) AS n FROM jsonb_array_elements(p_lote) r GROUP BY r->>'serial') c;
+
+    FOR v_rodada IN 1..COALESCE(v_rodadas, 0) LOOP
+        SELECT array_agg(m) INTO v_novos
+        FROM (
+            SELECT r.valor, ROW_NUMBER() OVER (PARTITION BY r.valor->>'serial' ORDER BY r.ordem) AS ocorrencia
+            FROM jsonb_array_elements(p_lote) WITH ORDINALITY AS r(valor, ordem)
+        ) e
+        LEFT JOIN public.ativos atual ON atual.serial = e.valor->>'serial'
+        CROSS JOIN LATERAL public.fn_coletor_mesclar(atual, e.valor, p_recebido_em) m
+        WHERE e.ocorrencia = v_rodada;
+
+        v_total := v_total + public.fn_coletor_gravar(v_novos);
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_coletor_mesclar(public.ativos, JSONB, TIMESTAMPTZ) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.fn_coletor_gravar(public.ativos[]) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.fn_coletor_upsert_lote(JSONB, TIMESTAMPTZ) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_coletor_mesclar(public.ativos, JSONB, TIMESTAMPTZ) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_coletor_gravar(public.ativos[]) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_coletor_upsert_lote(JSONB, TIMESTAMPTZ) TO service_role;
+
+-- 5. Ingestão (Next.js e direta): modo 'direto' grava o lote de uma vez
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    IF (SELECT valor FROM public.configuracoes WHERE chave = 'coletor_modo_ingestao') = 'log' THEN
+        INSERT INTO public.ativos_heartbeats (serial, key_id, payload)
+        SELECT r->>'serial', p_key_id, r FROM jsonb_array_elements(v_lote) r;
+    ELSE
+        PERFORM public.fn_coletor_upsert_lote(v_lote);
+    END IF;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 6. Papel da credencial de ingestão: nenhuma tabela, só a função abaixo
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'coletor_ingest') THEN
+        CREATE ROLE coletor_ingest NOLOGIN NOINHERIT;
+    END IF;
+    -- O PostgREST conecta como authenticator e troca para o papel do JWT
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticator') THEN
+        GRANT coletor_ingest TO authenticator;
+    END IF;
+END $$;
+
+GRANT USAGE ON SCHEMA public TO coletor_ingest;
+
+-- 7. Ponto de entrada da ingestão direta. Erros viram status HTTP pelo PostgREST (SQLSTATE PTxxx)
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_direto(p_registros JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_key_id UUID;
+    v_resultado JSONB;
+BEGIN
+    BEGIN
+        v_key_id := (current_setting('request.jwt.claims', true)::JSONB ->> 'kid')::UUID;
+    EXCEPTION WHEN others THEN
+        v_key_id := NULL;
+    END;
+    IF v_key_id IS NULL OR NOT EXISTS (SELECT 1 FROM public.api_keys WHERE id = v_key_id) THEN
+        RAISE SQLSTATE 'PT401' USING MESSAGE = 'Credencial de ingestão inválida ou revogada';
+    END IF;
+
+    -- Mesmo limite do /api/collect
+    IF jsonb_typeof(p_registros) = 'array' AND jsonb_array_length(p_registros) > 1000 THEN
+        RAISE SQLSTATE 'PT413' USING MESSAGE = 'Lote excede o limite de 1000 registros';
+    END IF;
+
+    v_resultado := public.fn_ingest_coletor_token(v_key_id, p_registros);
+    IF NOT (v_resultado->>'ok')::BOOLEAN THEN
+        RAISE SQLSTATE 'PT400' USING MESSAGE = 'Serial number is required';
+    END IF;
+    RETURN v_resultado;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_ingest_coletor_direto(JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_coletor_direto(JSONB) TO coletor_ingest;
@@ -0,0 +1,93 @@
+-- Migration: Convidados (contêineres e VMs) enviados pelo coletor no modo hospedeiro
+-- Data: 2026-10-29
+--
+-- No modo hospedeiro (MODO_HOSPEDEIRO), o coletor do host envia, no mesmo lote
+-- do seu batimento, um registro por contêiner ou VM em execução. Além dos campos
+-- de sempre, cada um traz o serial do hospedeiro, a identificação no motor
+-- (docker, podman, kvm...) e os limites de CPU/memória do cgroup.
+
+-- 1. Colunas
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS hospedeiro TEXT;
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS convidado JSONB;
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS limites JSONB;
+
+-- Convidados de um host ("o que roda nesta máquina?")
+CREATE INDEX IF NOT EXISTS idx_ativos_hospedeiro ON public.ativos (hospedeiro) WHERE hospedeiro IS NOT NULL;
+
+-- 2. Escrita com as novas colunas (mesmo comando de 20261028_ativos_rede.sql)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar(p_novos public.ativos[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor, rede,
+        hospedeiro, convidado, limites
+    )
+    SELECT n.nome, n.tipo, n.serial, n.status, n.processador, n.memoria_ram, n.armazenamento, n.acesso_remoto,
+           n.sistema_operacional, n.ultimo_usuario, n.tempo_ligado, n.ultima_conexao,
+           n.memoria_ram_bytes, n.armazenamento_bytes, n.boot_em, n.schema_coletor, n.rede,
+           n.hospedeiro, n.convidado, n.limites
+    FROM unnest(p_novos) n
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor,
+        rede = EXCLUDED.rede,
+        hospedeiro = EXCLUDED.hospedeiro,
+        convidado = EXCLUDED.convidado,
+        limites = EXCLUDED.limites;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Detecção de mudança do fold com as novas colunas
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+    v_novo := public.fn_coletor_mesclar(v_atual, p_registro, p_recebido_em);
+
+    -- boot_em substitui tempo_ligado na detecção de mudança: o tempo ligado cresce a cada minuto
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, CASE WHEN v_novo.boot_em IS NULL THEN v_novo.tempo_ligado END,
+               v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor,
+               v_novo.rede, v_novo.hospedeiro, v_novo.convidado, v_novo.limites)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, CASE WHEN v_atual.boot_em IS NULL THEN v_atual.tempo_ligado END,
+               v_atual.memoria_ram_bytes, v_atual.armazenamento_bytes, v_atual.boot_em, v_atual.schema_coletor,
+               v_atual.rede, v_atual.hospedeiro, v_atual.convidado, v_atual.limites)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM public.fn_coletor_gravar(ARRAY[v_novo]);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
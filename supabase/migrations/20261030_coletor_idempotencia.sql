@@ -0,0 +1,279 @@
+-- Migration: Idempotência dos batimentos do coletor
+-- Data: 2026-10-30
+--
+-- Cada registro do coletor 3.0 leva "seq", um número de sequência do agente que
+-- só cresce (maior entre o último + 1 e o relógio em ms, guardado no estado).
+-- (serial, seq) é a chave de idempotência: o /api/collect responde repetições
+-- recentes sem ir ao banco, e aqui um registro com seq menor ou igual ao último
+-- aplicado é ignorado, então retentativas, envios em paralelo (hedging) e spool
+-- reenviado fora de ordem nunca sobrescrevem um dado mais novo. Registros sem
+-- seq (coletores antigos) seguem aceitos como antes.
+--
+-- ultimo_seq fica fora da detecção de mudança: quando o fold pula a escrita, ele
+-- pode ficar para trás, mas só em batimentos iguais ao que já está gravado.
+
+-- 1. Coluna e leitura tolerante do seq (valor inválido = sem seq)
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS ultimo_seq BIGINT;
+
+CREATE OR REPLACE FUNCTION public.fn_coletor_seq(p_registro JSONB)
+RETURNS BIGINT AS $$
+    SELECT CASE WHEN jsonb_typeof(p_registro->'seq') = 'number' AND p_registro->>'seq' ~ '^[0-9]{1,18}$'
+                THEN (p_registro->>'seq')::BIGINT END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 2. Merge (20261027_ingestao_direta.sql) registrando o seq aplicado
+CREATE OR REPLACE FUNCTION public.fn_coletor_mesclar(
+    p_atual public.ativos,          -- NULL para ativo novo
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ
+)
+RETURNS public.ativos AS $$
+DECLARE
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    -- Sobrepõe ao registro atual apenas as chaves presentes no payload
+    -- (memoria_ram_bytes, armazenamento_bytes e boot_em já entram tipados aqui)
+    v_novo := jsonb_populate_record(p_atual, p_registro);
+
+    -- Mapeamento para suportar versões antigas do coletor
+    v_novo.sistema_operacional := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'sistema_operacional', ''), NULLIF(p_registro->>'so', ''), p_registro->>'os_info'),
+        p_atual.sistema_operacional);
+    v_novo.ultimo_usuario := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'ultimo_usuario', ''), NULLIF(p_registro->>'usuario', ''), p_registro->>'user'),
+        p_atual.ultimo_usuario);
+    v_novo.tempo_ligado := public.fn_coletor_merge(
+        COALESCE(NULLIF(p_registro->>'tempo_ligado', ''), p_registro->>'uptime'),
+        p_atual.tempo_ligado);
+    v_novo.processador := public.fn_coletor_merge(p_registro->>'processador', p_atual.processador);
+    v_novo.memoria_ram := public.fn_coletor_merge(p_registro->>'memoria_ram', p_atual.memoria_ram);
+    v_novo.armazenamento := public.fn_coletor_merge(p_registro->>'armazenamento', p_atual.armazenamento);
+    v_novo.schema_coletor := COALESCE((p_registro->>'schema')::SMALLINT, 2);
+    v_novo.ultima_conexao := GREATEST(p_atual.ultima_conexao, p_recebido_em);
+    v_novo.status := COALESCE(v_novo.status, 'Disponível');
+    v_novo.ultimo_seq := GREATEST(p_atual.ultimo_seq, public.fn_coletor_seq(p_registro));
+
+    -- Payload legado (com tempo_ligado) invalida o boot conhecido; v3 deriva o texto do boot
+    IF p_registro ? 'tempo_ligado' OR p_registro ? 'uptime' THEN
+        v_novo.boot_em := CASE WHEN p_registro ? 'boot_em' THEN v_novo.boot_em END;
+    END IF;
+    -- Não entra na detecção de mudança quando há boot (ver fn_coletor_upsert_ativo)
+    IF v_novo.boot_em IS NOT NULL THEN
+        v_novo.tempo_ligado := public.fn_coletor_tempo_ligado(v_novo.boot_em, v_novo.ultima_conexao);
+    END IF;
+    RETURN v_novo;
+END;
+$$ LANGUAGE plpgsql STABLE SET search_path = public;
+
+-- 3. Escrita com ultimo_seq (mesmo comando de 20261029_ativos_convidados.sql)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar(p_novos public.ativos[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor, rede,
+        hospedeiro, convidado, limites, ultimo_seq
+    )
+    SELECT n.nome, n.tipo, n.serial, n.status, n.processador, n.memoria_ram, n.armazenamento, n.acesso_remoto,
+           n.sistema_operacional, n.ultimo_usuario, n.tempo_ligado, n.ultima_conexao,
+           n.memoria_ram_bytes, n.armazenamento_bytes, n.boot_em, n.schema_coletor, n.rede,
+           n.hospedeiro, n.convidado, n.limites, n.ultimo_seq
+    FROM unnest(p_novos) n
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor,
+        rede = EXCLUDED.rede,
+        hospedeiro = EXCLUDED.hospedeiro,
+        convidado = EXCLUDED.convidado,
+        limites = EXCLUDED.limites,
+        ultimo_seq = EXCLUDED.ultimo_seq;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 4. Upsert de um registro (fold): seq antigo ou repetido não é aplicado
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+    IF public.fn_coletor_seq(p_registro) <= v_atual.ultimo_seq THEN
+        RETURN FALSE;
+    END IF;
+    v_novo := public.fn_coletor_mesclar(v_atual, p_registro, p_recebido_em);
+
+    -- boot_em substitui tempo_ligado na detecção de mudança: o tempo ligado cresce a cada minuto
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, CASE WHEN v_novo.boot_em IS NULL THEN v_novo.tempo_ligado END,
+               v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor,
+               v_novo.rede, v_novo.hospedeiro, v_novo.convidado, v_novo.limites)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, CASE WHEN v_atual.boot_em IS NULL THEN v_atual.tempo_ligado END,
+               v_atual.memoria_ram_bytes, v_atual.armazenamento_bytes, v_atual.boot_em, v_atual.schema_coletor,
+               v_atual.rede, v_atual.hospedeiro, v_atual.convidado, v_atual.limites)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM public.fn_coletor_gravar(ARRAY[v_novo]);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 5. Upsert em lote: em cada rodada, só os registros com seq acima do último aplicado
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_lote(p_lote JSONB, p_recebido_em TIMESTAMPTZ DEFAULT NOW())
+RETURNS INTEGER AS $$
+DECLARE
+    v_rodadas INTEGER;
+    v_novos public.ativos[];
+    v_total INTEGER := 0;
+BEGIN
+    -- Trava os ativos existentes do lote em ordem de serial (como o FOR UPDATE
+    -- de cada registro, mas sem deadlock entre lotes simultâneos)
+    PERFORM 1 FROM public.ativos
+    WHERE serial IN (SELECT r->>'serial' FROM jsonb_array_elements(p_lote) r)
+    ORDER BY serial
+    FOR UPDATE;
+
+    -- O mesmo serial pode vir mais de uma vez (spool + batimento atual). Cada
+    -- ocorrência é uma rodada, na ordem do lote, para o merge enxergar a anterior;
+    -- no caso comum há uma rodada só
+    SELECT MAX(n) INTO v_rodadas
+    FROM (SELECT COUNT(*) AS n FROM jsonb_array_elements(p_lote) r GROUP BY r->>'serial') c;
+
+    FOR v_rodada IN 1..COALESCE(v_rodadas, 0) LOOP
+        SELECT array_agg(m) INTO v_novos
+        FROM (
+            SELECT r.valor, ROW_NUMBER() OVER (PARTITION BY r.valor->>'serial' ORDER BY r.ordem) AS ocorrencia
+            FROM jsonb_array_elements(p_lote) WITH ORDINALITY AS r(valor, ordem)
+        ) e
+        LEFT JOIN public.ativos atual ON atual.serial = e.valor->>'serial'
+        CROSS JOIN LATERAL public.fn_coletor_mesclar(atual, e.valor, p_recebido_em) m
+        WHERE e.ocorrencia = v_rodada
+          AND (public.fn_coletor_seq(e.valor) > atual.ultimo_seq) IS NOT FALSE;
+
+        IF v_novos IS NOT NULL THEN
+            v_total := v_total + public.fn_coletor_gravar(v_novos);
+        END IF;
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 6. Ingestão: no modo 'log', repetição recente de (serial, seq) não entra no histórico
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    IF (SELECT valor FROM public.configuracoes WHERE chave = 'coletor_modo_ingestao') = 'log' THEN
+        -- A janela de 15 minutos usa o índice (serial, recebido_em)
+        INSERT INTO public.ativos_heartbeats (serial, key_id, payload)
+        SELECT DISTINCT ON (r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END)
+               r->>'serial', p_key_id, r
+        FROM jsonb_array_elements(v_lote) WITH ORDINALITY AS x(r, o)
+        WHERE public.fn_coletor_seq(r) IS NULL OR NOT EXISTS (
+            SELECT 1 FROM public.ativos_heartbeats h
+            WHERE h.serial = r->>'serial'
+              AND h.recebido_em > NOW() - INTERVAL '15 minutes'
+              AND public.fn_coletor_seq(h.payload) = public.fn_coletor_seq(r)
+        )
+        ORDER BY r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END, o;
+    ELSE
+        PERFORM public.fn_coletor_upsert_lote(v_lote);
+    END IF;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 7. Fold: o batimento aplicado é o de maior seq da janela, não o último a chegar
+--    (um lote com spool tem o mesmo recebido_em para todos os registros)
+CREATE OR REPLACE FUNCTION public.fn_fold_heartbeats(
+    p_resolucao_conexao INTERVAL DEFAULT INTERVAL '5 minutes'
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_de TIMESTAMPTZ;
+    -- Margem para transações de ingestão ainda não confirmadas
+    v_ate TIMESTAMPTZ := NOW() - INTERVAL '30 seconds';
+    v_rec RECORD;
+    v_lidos INTEGER := 0;
+    v_escritos INTEGER := 0;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('fn_fold_heartbeats')) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'fold_em_andamento');
+    END IF;
+
+    SELECT processado_ate INTO v_de FROM public.ativos_heartbeats_fold WHERE id = 1 FOR UPDATE;
+    IF v_de >= v_ate THEN
+        RETURN jsonb_build_object('ok', true, 'ativos', 0, 'escritos', 0);
+    END IF;
+
+    FOR v_rec IN
+        SELECT DISTINCT ON (serial) serial, payload, recebido_em
+        FROM public.ativos_heartbeats
+        WHERE recebido_em > v_de AND recebido_em <= v_ate
+        ORDER BY serial, public.fn_coletor_seq(payload) DESC NULLS LAST, recebido_em DESC, id DESC
+    LOOP
+        v_lidos := v_lidos + 1;
+        IF public.fn_coletor_upsert_ativo(v_rec.payload, v_rec.recebido_em, p_resolucao_conexao) THEN
+            v_escritos := v_escritos + 1;
+        END IF;
+    END LOOP;
+
+    INSERT INTO public.ativos_heartbeats_diario AS d (serial, dia, batimentos, primeiro_em, ultimo_em)
+    SELECT serial, recebido_em::DATE, COUNT(*), MIN(recebido_em), MAX(recebido_em)
+    FROM public.ativos_heartbeats
+    WHERE recebido_em > v_de AND recebido_em <= v_ate
+    GROUP BY serial, recebido_em::DATE
+    ON CONFLICT (serial, dia) DO UPDATE SET
+        batimentos = d.batimentos + EXCLUDED.batimentos,
+        primeiro_em = LEAST(d.primeiro_em, EXCLUDED.primeiro_em),
+        ultimo_em = GREATEST(d.ultimo_em, EXCLUDED.ultimo_em);
+
+    UPDATE public.ativos_heartbeats_fold SET processado_ate = v_ate WHERE id = 1;
+
+    RETURN jsonb_build_object('ok', true, 'ativos', v_lidos, 'escritos', v_escritos);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
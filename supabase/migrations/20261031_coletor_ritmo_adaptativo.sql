@@ -0,0 +1,248 @@
+-- Migration: Ritmo adaptativo dos batimentos do coletor
+-- Data: 2026-10-31
+--
+-- O coletor 3.0 só envia o registro completo quando algum campo muda. Sem
+-- mudança, envia um batimento "vivo" ({serial, seq, schema, vivo, boot_em,
+-- intervalo_batimento}) com intervalo crescente até HEARTBEAT_MAXIMO. Todo
+-- batimento declara em intervalo_batimento (s) quanto pode demorar o próximo.
+--
+-- O merge já sobrepõe só as chaves presentes, então o vivo atualiza apenas
+-- ultima_conexao, ultimo_seq e intervalo_batimento. Aqui:
+--   * intervalo_batimento vira coluna (o painel considera offline após dois
+--     intervalos declarados, no mínimo 10 minutos);
+--   * um vivo de serial desconhecido é ignorado (não cadastra ativo sem tipo);
+--   * o fold aplica o último completo e depois o último vivo de cada ativo,
+--     para um vivo mais novo na mesma janela não esconder a mudança;
+--   * fn_frota_batimentos devolve também o intervalo declarado em cada
+--     batimento, para a análise da frota não contar o intervalo longo como offline.
+
+-- 1. Coluna
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS intervalo_batimento INTEGER;
+
+-- 2. Escrita com intervalo_batimento (mesmo comando de 20261030_coletor_idempotencia.sql)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar(p_novos public.ativos[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor, rede,
+        hospedeiro, convidado, limites, ultimo_seq, intervalo_batimento
+    )
+    SELECT n.nome, n.tipo, n.serial, n.status, n.processador, n.memoria_ram, n.armazenamento, n.acesso_remoto,
+           n.sistema_operacional, n.ultimo_usuario, n.tempo_ligado, n.ultima_conexao,
+           n.memoria_ram_bytes, n.armazenamento_bytes, n.boot_em, n.schema_coletor, n.rede,
+           n.hospedeiro, n.convidado, n.limites, n.ultimo_seq, n.intervalo_batimento
+    FROM unnest(p_novos) n
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor,
+        rede = EXCLUDED.rede,
+        hospedeiro = EXCLUDED.hospedeiro,
+        convidado = EXCLUDED.convidado,
+        limites = EXCLUDED.limites,
+        ultimo_seq = EXCLUDED.ultimo_seq,
+        intervalo_batimento = EXCLUDED.intervalo_batimento;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Upsert de um registro (fold): vivo de ativo desconhecido não é aplicado
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_ativo(
+    p_registro JSONB,
+    p_recebido_em TIMESTAMPTZ DEFAULT NOW(),
+    p_resolucao_conexao INTERVAL DEFAULT NULL -- se informado, pula a escrita quando nada mudou
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_atual public.ativos%ROWTYPE;
+    v_novo public.ativos%ROWTYPE;
+BEGIN
+    SELECT * INTO v_atual FROM public.ativos WHERE serial = p_registro->>'serial' FOR UPDATE;
+    IF public.fn_coletor_seq(p_registro) <= v_atual.ultimo_seq THEN
+        RETURN FALSE;
+    END IF;
+    -- Batimento vivo só confirma um ativo que já existe; sozinho não cadastra nada
+    IF v_atual.id IS NULL AND p_registro ? 'vivo' THEN
+        RETURN FALSE;
+    END IF;
+    v_novo := public.fn_coletor_mesclar(v_atual, p_registro, p_recebido_em);
+
+    -- intervalo_batimento entra na comparação: o painel precisa do valor novo mesmo
+    -- quando o batimento chega dentro da resolução de ultima_conexao
+    -- boot_em substitui tempo_ligado na detecção de mudança: o tempo ligado cresce a cada minuto
+    IF p_resolucao_conexao IS NOT NULL AND v_atual.id IS NOT NULL
+       AND ROW(v_novo.nome, v_novo.tipo, v_novo.status, v_novo.processador, v_novo.memoria_ram,
+               v_novo.armazenamento, v_novo.acesso_remoto, v_novo.sistema_operacional,
+               v_novo.ultimo_usuario, CASE WHEN v_novo.boot_em IS NULL THEN v_novo.tempo_ligado END,
+               v_novo.memoria_ram_bytes, v_novo.armazenamento_bytes, v_novo.boot_em, v_novo.schema_coletor,
+               v_novo.rede, v_novo.hospedeiro, v_novo.convidado, v_novo.limites, v_novo.intervalo_batimento)
+           IS NOT DISTINCT FROM
+           ROW(v_atual.nome, v_atual.tipo, v_atual.status, v_atual.processador, v_atual.memoria_ram,
+               v_atual.armazenamento, v_atual.acesso_remoto, v_atual.sistema_operacional,
+               v_atual.ultimo_usuario, CASE WHEN v_atual.boot_em IS NULL THEN v_atual.tempo_ligado END,
+               v_atual.memoria_ram_bytes, v_atual.armazenamento_bytes, v_atual.boot_em, v_atual.schema_coletor,
+               v_atual.rede, v_atual.hospedeiro, v_atual.convidado, v_atual.limites, v_atual.intervalo_batimento)
+       AND v_atual.ultima_conexao >= p_recebido_em - p_resolucao_conexao THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM public.fn_coletor_gravar(ARRAY[v_novo]);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 4. Upsert em lote: idem
+CREATE OR REPLACE FUNCTION public.fn_coletor_upsert_lote(p_lote JSONB, p_recebido_em TIMESTAMPTZ DEFAULT NOW())
+RETURNS INTEGER AS $$
+DECLARE
+    v_rodadas INTEGER;
+    v_novos public.ativos[];
+    v_total INTEGER := 0;
+BEGIN
+    -- Trava os ativos existentes do lote em ordem de serial (como o FOR UPDATE
+    -- de cada registro, mas sem deadlock entre lotes simultâneos)
+    PERFORM 1 FROM public.ativos
+    WHERE serial IN (SELECT r->>'serial' FROM jsonb_array_elements(p_lote) r)
+    ORDER BY serial
+    FOR UPDATE;
+
+    -- O mesmo serial pode vir mais de uma vez (spool + batimento atual). Cada
+    -- ocorrência é uma rodada, na ordem do lote, para o merge enxergar a anterior;
+    -- no caso comum há uma rodada só
+    SELECT MAX(n) INTO v_rodadas
+    FROM (SELECT COUNT(*) AS n FROM jsonb_array_elements(p_lote) r GROUP BY r->>'serial') c;
+
+    FOR v_rodada IN 1..COALESCE(v_rodadas, 0) LOOP
+        SELECT array_agg(m) INTO v_novos
+        FROM (
+            SELECT r.valor, ROW_NUMBER() OVER (PARTITION BY r.valor->>'serial' ORDER BY r.ordem) AS ocorrencia
+            FROM jsonb_array_elements(p_lote) WITH ORDINALITY AS r(valor, ordem)
+        ) e
+        LEFT JOIN public.ativos atual ON atual.serial = e.valor->>'serial'
+        CROSS JOIN LATERAL public.fn_coletor_mesclar(atual, e.valor, p_recebido_em) m
+        WHERE e.ocorrencia = v_rodada
+          AND (public.fn_coletor_seq(e.valor) > atual.ultimo_seq) IS NOT FALSE
+          AND (atual.id IS NOT NULL OR NOT e.valor ? 'vivo');
+
+        IF v_novos IS NOT NULL THEN
+            v_total := v_total + public.fn_coletor_gravar(v_novos);
+        END IF;
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 5. Fold: último completo e último vivo de cada ativo, em ordem de seq
+CREATE OR REPLACE FUNCTION public.fn_fold_heartbeats(
+    p_resolucao_conexao INTERVAL DEFAULT INTERVAL '5 minutes'
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_de TIMESTAMPTZ;
+    -- Margem para transações de ingestão ainda não confirmadas
+    v_ate TIMESTAMPTZ := NOW() - INTERVAL '30 seconds';
+    v_rec RECORD;
+    v_serial TEXT;
+    v_lidos INTEGER := 0;
+    v_escritos INTEGER := 0;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('fn_fold_heartbeats')) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'fold_em_andamento');
+    END IF;
+
+    SELECT processado_ate INTO v_de FROM public.ativos_heartbeats_fold WHERE id = 1 FOR UPDATE;
+    IF v_de >= v_ate THEN
+        RETURN jsonb_build_object('ok', true, 'ativos', 0, 'escritos', 0);
+    END IF;
+
+    FOR v_rec IN
+        SELECT serial, payload, recebido_em FROM (
+            SELECT DISTINCT ON (serial, payload ? 'vivo') serial, payload, recebido_em, id
+            FROM public.ativos_heartbeats
+            WHERE recebido_em > v_de AND recebido_em <= v_ate
+            ORDER BY serial, payload ? 'vivo', public.fn_coletor_seq(payload) DESC NULLS LAST, recebido_em DESC, id DESC
+        ) u
+        ORDER BY serial, public.fn_coletor_seq(payload) NULLS FIRST, recebido_em, id
+    LOOP
+        IF v_rec.serial IS DISTINCT FROM v_serial THEN
+            v_lidos := v_lidos + 1;
+            v_serial := v_rec.serial;
+        END IF;
+        IF public.fn_coletor_upsert_ativo(v_rec.payload, v_rec.recebido_em, p_resolucao_conexao) THEN
+            v_escritos := v_escritos + 1;
+        END IF;
+    END LOOP;
+
+    INSERT INTO public.ativos_heartbeats_diario AS d (serial, dia, batimentos, primeiro_em, ultimo_em)
+    SELECT serial, recebido_em::DATE, COUNT(*), MIN(recebido_em), MAX(recebido_em)
+    FROM public.ativos_heartbeats
+    WHERE recebido_em > v_de AND recebido_em <= v_ate
+    GROUP BY serial, recebido_em::DATE
+    ON CONFLICT (serial, dia) DO UPDATE SET
+        batimentos = d.batimentos + EXCLUDED.batimentos,
+        primeiro_em = LEAST(d.primeiro_em, EXCLUDED.primeiro_em),
+        ultimo_em = GREATEST(d.ultimo_em, EXCLUDED.ultimo_em);
+
+    UPDATE public.ativos_heartbeats_fold SET processado_ate = v_ate WHERE id = 1;
+
+    RETURN jsonb_build_object('ok', true, 'ativos', v_lidos, 'escritos', v_escritos);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 6. Leitura colunar da saúde da frota com o intervalo declarado (0 = não informado)
+DROP FUNCTION IF EXISTS public.fn_frota_batimentos(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, INTEGER);
+
+CREATE OR REPLACE FUNCTION public.fn_frota_batimentos(
+    p_de TIMESTAMPTZ,
+    p_ate TIMESTAMPTZ DEFAULT NOW(),
+    p_apos_serial TEXT DEFAULT '',
+    p_limite INTEGER DEFAULT 200
+)
+RETURNS TABLE (serial TEXT, ativo_id UUID, setor_id UUID, inicio INTEGER,
+               batimentos INTEGER, instantes TEXT, boots TEXT, intervalos TEXT) AS $$
+    SELECT a.serial, a.id, a.setor_id, GREATEST(0, EXTRACT(EPOCH FROM a.created_at - p_de))::INTEGER,
+           b.batimentos, b.instantes, b.boots, b.intervalos
+    FROM (
+        SELECT ativos.serial, ativos.id, ativos.setor_id, ativos.created_at FROM public.ativos
+        WHERE ativos.serial > p_apos_serial
+          AND ativos.ultima_conexao IS NOT NULL
+          AND ativos.status <> 'Baixado'
+        ORDER BY ativos.serial
+        LIMIT p_limite
+    ) a
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*)::INTEGER AS batimentos,
+            encode(string_agg(int4send(EXTRACT(EPOCH FROM h.recebido_em - p_de)::INTEGER), ''::BYTEA
+                              ORDER BY h.recebido_em), 'base64') AS instantes,
+            encode(string_agg(int4send(COALESCE(CASE WHEN h.payload->>'boot_em' ~ '^\d{4}-\d\d-\d\dT\d\d:\d\d'
+                       THEN EXTRACT(EPOCH FROM (h.payload->>'boot_em')::TIMESTAMPTZ - p_de)::INTEGER END, -2147483648)), ''::BYTEA
+                              ORDER BY h.recebido_em), 'base64') AS boots,
+            encode(string_agg(int4send(CASE WHEN jsonb_typeof(h.payload->'intervalo_batimento') = 'number'
+                       THEN LEAST((h.payload->>'intervalo_batimento')::NUMERIC, 2147483647)::INTEGER ELSE 0 END), ''::BYTEA
+                              ORDER BY h.recebido_em), 'base64') AS intervalos
+        FROM public.ativos_heartbeats h
+        WHERE h.serial = a.serial AND h.recebido_em >= p_de AND h.recebido_em < p_ate
+    ) b
+    ORDER BY a.serial;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_frota_batimentos(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_frota_batimentos(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, INTEGER) TO service_role;
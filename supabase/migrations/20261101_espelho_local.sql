@@ -0,0 +1,79 @@
+-- Migration: Sincronização incremental do espelho local (scripts/espelho_local.py)
+-- Data: 2026-11-01
+--
+-- O espelho SQLite dos técnicos de campo puxa de ativos, movimentacoes,
+-- softwares e licencas só as linhas com updated_at depois da sua marca d'água,
+-- em páginas por keyset em (updated_at, id). Para isso:
+--   * movimentacoes ganha updated_at (com o mesmo trigger de ativos);
+--   * cada tabela ganha o índice (updated_at, id), como o de 20261024_ativos_keyset_idx.sql;
+--   * exclusões ficam registradas em espelho_exclusoes (as linhas somem da
+--     tabela, então a marca d'água não as enxerga). O espelho apaga localmente
+--     o que aparecer ali depois da sua marca.
+
+-- 1. updated_at em movimentacoes (linhas existentes ficam com o instante da migração)
+ALTER TABLE public.movimentacoes ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+DROP TRIGGER IF EXISTS update_movimentacoes_updated_at ON public.movimentacoes;
+CREATE TRIGGER update_movimentacoes_updated_at BEFORE UPDATE ON public.movimentacoes
+FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();
+
+-- 2. Índices do keyset
+CREATE INDEX IF NOT EXISTS idx_movimentacoes_updated_at_id ON public.movimentacoes (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_softwares_updated_at_id ON public.softwares (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_licencas_updated_at_id ON public.licencas (updated_at, id);
+
+-- 3. Registro de exclusões (inclusive as em cascata, como movimentações de um ativo apagado)
+CREATE TABLE IF NOT EXISTS public.espelho_exclusoes (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    tabela TEXT NOT NULL,
+    registro_id UUID NOT NULL,
+    excluido_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_espelho_exclusoes_em ON public.espelho_exclusoes (excluido_em, id);
+
+ALTER TABLE public.espelho_exclusoes ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Exclusões visíveis para autenticados" ON public.espelho_exclusoes
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+CREATE OR REPLACE FUNCTION public.fn_registrar_exclusao_espelho()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.espelho_exclusoes (tabela, registro_id) VALUES (TG_TABLE_NAME, OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DO $$
+DECLARE
+    v_tabela TEXT;
+BEGIN
+    FOREACH v_tabela IN ARRAY ARRAY['ativos', 'movimentacoes', 'softwares', 'licencas'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS tr_espelho_exclusao ON public.%I', v_tabela);
+        EXECUTE format('CREATE TRIGGER tr_espelho_exclusao AFTER DELETE ON public.%I '
+                       'FOR EACH ROW EXECUTE FUNCTION public.fn_registrar_exclusao_espelho()', v_tabela);
+    END LOOP;
+END $$;
+
+-- 4. Retenção: um espelho sem sincronizar há mais que isso refaz a cópia inteira
+CREATE OR REPLACE FUNCTION public.fn_espelho_exclusoes_limpar(p_retencao INTERVAL DEFAULT INTERVAL '90 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    DELETE FROM public.espelho_exclusoes WHERE excluido_em < NOW() - p_retencao;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_espelho_exclusoes_limpar(INTERVAL) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_espelho_exclusoes_limpar(INTERVAL) TO service_role;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('espelho-exclusoes-limpar', '30 0 * * *',
+            'SELECT public.fn_espelho_exclusoes_limpar()');
+    END IF;
+END $$;
@@ -0,0 +1,154 @@
+-- Migration: Eventos de atualização de pacotes enviados pelo coletor
+-- Data: 2026-11-02
+--
+-- O coletor lê só as linhas novas dos logs do dpkg, apt, dnf e yum e manda os
+-- eventos no batimento seguinte, no campo pacotes_eventos:
+--   {"em", "origem", "acao", "pacote", "versao", "versao_anterior"}
+--   acao: instalacao | atualizacao | rebaixamento | remocao | transacao
+--   (a transação do apt traz "comando", "usuario" e "pacotes" em vez do pacote,
+--   e "transacao", o hash do bloco no history.log, que entra na chave: duas
+--   transações no mesmo segundo não têm pacote nem versão para distingui-las)
+--
+-- Os eventos são gravados na ingestão, nos dois modos: no modo 'log' o fold
+-- aplica só o último batimento de cada ativo na janela, e os eventos dos
+-- anteriores se perderiam. A chave é o serial, como em ativos_heartbeats (o
+-- ativo pode ainda não existir até o fold). Repetições (spool reenviado, cópia
+-- do hedging, logs relidos após falha no envio) caem no índice único.
+
+-- 1. Tabela
+CREATE TABLE IF NOT EXISTS public.ativos_eventos_pacotes (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    serial TEXT NOT NULL,
+    ocorrido_em TIMESTAMPTZ NOT NULL,
+    origem TEXT NOT NULL,
+    acao TEXT NOT NULL,
+    pacote TEXT NOT NULL DEFAULT '',
+    versao TEXT NOT NULL DEFAULT '',
+    versao_anterior TEXT,
+    transacao TEXT NOT NULL DEFAULT '',
+    detalhes JSONB,
+    recebido_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Também atende "última atualização do ativo" (serial, ocorrido_em DESC)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ativos_eventos_pacotes_unico
+    ON public.ativos_eventos_pacotes (serial, ocorrido_em, origem, acao, pacote, versao, transacao);
+CREATE INDEX IF NOT EXISTS idx_ativos_eventos_pacotes_pacote
+    ON public.ativos_eventos_pacotes (pacote, ocorrido_em);
+
+ALTER TABLE public.ativos_eventos_pacotes ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Eventos de pacotes visíveis para autenticados" ON public.ativos_eventos_pacotes
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- 2. Gravação dos eventos de um lote de batimentos (eventos malformados são ignorados)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar_eventos_pacotes(p_lote JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos_eventos_pacotes (serial, ocorrido_em, origem, acao, pacote, versao, versao_anterior, transacao, detalhes)
+    SELECT r->>'serial', (e->>'em')::TIMESTAMPTZ, LEFT(e->>'origem', 20), LEFT(e->>'acao', 20),
+           LEFT(COALESCE(e->>'pacote', ''), 200), LEFT(COALESCE(e->>'versao', ''), 200),
+           LEFT(e->>'versao_anterior', 200), LEFT(COALESCE(e->>'transacao', ''), 40),
+           NULLIF(e - ARRAY['em', 'origem', 'acao', 'pacote', 'versao', 'versao_anterior', 'transacao'], '{}'::JSONB)
+    FROM jsonb_array_elements(p_lote) r
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(r->'pacotes_eventos') = 'array' THEN r->'pacotes_eventos' ELSE '[]'::JSONB END) e
+    WHERE jsonb_typeof(e) = 'object'
+      AND e->>'em' ~ '^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?(Z|[+-]\d\d:?\d\d)$'
+      AND COALESCE(e->>'origem', '') <> ''
+      AND COALESCE(e->>'acao', '') <> ''
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Ingestão (mesmo corpo de 20261030_coletor_idempotencia.sql) gravando os eventos nos dois modos
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    IF (SELECT valor FROM public.configuracoes WHERE chave = 'coletor_modo_ingestao') = 'log' THEN
+        -- A janela de 15 minutos usa o índice (serial, recebido_em)
+        INSERT INTO public.ativos_heartbeats (serial, key_id, payload)
+        SELECT DISTINCT ON (r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END)
+               r->>'serial', p_key_id, r
+        FROM jsonb_array_elements(v_lote) WITH ORDINALITY AS x(r, o)
+        WHERE public.fn_coletor_seq(r) IS NULL OR NOT EXISTS (
+            SELECT 1 FROM public.ativos_heartbeats h
+            WHERE h.serial = r->>'serial'
+              AND h.recebido_em > NOW() - INTERVAL '15 minutes'
+              AND public.fn_coletor_seq(h.payload) = public.fn_coletor_seq(r)
+        )
+        ORDER BY r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END, o;
+    ELSE
+        PERFORM public.fn_coletor_upsert_lote(v_lote);
+    END IF;
+
+    -- Só os batimentos completos com atividade nos logs trazem eventos
+    IF jsonb_path_exists(v_lote, '$[*].pacotes_eventos') THEN
+        PERFORM public.fn_coletor_gravar_eventos_pacotes(v_lote);
+    END IF;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 4. Última atualização de cada ativo (instalação, atualização ou rebaixamento)
+CREATE OR REPLACE FUNCTION public.fn_ativos_ultima_atualizacao(p_seriais TEXT[])
+RETURNS TABLE (serial TEXT, ultima_atualizacao TIMESTAMPTZ, pacotes INTEGER) AS $$
+    SELECT s.serial, u.ocorrido_em, u.pacotes
+    FROM unnest(p_seriais) AS s(serial)
+    CROSS JOIN LATERAL (
+        -- Pacotes alterados no mesmo dia da última atualização
+        SELECT ultima.ocorrido_em,
+               (SELECT COUNT(*)::INTEGER FROM public.ativos_eventos_pacotes d
+                WHERE d.serial = s.serial AND d.acao IN ('instalacao', 'atualizacao', 'rebaixamento')
+                  AND d.ocorrido_em > ultima.ocorrido_em - INTERVAL '1 day'
+                  AND d.ocorrido_em <= ultima.ocorrido_em) AS pacotes
+        FROM (
+            SELECT e.ocorrido_em FROM public.ativos_eventos_pacotes e
+            WHERE e.serial = s.serial AND e.acao IN ('instalacao', 'atualizacao', 'rebaixamento')
+            ORDER BY e.ocorrido_em DESC
+            LIMIT 1
+        ) ultima
+    ) u;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+-- 5. Retenção
+CREATE OR REPLACE FUNCTION public.fn_eventos_pacotes_limpar(p_retencao INTERVAL DEFAULT INTERVAL '2 years')
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    DELETE FROM public.ativos_eventos_pacotes WHERE ocorrido_em < NOW() - p_retencao;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_eventos_pacotes_limpar(INTERVAL) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_eventos_pacotes_limpar(INTERVAL) TO service_role;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('eventos-pacotes-limpar', '45 0 * * *',
+            'SELECT public.fn_eventos_pacotes_limpar()');
+    END IF;
+END $$;
@@ -0,0 +1,61 @@
+-- Migration: Últimos processos de cada ativo
+-- Data: 2026-11-03
+--
+-- O coletor envia em "processos" (só no Linux) os 5 processos que mais usaram
+-- CPU desde o batimento anterior e os 5 com mais memória residente. Sem coluna,
+-- jsonb_populate_record descartava a chave no modo 'direto' (o padrão) e ela só
+-- sobrevivia no histórico do modo 'log'. Agora o último valor fica no ativo.
+--
+-- A coluna fica fora da detecção de mudança do fold (fn_coletor_upsert_ativo):
+-- ela muda a cada batimento e, entrando na comparação, o fold escreveria todos
+-- os ativos a cada execução. No modo 'log' o valor é atualizado quando outra
+-- coluna muda ou a resolução de ultima_conexao vence; o histórico completo
+-- continua em ativos_heartbeats.
+
+-- 1. Coluna (o merge já a preenche: a chave do payload tem o mesmo nome)
+ALTER TABLE public.ativos ADD COLUMN IF NOT EXISTS processos JSONB;
+
+-- 2. Escrita com processos (mesmo comando de 20261031_coletor_ritmo_adaptativo.sql)
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar(p_novos public.ativos[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos (
+        nome, tipo, serial, status, processador, memoria_ram, armazenamento, acesso_remoto,
+        sistema_operacional, ultimo_usuario, tempo_ligado, ultima_conexao,
+        memoria_ram_bytes, armazenamento_bytes, boot_em, schema_coletor, rede,
+        hospedeiro, convidado, limites, ultimo_seq, intervalo_batimento, processos
+    )
+    SELECT n.nome, n.tipo, n.serial, n.status, n.processador, n.memoria_ram, n.armazenamento, n.acesso_remoto,
+           n.sistema_operacional, n.ultimo_usuario, n.tempo_ligado, n.ultima_conexao,
+           n.memoria_ram_bytes, n.armazenamento_bytes, n.boot_em, n.schema_coletor, n.rede,
+           n.hospedeiro, n.convidado, n.limites, n.ultimo_seq, n.intervalo_batimento, n.processos
+    FROM unnest(p_novos) n
+    ON CONFLICT (serial) DO UPDATE SET
+        nome = EXCLUDED.nome,
+        tipo = EXCLUDED.tipo,
+        status = EXCLUDED.status,
+        processador = EXCLUDED.processador,
+        memoria_ram = EXCLUDED.memoria_ram,
+        armazenamento = EXCLUDED.armazenamento,
+        acesso_remoto = EXCLUDED.acesso_remoto,
+        sistema_operacional = EXCLUDED.sistema_operacional,
+        ultimo_usuario = EXCLUDED.ultimo_usuario,
+        tempo_ligado = EXCLUDED.tempo_ligado,
+        ultima_conexao = EXCLUDED.ultima_conexao,
+        memoria_ram_bytes = EXCLUDED.memoria_ram_bytes,
+        armazenamento_bytes = EXCLUDED.armazenamento_bytes,
+        boot_em = EXCLUDED.boot_em,
+        schema_coletor = EXCLUDED.schema_coletor,
+        rede = EXCLUDED.rede,
+        hospedeiro = EXCLUDED.hospedeiro,
+        convidado = EXCLUDED.convidado,
+        limites = EXCLUDED.limites,
+        ultimo_seq = EXCLUDED.ultimo_seq,
+        intervalo_batimento = EXCLUDED.intervalo_batimento,
+        processos = EXCLUDED.processos;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
@@ -0,0 +1,154 @@
+-- Migration: Consumo do coletor por ativo e dia
+-- Data: 2026-11-04
+--
+-- Cada batimento leva consumo_coletor: CPU (agente e comandos), bytes lidos e
+-- escritos e o intervalo coberto desde o último batimento enviado. Sem coluna,
+-- o relatório se perdia no modo 'direto' (o padrão) e só o modo 'log' permitia
+-- conferir o orçamento do agente. Aqui ele é somado por ativo e dia na
+-- ingestão, nos dois modos, como os eventos de pacotes.
+--
+-- Repetições (cópia do hedging, spool reenviado) não somam duas vezes: o seq
+-- de cada relatório precisa passar do último já somado no dia. A checagem é
+-- refeita no ON CONFLICT, que enxerga a linha gravada por um envio simultâneo.
+
+-- 1. Tabela
+CREATE TABLE IF NOT EXISTS public.ativos_consumo_coletor_diario (
+    serial TEXT NOT NULL,
+    dia DATE NOT NULL,
+    relatorios INTEGER NOT NULL DEFAULT 0,
+    intervalo_s NUMERIC NOT NULL DEFAULT 0,
+    cpu_s NUMERIC NOT NULL DEFAULT 0,
+    cpu_filhos_s NUMERIC NOT NULL DEFAULT 0,
+    leitura_bytes BIGINT NOT NULL DEFAULT 0,
+    escrita_bytes BIGINT NOT NULL DEFAULT 0,
+    cpu_max_s NUMERIC NOT NULL DEFAULT 0, -- maior CPU (agente + comandos) num só relatório
+    acima_do_orcamento INTEGER NOT NULL DEFAULT 0,
+    ultimo_seq BIGINT,
+    PRIMARY KEY (serial, dia)
+);
+
+ALTER TABLE public.ativos_consumo_coletor_diario ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Consumo do coletor visível para autenticados" ON public.ativos_consumo_coletor_diario
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- 2. Soma dos relatórios de um lote de batimentos (valores não numéricos contam como 0)
+CREATE OR REPLACE FUNCTION public.fn_coletor_numero(p_valor JSONB)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN jsonb_typeof(p_valor) = 'number' THEN (p_valor #>> '{}')::NUMERIC ELSE 0 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION public.fn_coletor_gravar_consumo(p_lote JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    INSERT INTO public.ativos_consumo_coletor_diario AS d (
+        serial, dia, relatorios, intervalo_s, cpu_s, cpu_filhos_s,
+        leitura_bytes, escrita_bytes, cpu_max_s, acima_do_orcamento, ultimo_seq
+    )
+    SELECT c.serial, CURRENT_DATE, COUNT(*), SUM(c.intervalo_s), SUM(c.cpu_s), SUM(c.cpu_filhos_s),
+           SUM(c.leitura_bytes)::BIGINT, SUM(c.escrita_bytes)::BIGINT, MAX(c.cpu_s + c.cpu_filhos_s),
+           COUNT(*) FILTER (WHERE c.acima_do_orcamento), MAX(c.seq)
+    FROM (
+        SELECT DISTINCT ON (r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END)
+               r->>'serial' AS serial, public.fn_coletor_seq(r) AS seq,
+               public.fn_coletor_numero(r->'consumo_coletor'->'intervalo_s') AS intervalo_s,
+               public.fn_coletor_numero(r->'consumo_coletor'->'cpu_s') AS cpu_s,
+               public.fn_coletor_numero(r->'consumo_coletor'->'cpu_filhos_s') AS cpu_filhos_s,
+               public.fn_coletor_numero(r->'consumo_coletor'->'leitura_bytes') AS leitura_bytes,
+               public.fn_coletor_numero(r->'consumo_coletor'->'escrita_bytes') AS escrita_bytes,
+               r->'consumo_coletor'->'acima_do_orcamento' = 'true'::JSONB AS acima_do_orcamento
+        FROM jsonb_array_elements(p_lote) WITH ORDINALITY AS x(r, o)
+        WHERE jsonb_typeof(r->'consumo_coletor') = 'object'
+        ORDER BY r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END
+    ) c
+    LEFT JOIN public.ativos_consumo_coletor_diario atual ON atual.serial = c.serial AND atual.dia = CURRENT_DATE
+    WHERE c.seq IS NULL OR atual.ultimo_seq IS NULL OR c.seq > atual.ultimo_seq
+    GROUP BY c.serial
+    ON CONFLICT (serial, dia) DO UPDATE SET
+        relatorios = d.relatorios + EXCLUDED.relatorios,
+        intervalo_s = d.intervalo_s + EXCLUDED.intervalo_s,
+        cpu_s = d.cpu_s + EXCLUDED.cpu_s,
+        cpu_filhos_s = d.cpu_filhos_s + EXCLUDED.cpu_filhos_s,
+        leitura_bytes = d.leitura_bytes + EXCLUDED.leitura_bytes,
+        escrita_bytes = d.escrita_bytes + EXCLUDED.escrita_bytes,
+        cpu_max_s = GREATEST(d.cpu_max_s, EXCLUDED.cpu_max_s),
+        acima_do_orcamento = d.acima_do_orcamento + EXCLUDED.acima_do_orcamento,
+        ultimo_seq = GREATEST(d.ultimo_seq, EXCLUDED.ultimo_seq)
+    WHERE d.ultimo_seq IS NULL OR EXCLUDED.ultimo_seq IS NULL OR EXCLUDED.ultimo_seq > d.ultimo_seq;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- 3. Ingestão (mesmo corpo de 20261102_coletor_eventos_pacotes.sql) somando o consumo nos dois modos
+CREATE OR REPLACE FUNCTION public.fn_ingest_coletor_token(p_key_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_lote JSONB;
+BEGIN
+    v_lote := CASE WHEN jsonb_typeof(p_payload) = 'array' THEN p_payload ELSE jsonb_build_array(p_payload) END;
+
+    IF EXISTS (
+        SELECT 1 FROM jsonb_array_elements(v_lote) r
+        WHERE jsonb_typeof(r) <> 'object' OR COALESCE(r->>'serial', '') = ''
+    ) THEN
+        RETURN jsonb_build_object('ok', false, 'erro', 'serial_obrigatorio');
+    END IF;
+
+    IF (SELECT valor FROM public.configuracoes WHERE chave = 'coletor_modo_ingestao') = 'log' THEN
+        -- A janela de 15 minutos usa o índice (serial, recebido_em)
+        INSERT INTO public.ativos_heartbeats (serial, key_id, payload)
+        SELECT DISTINCT ON (r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END)
+               r->>'serial', p_key_id, r
+        FROM jsonb_array_elements(v_lote) WITH ORDINALITY AS x(r, o)
+        WHERE public.fn_coletor_seq(r) IS NULL OR NOT EXISTS (
+            SELECT 1 FROM public.ativos_heartbeats h
+            WHERE h.serial = r->>'serial'
+              AND h.recebido_em > NOW() - INTERVAL '15 minutes'
+              AND public.fn_coletor_seq(h.payload) = public.fn_coletor_seq(r)
+        )
+        ORDER BY r->>'serial', public.fn_coletor_seq(r), CASE WHEN public.fn_coletor_seq(r) IS NULL THEN o END, o;
+    ELSE
+        PERFORM public.fn_coletor_upsert_lote(v_lote);
+    END IF;
+
+    -- Só os batimentos completos com atividade nos logs trazem eventos
+    IF jsonb_path_exists(v_lote, '$[*].pacotes_eventos') THEN
+        PERFORM public.fn_coletor_gravar_eventos_pacotes(v_lote);
+    END IF;
+
+    IF jsonb_path_exists(v_lote, '$[*].consumo_coletor') THEN
+        PERFORM public.fn_coletor_gravar_consumo(v_lote);
+    END IF;
+
+    UPDATE public.api_keys SET last_used_at = NOW()
+    WHERE id = p_key_id
+      AND (last_used_at IS NULL OR last_used_at < NOW() - INTERVAL '1 minute');
+
+    RETURN jsonb_build_object('ok', true, 'recebidos', jsonb_array_length(v_lote));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 4. Retenção
+CREATE OR REPLACE FUNCTION public.fn_consumo_coletor_limpar(p_retencao INTERVAL DEFAULT INTERVAL '1 year')
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    DELETE FROM public.ativos_consumo_coletor_diario WHERE dia < CURRENT_DATE - p_retencao;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.fn_consumo_coletor_limpar(INTERVAL) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fn_consumo_coletor_limpar(INTERVAL) TO service_role;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('consumo-coletor-limpar', '50 0 * * *',
+            'SELECT public.fn_consumo_coletor_limpar()');
+    END IF;
+END $$;
@@ -0,0 +1,114 @@
+-- Migration: Partições de ativos_heartbeats à prova de atraso do job
+-- Data: 2026-11-05
+--
+-- Se o job diário não roda (pg_cron parado, erro), os batimentos do dia caem
+-- na partição padrão. Depois disso, CREATE TABLE ... PARTITION OF para esse
+-- dia falha (a padrão já tem linhas do intervalo), o erro abortava o laço
+-- inteiro e, no mesmo comando do cron, também a remoção das antigas. A padrão
+-- nunca era limpa: a partir daí todo batimento se acumulava nela.
+--
+-- Agora:
+--   * as linhas do dia saem da padrão para a partição nova (criada à parte e
+--     anexada com ATTACH PARTITION, na mesma transação);
+--   * cada dia tem o seu bloco de exceção: um dia com problema vira aviso e os
+--     demais seguem; os dias que já têm linhas na padrão também entram;
+--   * a remoção apaga da padrão o que passou da retenção e avisa se ainda há
+--     linhas nela;
+--   * criação e remoção são jobs separados, e a criação roda a cada hora.
+
+-- 1. Criação das partições (os dias à frente e os que estão na partição padrão)
+CREATE OR REPLACE FUNCTION public.fn_heartbeats_criar_particoes(p_dias_a_frente INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+DECLARE
+    v_dia DATE;
+    v_nome TEXT;
+    v_movidos BIGINT;
+BEGIN
+    FOR v_dia IN
+        SELECT generate_series(CURRENT_DATE, CURRENT_DATE + p_dias_a_frente, INTERVAL '1 day')::DATE
+        UNION
+        SELECT DISTINCT recebido_em::DATE FROM public.ativos_heartbeats_default
+        ORDER BY 1
+    LOOP
+        v_nome := 'ativos_heartbeats_p' || to_char(v_dia, 'YYYYMMDD');
+        IF to_regclass('public.' || v_nome) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM public.ativos_heartbeats_default
+                       WHERE recebido_em >= v_dia AND recebido_em < v_dia + 1) THEN
+                -- A padrão já tem linhas do dia: a partição nasce solta, recebe as linhas e é anexada
+                EXECUTE format('CREATE TABLE public.%I (LIKE public.ativos_heartbeats INCLUDING DEFAULTS)', v_nome);
+                EXECUTE format(
+                    'WITH m AS (DELETE FROM public.ativos_heartbeats_default WHERE recebido_em >= %L AND recebido_em < %L RETURNING *) '
+                    'INSERT INTO public.%I SELECT * FROM m',
+                    v_dia, v_dia + 1, v_nome
+                );
+                GET DIAGNOSTICS v_movidos = ROW_COUNT;
+                EXECUTE format(
+                    'ALTER TABLE public.ativos_heartbeats ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                    v_nome, v_dia, v_dia + 1
+                );
+                RAISE WARNING 'ativos_heartbeats: % batimento(s) de % movidos da partição padrão', v_movidos, v_dia;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE public.%I PARTITION OF public.ativos_heartbeats FOR VALUES FROM (%L) TO (%L)',
+                    v_nome, v_dia, v_dia + 1
+                );
+            END IF;
+        EXCEPTION WHEN others THEN
+            RAISE WARNING 'ativos_heartbeats: não foi possível criar a partição de %: %', v_dia, SQLERRM;
+        END;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 2. Remoção das partições antigas e limpeza da partição padrão
+CREATE OR REPLACE FUNCTION public.fn_heartbeats_remover_particoes(p_retencao INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_particao TEXT;
+    v_total INTEGER := 0;
+    v_restantes BIGINT;
+BEGIN
+    FOR v_particao IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.ativos_heartbeats'::regclass
+          AND c.relname ~ '^ativos_heartbeats_p[0-9]{8}$'
+          AND to_date(substring(c.relname FROM '[0-9]{8}$'), 'YYYYMMDD') + 1 <= (NOW() - p_retencao)::DATE
+    LOOP
+        BEGIN
+            EXECUTE format('DROP TABLE public.%I', v_particao);
+            v_total := v_total + 1;
+        EXCEPTION WHEN others THEN
+            RAISE WARNING 'ativos_heartbeats: não foi possível remover %: %', v_particao, SQLERRM;
+        END;
+    END LOOP;
+
+    DELETE FROM public.ativos_heartbeats_default WHERE recebido_em < NOW() - p_retencao;
+    SELECT COUNT(*) INTO v_restantes FROM public.ativos_heartbeats_default;
+    IF v_restantes > 0 THEN
+        RAISE WARNING 'ativos_heartbeats: % batimento(s) na partição padrão; confira o job coletor-heartbeats-criar-particoes',
+            v_restantes;
+    END IF;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recupera o que já estiver na partição padrão
+SELECT public.fn_heartbeats_criar_particoes();
+
+-- 3. Agendamento: um job para cada função, para uma falha não impedir a outra
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        IF EXISTS (SELECT 1 FROM cron.job WHERE jobname = 'coletor-particoes-heartbeats') THEN
+            PERFORM cron.unschedule('coletor-particoes-heartbeats');
+        END IF;
+        PERFORM cron.schedule('coletor-heartbeats-criar-particoes', '15 * * * *',
+            'SELECT public.fn_heartbeats_criar_particoes()');
+        PERFORM cron.schedule('coletor-heartbeats-remover-particoes', '20 0 * * *',
+            'SELECT public.fn_heartbeats_remover_particoes()');
+    END IF;
+END $$;
@@ -44,6 +44,13 @@ export interface Ativo {
     ultimo_usuario?: string | null
     tempo_ligado?: string | null
     ultima_conexao?: string | null
+    // Payload v3 do coletor (valores numéricos canônicos)
+    memoria_ram_bytes?: number | null
+    armazenamento_bytes?: number | null
+    boot_em?: string | null
+    schema_coletor?: number | null
+    // Intervalo (s) até o próximo batimento declarado pelo coletor (ritmo adaptativo)
+    intervalo_batimento?: number | null
 
     // Relation
     dono?: {